@@ -0,0 +1,254 @@
+"""
+Headless batch runner for purchase and sales invoices.
+
+Runs the same extraction functions as the Streamlit apps over a directory
+(or glob) of PDFs without importing Streamlit, and streams every result to
+disk as soon as its file finishes.
+
+Usage:
+    python batch_cli.py invoices/ --mode purchase --workers 8 --output purchases.jsonl
+    python batch_cli.py "scans/2025-09/*.pdf" --mode sales --output sales.csv
+    python batch_cli.py archive/ --recursive --output archive.xlsx
+    python batch_cli.py invoices/ --parse-workers 8 --extract-workers 2 --output purchases.csv
+
+API keys are read from LLAMA_CLOUD_API_KEY and GOOGLE_API_KEY.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from datetime import datetime
+
+from batch_executor import run_pipeline, DEFAULT_MAX_WORKERS, MAX_WORKERS_LIMIT, PIPELINE_QUEUE_SIZE
+from batch_journal import BatchJournal, batch_id, path_file_key
+from client_registry import get_llama_parser, get_gemini_model, warm_up_clients
+from streaming_excel import StreamingWorkbookWriter, SummaryTotals
+from structured_output import json_output_stats
+from invoice_records import InvoiceBatch, layout_columns
+from invoice_archive import archive_frame
+from invoice_store import invoice_store
+from duplicate_detection import DuplicateIndex, content_hash, duplicate_record
+from normalization import normalize_frame, normalize_invoice, to_float, PURCHASE_TYPES, SALES_TYPES
+from invoice_extraction import (
+    PURCHASE_MODEL_NAME, SALES_MODEL_NAME,
+    parse_purchase_pdf, extract_purchase_invoice, purchase_failed_record,
+    parse_sales_pdf, extract_sales_invoice, sales_failed_record
+)
+
+
+def json_value(value):
+    """JSON fallback for result values: Decimal amounts as numbers, anything else as text"""
+    converted = to_float(value)
+    return converted if isinstance(converted, float) else str(value)
+
+
+def find_pdfs(input_path, recursive=False):
+    """List (path, source_name) pairs for a directory or glob pattern"""
+    if os.path.isdir(input_path):
+        pattern = os.path.join(input_path, "**", "*.pdf") if recursive else os.path.join(input_path, "*.pdf")
+        paths = glob.glob(pattern, recursive=recursive)
+        paths += glob.glob(pattern[:-4] + ".PDF", recursive=recursive)
+        return [(path, os.path.relpath(path, input_path)) for path in sorted(set(paths))]
+    paths = glob.glob(input_path, recursive=recursive)
+    return [(path, path) for path in sorted(paths) if os.path.isfile(path)]
+
+
+class ResultWriter:
+    """Append result records to a .jsonl, .csv or .xlsx file as they finish.
+
+    Records are written as rows in the mode's layout. .jsonl/.csv are
+    flushed after every row; .xlsx is streamed in constant-memory mode
+    with Invoices/Summary/Errors sheets.
+    """
+
+    def __init__(self, path, layout, party_label=None):
+        self.path = path
+        self.layout = layout
+        self.columns = layout_columns(layout)
+        lower = path.lower()
+        self.format = "csv" if lower.endswith(".csv") else "xlsx" if lower.endswith(".xlsx") else "jsonl"
+        if self.format == "xlsx":
+            self._workbook = StreamingWorkbookWriter(path)
+            self._workbook.add_table("Invoices", self.columns)
+            self._workbook.add_table("Summary", ["Metric", "Value"])
+            self._totals = SummaryTotals(party_label)
+            return
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        if self.format == "csv":
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+
+    def write(self, record):
+        if self.format == "xlsx":
+            self._totals.add(record)
+            if not record.success:
+                self._workbook.add_table("Errors", self.columns)
+            self._workbook.append("Invoices" if record.success else "Errors", record.values(self.layout))
+            return
+        if self.format == "csv":
+            self._writer.writerow(record.values(self.layout))
+        else:
+            self._file.write(json.dumps(record.to_row(self.layout), ensure_ascii=False, default=json_value) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self.format == "xlsx":
+            for values in self._totals.summary_rows():
+                self._workbook.append("Summary", values)
+            self._workbook.close()
+            return
+        self._file.close()
+
+
+def build_clients(mode):
+    """Create the LlamaParse factory and Gemini model for a mode"""
+    llama_key = os.getenv("LLAMA_CLOUD_API_KEY")
+    google_key = os.getenv("GOOGLE_API_KEY")
+    if not (llama_key and google_key):
+        raise SystemExit("❌ API keys not found! Set LLAMA_CLOUD_API_KEY and GOOGLE_API_KEY")
+
+    import google.generativeai as genai
+
+    genai.configure(api_key=google_key)
+    model_name = PURCHASE_MODEL_NAME if mode == "purchase" else SALES_MODEL_NAME
+    for client_name, error in warm_up_clients(llama_key, [model_name]).items():
+        if error:
+            print(f"⚠️ {client_name} health check failed: {error}", file=sys.stderr)
+    return (lambda: get_llama_parser(llama_key)), get_gemini_model(model_name)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract invoice data from a directory of PDFs")
+    parser.add_argument("input", help="Input directory or glob pattern (quote it so the shell doesn't expand it)")
+    parser.add_argument("--mode", choices=["purchase", "sales"], default="purchase",
+                        help="Invoice type and extraction schema (default: purchase)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Workers per stage (parse and extract), 1-{MAX_WORKERS_LIMIT} (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--parse-workers", type=int, help="LlamaParse stage workers (default: --workers)")
+    parser.add_argument("--extract-workers", type=int, help="Gemini stage workers (default: --workers)")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                        help=f"Parsed documents allowed to wait for extraction (default: {PIPELINE_QUEUE_SIZE})")
+    parser.add_argument("--output", help="Output .jsonl, .csv or .xlsx file (default: invoices_<mode>_<timestamp>.jsonl)")
+    parser.add_argument("--recursive", action="store_true", help="Include PDFs in subdirectories")
+    parser.add_argument("--restart", action="store_true",
+                        help="Discard the journal of an earlier run over the same files and process everything again")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    pdfs = find_pdfs(args.input, args.recursive)
+    if not pdfs:
+        print(f"⚠️ No PDF files found for {args.input}", file=sys.stderr)
+        return 2
+
+    output = args.output or f"invoices_{args.mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    parser_factory, model = build_clients(args.mode)
+
+    if args.mode == "purchase":
+        field_types, party_label = PURCHASE_TYPES, "Unique Vendors"
+        parse_pdf, extract_invoice, failed_record = parse_purchase_pdf, extract_purchase_invoice, purchase_failed_record
+    else:
+        field_types, party_label = SALES_TYPES, "Unique Customers"
+        parse_pdf, extract_invoice, failed_record = parse_sales_pdf, extract_sales_invoice, sales_failed_record
+
+    def read_pdf(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    # Pipeline stages; items are (path, name, journal key)
+    parse_stage = lambda item: parse_pdf(read_pdf(item[0]), item[1], parser_factory)
+    extract_stage = lambda item, parsed: extract_invoice(parsed, item[1], model)
+    failed_stage = lambda item, error: failed_record(item[1], error)
+
+    # Files finished by an earlier run over the same input set are taken from its journal
+    # (keys are hashed in chunks; only the parse stage reads a whole PDF)
+    items = [(path, name, path_file_key(name, path)) for path, name in pdfs]
+    journal = BatchJournal(args.mode, [key for _, _, key in items], resume=not args.restart)
+    writer = ResultWriter(output, args.mode, party_label)
+    # Successful records, column-wise, for the Parquet archive
+    archived = InvoiceBatch()
+    duplicates = DuplicateIndex(args.mode)
+    finished = {}  # file name -> result record
+    failed = 0
+    pipeline = None
+
+    def finish(item, record):
+        """Normalize the record and flag a repeated invoice, then write and keep it; returns True on success"""
+        # Same typed values as the apps' workbooks, in the output file, the totals and the archive
+        record = normalize_invoice(record)
+        if record.success and not record.duplicate_of:
+            record.duplicate_of = duplicates.check_invoice(record)
+        finished[item[1]] = record
+        writer.write(record)
+        if record.success:
+            archived.append(record)
+        return record.success
+
+    # Identical copies of an earlier file (or of one stored by an earlier run) are not sent to the APIs
+    todo = []
+    copies = []
+    for item in items:
+        original = duplicates.check_file(item[1], content_hash(item[2]))
+        record = journal.get(item[2])
+        if record is not None:
+            finish(item, record)
+        elif original is not None:
+            copies.append((item, original))
+        else:
+            todo.append(item)
+    if len(todo) + len(copies) < len(items):
+        print(f"↩️ Resuming: {len(items) - len(todo) - len(copies)} file(s) already done in {journal.path}",
+              file=sys.stderr)
+
+    def on_complete(done, idx, item, record):
+        nonlocal failed
+        journal.record(item[2], record)
+        ok = finish(item, record)
+        failed += 0 if ok else 1
+        print(f"[{done}/{len(todo)}] {'✅' if ok else '❌'} {item[1]} | {pipeline.describe()}", file=sys.stderr)
+
+    def on_start(stats):
+        nonlocal pipeline
+        pipeline = stats
+
+    try:
+        run_pipeline(todo, parse_stage, extract_stage, failed_stage,
+                     parse_workers=args.parse_workers or args.workers,
+                     extract_workers=args.extract_workers or args.workers,
+                     queue_size=args.queue_size, on_complete=on_complete, on_start=on_start)
+        for item, original in copies:
+            if original in finished:
+                record = duplicate_record(finished[original], item[1], original)
+            else:
+                record = duplicates.stored_record(content_hash(item[2]), item[1]) or failed_record(
+                    item[1], f"Identical copy of {original}, whose stored result could not be read")
+            journal.record(item[2], record)
+            failed += 0 if finish(item, record) else 1
+    finally:
+        writer.close()
+        journal.close()
+
+    print(f"Processed {len(pdfs)} file(s): {len(pdfs) - failed} succeeded, {failed} failed → {output}", file=sys.stderr)
+    if duplicates.file_duplicates or duplicates.invoice_duplicates:
+        print(f"🔁 {duplicates.describe()} (not counted in totals)", file=sys.stderr)
+    if len(archived):
+        run_id = batch_id(args.mode, [key for _, _, key in items])
+        typed = normalize_frame(archived.to_frame(args.mode), field_types)
+        archived_rows = archive_frame(typed, args.mode, args.mode, run_id,
+                                      file_keys={name: key for _, name, key in items})
+        if archived_rows:
+            print(f"🗄️ Archived {archived_rows} invoice(s) to the Parquet dataset", file=sys.stderr)
+        inserted, updated = invoice_store.upsert_frame(typed, args.mode, args.mode, run_id,
+                                                       file_hashes={name: content_hash(key) for _, name, key in items})
+        print(f"🗃️ Invoice store: {inserted} new, {updated} updated ({invoice_store.path})", file=sys.stderr)
+    print(f"🧾 {json_output_stats.describe()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
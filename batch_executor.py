@@ -0,0 +1,211 @@
+"""
+Bounded-concurrency batch execution for invoice processing.
+
+Parsing (LlamaParse) and extraction (Gemini) are almost entirely network
+wait, so several invoices can be in flight at once. Results always come
+back in input order, and the completion callback runs on the calling
+thread so Streamlit progress widgets can be updated from it safely.
+
+run_pipeline() splits the work into a parse stage and an extract stage
+with their own worker counts, joined by a bounded queue: Gemini works on
+file N while LlamaParse is already on file N+k, and parsing blocks once
+the queue is full (backpressure) instead of piling up parsed documents.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Default number of invoices processed at the same time
+DEFAULT_MAX_WORKERS = int(os.getenv("INVOICE_MAX_WORKERS", "4"))
+MAX_WORKERS_LIMIT = 16
+
+# Two-stage pipeline defaults
+PIPELINE_PARSE_WORKERS = int(os.getenv("PIPELINE_PARSE_WORKERS", str(DEFAULT_MAX_WORKERS)))
+PIPELINE_EXTRACT_WORKERS = int(os.getenv("PIPELINE_EXTRACT_WORKERS", str(DEFAULT_MAX_WORKERS)))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+# How often idle extract workers check whether the pipeline has stopped
+PIPELINE_POLL_SECONDS = 0.1
+
+
+def clamp_workers(workers) -> int:
+    return max(1, min(int(workers), MAX_WORKERS_LIMIT))
+
+
+def run_batch(func, items, max_workers=DEFAULT_MAX_WORKERS, on_complete=None, thread_initializer=None):
+    """Run func over items with at most max_workers in flight.
+
+    on_complete(done_count, index, item, result) is called once per item as
+    it finishes. The returned list is in the same order as items.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    max_workers = clamp_workers(max_workers)
+
+    # Sequential mode keeps the original one-file-at-a-time behaviour
+    if max_workers == 1 or len(items) <= 1:
+        for idx, item in enumerate(items):
+            results[idx] = func(item)
+            if on_complete:
+                on_complete(idx + 1, idx, item, results[idx])
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=thread_initializer) as executor:
+        futures = {executor.submit(func, item): idx for idx, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), 1):
+            idx = futures[future]
+            results[idx] = future.result()
+            if on_complete:
+                on_complete(done, idx, items[idx], results[idx])
+
+    return results
+
+
+class StageStats:
+    """Busy time and active workers of one pipeline stage"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.active = 0
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.active += 1
+        return time.monotonic()
+
+    def finish(self, started):
+        with self._lock:
+            self.active -= 1
+            self.processed += 1
+            self.busy_seconds += time.monotonic() - started
+
+    def utilization(self, elapsed) -> float:
+        """Share of the stage's worker time spent working (0-1)"""
+        return min(1.0, self.busy_seconds / (self.workers * elapsed)) if elapsed > 0 else 0.0
+
+
+class PipelineStats:
+    """Live queue depth and per-stage utilization of a run_pipeline call"""
+
+    def __init__(self, parse_workers, extract_workers, handoff):
+        self.parse = StageStats(parse_workers)
+        self.extract = StageStats(extract_workers)
+        self.handoff = handoff
+        self.started = time.monotonic()
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "queue_depth": self.handoff.qsize(),
+            "queue_size": self.handoff.maxsize,
+            "parse_active": self.parse.active,
+            "parse_workers": self.parse.workers,
+            "parse_utilization": self.parse.utilization(elapsed),
+            "extract_active": self.extract.active,
+            "extract_workers": self.extract.workers,
+            "extract_utilization": self.extract.utilization(elapsed),
+        }
+
+    def describe(self) -> str:
+        s = self.snapshot()
+        return (f"queue {s['queue_depth']}/{s['queue_size']} · "
+                f"parse {s['parse_active']}/{s['parse_workers']} busy ({s['parse_utilization']:.0%}) · "
+                f"extract {s['extract_active']}/{s['extract_workers']} busy ({s['extract_utilization']:.0%})")
+
+
+def run_pipeline(items, parse, extract, failed, parse_workers=PIPELINE_PARSE_WORKERS,
+                 extract_workers=PIPELINE_EXTRACT_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                 on_complete=None, thread_initializer=None, on_start=None):
+    """Run parse(item) -> extract(item, parsed) as two concurrent stages.
+
+    A parse or extract exception becomes failed(item, error). Results are
+    returned in input order; on_complete(done_count, index, item, result)
+    runs on the calling thread as items finish. on_start(stats) receives
+    the PipelineStats so callers can show queue depth and utilization.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    handoff = queue.Queue(maxsize=max(1, int(queue_size)))
+    finished = queue.Queue()
+    stats = PipelineStats(clamp_workers(parse_workers), clamp_workers(extract_workers), handoff)
+    if on_start:
+        on_start(stats)
+    pending = iter(enumerate(items))
+    pending_lock = threading.Lock()
+    stop = threading.Event()
+
+    def parse_worker():
+        if thread_initializer:
+            thread_initializer()
+        while not stop.is_set():
+            with pending_lock:
+                job = next(pending, None)
+            if job is None:
+                return
+            idx, item = job
+            started = stats.parse.start()
+            try:
+                parsed = parse(item)
+            except Exception as e:
+                finished.put((idx, failed(item, e)))
+                continue
+            finally:
+                stats.parse.finish(started)
+            # Waits while the extract stage is behind, unless the run is stopped meanwhile
+            while True:
+                try:
+                    handoff.put((idx, item, parsed), timeout=PIPELINE_POLL_SECONDS)
+                    break
+                except queue.Full:
+                    if stop.is_set():
+                        return
+
+    def extract_worker():
+        if thread_initializer:
+            thread_initializer()
+        while True:
+            try:
+                job = handoff.get(timeout=PIPELINE_POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if stop.is_set():
+                # Nobody collects results after a stop - don't spend API calls on queued documents
+                return
+            idx, item, parsed = job
+            started = stats.extract.start()
+            try:
+                result = extract(item, parsed)
+            except Exception as e:
+                result = failed(item, e)
+            finally:
+                stats.extract.finish(started)
+            finished.put((idx, result))
+
+    threads = [threading.Thread(target=parse_worker, name="pipeline-parse", daemon=True)
+               for _ in range(stats.parse.workers)]
+    threads += [threading.Thread(target=extract_worker, name="pipeline-extract", daemon=True)
+                for _ in range(stats.extract.workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for done in range(1, len(items) + 1):
+            idx, result = finished.get()
+            results[idx] = result
+            if on_complete:
+                on_complete(done, idx, items[idx], result)
+    finally:
+        # Every item is done, or on_complete raised: workers stop taking (and handing off) work
+        stop.set()
+
+    return results
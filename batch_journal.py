@@ -0,0 +1,113 @@
+"""
+Append-only journal of completed files for resumable batch runs.
+
+Each batch (mode + set of input files, identified by name and content
+hash) gets its own JSON Lines file. Every finished file's InvoiceRecord is
+appended and flushed as soon as it completes, so after a dropped session or a crash a
+batch started again with the same input set picks up the successful
+results from the journal and only processes what is left. Failed files
+are journaled too but are retried on resume.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from invoice_records import InvoiceRecord
+
+BATCH_JOURNAL_DIR = os.getenv("BATCH_JOURNAL_DIR", os.path.join(".invoice_cache", "journals"))
+BATCH_JOURNAL_TTL_DAYS = float(os.getenv("BATCH_JOURNAL_TTL_DAYS", "7"))
+
+
+def file_key(name, pdf_bytes) -> str:
+    """Identify an input file by its name and content"""
+    return f"{name}:{hashlib.sha256(pdf_bytes).hexdigest()}"
+
+
+def path_file_key(name, path, chunk_size=1 << 20) -> str:
+    """file_key of a file on disk, hashed in chunks instead of read into memory whole"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return f"{name}:{digest.hexdigest()}"
+
+
+def batch_id(mode, file_keys) -> str:
+    """Identify a batch by its mode and input file set (order-independent)"""
+    return hashlib.sha256((mode + "\n" + "\n".join(sorted(file_keys))).encode("utf-8")).hexdigest()
+
+
+class BatchJournal:
+    """Per-batch JSON Lines journal: {"file_key", "status", "record"} per completed file"""
+
+    def __init__(self, mode, file_keys, resume=True, journal_dir=BATCH_JOURNAL_DIR):
+        self.path = os.path.join(journal_dir, f"{mode}_{batch_id(mode, file_keys)}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(journal_dir, exist_ok=True)
+        self._prune(journal_dir)
+        if not resume and os.path.exists(self.path):
+            os.remove(self.path)
+        self.completed = self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # Terminate a torn last line so the next entry starts on its own line
+            self._file.write("\n")
+
+    def _prune(self, journal_dir):
+        """Remove journals of batches not touched for BATCH_JOURNAL_TTL_DAYS"""
+        cutoff = time.time() - BATCH_JOURNAL_TTL_DAYS * 86400
+        for name in os.listdir(journal_dir):
+            path = os.path.join(journal_dir, name)
+            try:
+                if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self) -> dict:
+        """Successful records already journaled for this batch, by file key"""
+        completed = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a crash mid-write
+                        continue
+                    if not isinstance(entry, dict) or "file_key" not in entry:
+                        continue
+                    # Entries without a record (older journal format) are processed again
+                    if entry.get("status") == "success" and isinstance(entry.get("record"), dict):
+                        completed[entry["file_key"]] = InvoiceRecord.from_dict(entry["record"])
+                    else:
+                        completed.pop(entry["file_key"], None)
+        except OSError:
+            pass
+        return completed
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def get(self, key):
+        """Journaled successful record for a file, or None if it still has to be processed"""
+        return self.completed.get(key)
+
+    def record(self, key, record):
+        """Append a finished file's record and make it durable before returning"""
+        line = json.dumps({"file_key": key, "status": record.status, "record": record.to_dict()},
+                          ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if record.success:
+                self.completed[key] = record
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,76 @@
+"""
+Process-wide registry of LlamaParse and Gemini clients.
+
+Each client is created once per process (per API key and settings) and
+then shared by every worker thread, Streamlit session and CLI run, so HTTP
+connections stay alive between invoices instead of being rebuilt per file.
+warm_up_clients() creates the clients up front and checks that the Gemini
+models are reachable.
+"""
+
+import threading
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def get_llama_parser(api_key, result_type="markdown", language="en"):
+    """Shared LlamaParse client for an API key and parser settings"""
+    def create():
+        from llama_parse import LlamaParse
+        return LlamaParse(api_key=api_key, result_type=result_type, language=language)
+
+    return _get_or_create(("llamaparse", api_key, result_type, language), create)
+
+
+def llama_parser_for_pages(parser, pages):
+    """Copy of a LlamaParse client restricted to 0-based pages, or None if the client can't target pages"""
+    if not hasattr(parser, "target_pages"):
+        return None
+    update = {"target_pages": ",".join(str(page) for page in pages)}
+    if hasattr(parser, "model_copy"):
+        return parser.model_copy(update=update)
+    return parser.copy(update=update)
+
+
+def get_gemini_model(model_name):
+    """Shared Gemini model client (genai.configure must have been called)"""
+    def create():
+        import google.generativeai as genai
+        return genai.GenerativeModel(model_name)
+
+    return _get_or_create(("gemini", model_name), create)
+
+
+def warm_up_clients(llama_api_key, model_names) -> dict:
+    """Create all clients and health-check the Gemini models.
+
+    Returns {client_name: error message or None}.
+    """
+    status = {}
+    try:
+        get_llama_parser(llama_api_key)
+        status["llamaparse"] = None
+    except Exception as e:
+        status["llamaparse"] = str(e)
+
+    for model_name in model_names:
+        try:
+            import google.generativeai as genai
+            get_gemini_model(model_name)
+            genai.get_model(f"models/{model_name}")
+            status[model_name] = None
+        except Exception as e:
+            status[model_name] = str(e)
+    return status
@@ -0,0 +1,172 @@
+"""
+Running per-currency invoice totals.
+
+Batches mix currencies (AED, USD, EUR, ...), so a single "Total Amount"
+is only meaningful per currency. CurrencyTotals keeps, for each ISO code,
+the invoice count and the subtotal / tax / net sums in whole cents, and is
+updated once per invoice in O(1). The on-screen metrics and the Summary
+sheet both read from it.
+
+With BASE_CURRENCY set and a local FX table (FX_RATES_PATH, a JSON object
+of {"USD": 3.6725, ...}: units of the base currency per unit of each
+currency), it also reports the grand total converted to the base
+currency; currencies without a rate are listed as not converted.
+"""
+
+import json
+import os
+from decimal import ROUND_HALF_UP, Decimal
+
+from normalization import currency_code, is_missing
+
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", "")
+FX_RATES_PATH = os.getenv("FX_RATES_PATH", "fx_rates.json")
+
+# Bucket for invoices whose currency is missing or not recognised
+UNKNOWN_CURRENCY = "N/A"
+
+_fx_rates = None
+
+
+def load_fx_rates(path=FX_RATES_PATH) -> dict:
+    """{ISO code: rate in the base currency} from a local JSON file ({} when the file does not exist)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        table = json.load(f)
+    rates = {}
+    for currency, rate in table.items():
+        code = currency_code(currency)
+        if code is None:
+            raise ValueError(f"Unknown currency in {path}: {currency}")
+        rates[code] = float(rate)
+    return rates
+
+
+def fx_rates() -> dict:
+    """FX table loaded once per process"""
+    global _fx_rates
+    if _fx_rates is None:
+        _fx_rates = load_fx_rates()
+    return _fx_rates
+
+
+def to_cents(value):
+    """Whole cents of an amount (number or numeric text), or None when missing/not a number"""
+    if is_missing(value) or isinstance(value, bool):
+        return None
+    if isinstance(value, Decimal):
+        # Normalized amounts: exact
+        return int((value * 100).to_integral_value(rounding=ROUND_HALF_UP)) if value.is_finite() else None
+    if isinstance(value, (int, float)):
+        return round(float(value) * 100)
+    try:
+        return round(float(str(value).replace(",", "").strip()) * 100)
+    except ValueError:
+        return None
+
+
+def format_amounts(amounts) -> str:
+    """"AED 1,050.00 · USD 50.00" from {currency: amount}"""
+    if not amounts:
+        return "0.00"
+    return " · ".join(f"{currency} {amount:,.2f}" for currency, amount in amounts.items())
+
+
+class CurrencyBucket:
+    """Running totals of one currency (amounts in whole cents)"""
+
+    __slots__ = ("invoices", "priced", "subtotal", "tax_amount", "net_total")
+
+    def __init__(self):
+        self.invoices = 0
+        self.priced = 0  # invoices with a net total, for the mean
+        self.subtotal = 0
+        self.tax_amount = 0
+        self.net_total = 0
+
+
+class CurrencyTotals:
+    """Per-currency invoice count, subtotal/tax/net sums and mean net total, updated once per invoice"""
+
+    def __init__(self, base_currency=BASE_CURRENCY, rates=None):
+        self.base_currency = currency_code(base_currency) if base_currency else None
+        self.rates = (fx_rates() if rates is None else rates) if self.base_currency else {}
+        self.buckets = {}
+
+    def add(self, currency, subtotal=None, tax_amount=None, net_total=None):
+        """Count one invoice; amounts are numbers or numeric text, missing amounts are skipped"""
+        code = currency_code(currency) or UNKNOWN_CURRENCY
+        bucket = self.buckets.get(code)
+        if bucket is None:
+            bucket = self.buckets[code] = CurrencyBucket()
+        bucket.invoices += 1
+        for field, value in (("subtotal", subtotal), ("tax_amount", tax_amount), ("net_total", net_total)):
+            cents = to_cents(value)
+            if cents is not None:
+                setattr(bucket, field, getattr(bucket, field) + cents)
+                bucket.priced += field == "net_total"
+
+    def currencies(self) -> list:
+        """Currencies seen, most invoices first"""
+        return sorted(self.buckets, key=lambda code: (-self.buckets[code].invoices, code))
+
+    def sums(self, field="net_total") -> dict:
+        """{currency: sum of field}"""
+        return {code: getattr(self.buckets[code], field) / 100 for code in self.currencies()}
+
+    def means(self) -> dict:
+        """{currency: mean net total of the invoices that have one}"""
+        return {
+            code: self.buckets[code].net_total / self.buckets[code].priced / 100
+            for code in self.currencies() if self.buckets[code].priced
+        }
+
+    def counts(self) -> dict:
+        return {code: self.buckets[code].invoices for code in self.currencies()}
+
+    def in_base(self, field="net_total"):
+        """(sum of field in the base currency, currencies without a rate), or None without a base currency"""
+        if self.base_currency is None:
+            return None
+        cents, missing = 0, []
+        for code in self.currencies():
+            rate = 1.0 if code == self.base_currency else self.rates.get(code)
+            if rate is None:
+                missing.append(code)
+            else:
+                cents += round(getattr(self.buckets[code], field) * rate)
+        return cents / 100, missing
+
+    def describe(self, field="net_total") -> str:
+        return format_amounts(self.sums(field))
+
+    def describe_base(self, field="net_total"):
+        """"≈ AED 1,233.63" (plus unconverted currencies), or None without a base currency"""
+        converted = self.in_base(field)
+        if converted is None:
+            return None
+        amount, missing = converted
+        text = f"≈ {self.base_currency} {amount:,.2f}"
+        return text + (f" (not converted: {', '.join(missing)})" if missing else "")
+
+    def summary_rows(self) -> list:
+        """(Metric, Value) rows: totals per currency, then the base-currency total when configured"""
+        rows = []
+        for code in self.currencies():
+            bucket = self.buckets[code]
+            rows += [
+                (f'Invoices ({code})', bucket.invoices),
+                (f'Total Subtotal ({code})', f"{bucket.subtotal / 100:.2f}"),
+                (f'Total Tax ({code})', f"{bucket.tax_amount / 100:.2f}"),
+                (f'Total Amount ({code})', f"{bucket.net_total / 100:.2f}"),
+                (f'Average Amount ({code})',
+                 f"{bucket.net_total / bucket.priced / 100:.2f}" if bucket.priced else "N/A"),
+            ]
+        converted = self.in_base()
+        if converted is not None and self.buckets:
+            amount, missing = converted
+            rows.append((f'Total Amount in {self.base_currency}', f"{amount:.2f}"))
+            if missing:
+                rows.append(('Not Converted (no FX rate)', ", ".join(missing)))
+        return rows
@@ -1,7 +1,15 @@
+import glob
+import os
 import pandas as pd
 import sys
 
-filename = 'sales_invoices_extracted_20251111_234611.xlsx'
+from currency_totals import CurrencyTotals
+
+# Workbook from the command line, else the newest one written by create_sales_excel.py
+workbooks = sys.argv[1:] or sorted(glob.glob('sales_invoices_extracted_*.xlsx'), key=os.path.getmtime)[-1:]
+if not workbooks:
+    sys.exit("Usage: python display_sales_results.py [sales_invoices_extracted_<timestamp>.xlsx]")
+filename = workbooks[0]
 
 print("=" * 80)
 print("SALES INVOICE EXTRACTION RESULTS")
@@ -19,7 +27,10 @@ df_invoices = pd.read_excel(filename, sheet_name='Sales Invoices')
 print("\n\n👥 CUSTOMERS & INVOICE DETAILS:")
 print("-" * 80)
 
+# Revenue per currency; invoices in different currencies are not added together
+revenue = CurrencyTotals()
 for idx, row in df_invoices.iterrows():
+    revenue.add(row['Currency'], row['Subtotal'], row['Tax Amount'], row['Net Total'])
     print(f"\n📄 Invoice #{idx + 1}:")
     print(f"   Invoice Number: {row['Invoice Number']}")
     print(f"   Date: {row['Invoice Date']}")
@@ -39,10 +50,10 @@ for idx, row in df_summary.iterrows():
     print(f"{row['Metric']:.<45} {row['Value']}")
 
 print("\n" + "=" * 80)
-print("✅ SUCCESS: All 3 sales invoices processed correctly!")
+print(f"✅ SUCCESS: All {len(df_invoices)} sales invoices processed correctly!")
 print("   - Customer information extracted (NOT vendor)")
-print("   - Your company: AL ATAAYA WATER WELLS DRILLING CONTRACTING LLC")
-print("   - Total revenue tracked: AED 12,810.00")
+print(f"   - Your company: {df_company['Company Name'].iloc[0]}")
+print(f"   - Total revenue tracked: {revenue.describe()}")
 print("=" * 80)
 
 sys.stdout.flush()
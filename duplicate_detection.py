@@ -0,0 +1,115 @@
+"""
+Duplicate invoice detection across files and runs.
+
+Vendors re-send the same invoice, sometimes under a different file name.
+Two checks catch the copies:
+  1. before any API call: the file's content hash (identical PDFs),
+  2. after extraction: a fingerprint of the normalized TRN, invoice
+     number, net total and invoice date (re-issued PDFs of one invoice).
+Each run keeps both in dict indexes (first file wins); invoices stored by
+earlier runs are found through the indexed file_hash / fingerprint
+columns of the invoice store. A duplicate keeps its record, with
+duplicate_of naming the original file, and is left out of totals, the
+archive and the store. The same file name seen again is a re-run, not a
+duplicate.
+"""
+
+import os
+import sqlite3
+
+from invoice_records import LAYOUTS, InvoiceRecord
+from invoice_store import STORED_FIELDS, invoice_fingerprint, invoice_store
+from normalization import is_missing
+
+DUPLICATE_DETECTION = os.getenv("DUPLICATE_DETECTION", "1") == "1"
+
+
+def content_hash(key) -> str:
+    """Content hash part of a batch_journal.file_key ("name:sha256")"""
+    return key.rsplit(":", 1)[-1]
+
+
+def duplicate_record(record, source_file, duplicate_of) -> InvoiceRecord:
+    """Copy of the original's result record for a duplicate file"""
+    return record.replace(source_file=source_file, tokens_saved=None, duplicate_of=duplicate_of)
+
+
+class DuplicateIndex:
+    """Content-hash and fingerprint indexes for one run, backed by the invoice store"""
+
+    def __init__(self, kind, store=invoice_store):
+        self.kind = kind
+        self.store = store if DUPLICATE_DETECTION else None
+        self.files = {}     # content hash -> first source file
+        self.invoices = {}  # fingerprint -> first source file
+        self.file_duplicates = 0
+        self.invoice_duplicates = 0
+
+    def _stored(self, lookup, key):
+        """Earliest stored invoice for an indexed key (lookup: "find_file" / "find_fingerprint")"""
+        if self.store is None:
+            return None
+        try:
+            return getattr(self.store, lookup)(self.kind, key)
+        except sqlite3.Error:
+            # Without the store, duplicates are still caught within the run
+            self.store = None
+            return None
+
+    def _original(self, index, key, source_file, lookup):
+        original = index.get(key)
+        if original is None:
+            stored = self._stored(lookup, key)
+            original = stored["source_file"] if stored else None
+        if original is None or original == source_file:
+            index.setdefault(key, source_file)
+            return None
+        return original
+
+    def check_file(self, source_file, file_hash):
+        """Original file name if this content was already seen, else None (and remember it)"""
+        if not DUPLICATE_DETECTION:
+            return None
+        original = self._original(self.files, file_hash, source_file, "find_file")
+        self.file_duplicates += original is not None
+        return original
+
+    def _check_fingerprint(self, source_file, trn, invoice_number, net_total, invoice_date):
+        fingerprint = invoice_fingerprint(trn, invoice_number, net_total, invoice_date)
+        if fingerprint is None:
+            return None
+        original = self._original(self.invoices, fingerprint, source_file, "find_fingerprint")
+        self.invoice_duplicates += original is not None
+        return original
+
+    def check_invoice(self, record):
+        """Original file name if this normalized record's invoice was already seen, else None"""
+        if not DUPLICATE_DETECTION or not record.success or not is_missing(record.duplicate_of):
+            return None
+        return self._check_fingerprint(record.source_file, record.trn, record.invoice_number,
+                                       record.net_total, record.invoice_date)
+
+    def flag_frame(self, frame, layout):
+        """Copy of a normalized results frame with duplicate_of set for repeated invoices"""
+        keys = LAYOUTS[layout]
+        columns = ("status", "duplicate_of", "source_file", "trn", "invoice_number", "net_total", "invoice_date")
+        flagged = frame.copy()
+        flagged[keys["duplicate_of"]] = [
+            duplicate_of if not is_missing(duplicate_of)
+            else self._check_fingerprint(*fields) if DUPLICATE_DETECTION and status == "success" else None
+            for status, duplicate_of, *fields in zip(*(frame[keys[field]] for field in columns))
+        ]
+        return flagged
+
+    def stored_record(self, file_hash, source_file):
+        """Record for a duplicate of a file stored by an earlier run, or None"""
+        stored = self._stored("find_file", file_hash)
+        if stored is None:
+            return None
+        record = InvoiceRecord(status="success", **{field: stored[field] for field in STORED_FIELDS})
+        record.source_file = source_file
+        record.duplicate_of = stored["source_file"]
+        return record
+
+    def describe(self) -> str:
+        return f"{self.file_duplicates} identical file(s), {self.invoice_duplicates} re-issued invoice(s) flagged as duplicates"
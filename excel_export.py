@@ -0,0 +1,23 @@
+"""
+In-memory workbook and CSV export for the download buttons.
+
+Workbooks are built in a BytesIO buffer and handed to st.download_button
+directly, so nothing is written to (or left behind in) the working
+directory. Both the Excel and CSV exports are produced from one typed
+DataFrame (normalization.normalize_frame), converted once per result set.
+"""
+
+import io
+
+import pandas as pd
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def workbook_bytes(sheets) -> bytes:
+    """Serialize {sheet_name: DataFrame} to .xlsx bytes in memory"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        for sheet_name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+    return buffer.getvalue()
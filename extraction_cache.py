@@ -0,0 +1,125 @@
+"""
+Memoized Gemini extraction results.
+
+Results are keyed by (model name, hash of the prompt constant, hash of the
+document text, output format), so editing a prompt, the response schema or
+the JSON mode only invalidates the entries that were produced with it. Entries live in a small SQLite file with TTL and
+maximum-size eviction, and hit/miss counters are kept per process.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(".invoice_cache", "extractions.sqlite3"))
+EXTRACTION_CACHE_TTL_HOURS = float(os.getenv("EXTRACTION_CACHE_TTL_HOURS", "720"))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "50000"))
+
+
+def text_hash(text) -> str:
+    """SHA-256 hex digest of a prompt or document string"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """SQLite-backed cache of extracted invoice dicts with TTL and size eviction"""
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, ttl_hours=EXTRACTION_CACHE_TTL_HOURS,
+                 max_entries=EXTRACTION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extractions (
+                    cache_key TEXT PRIMARY KEY,
+                    model_name TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    document_hash TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions (last_used)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def make_key(model_name, prompt, document, output_format=""):
+        """Build the cache key for one model/prompt/document/output format combination.
+
+        output_format is structured_output.output_format_key() of the response schema.
+        """
+        parts = (model_name, text_hash(prompt), text_hash(document))
+        return text_hash("|".join(parts + (output_format,))), parts
+
+    def get(self, model_name, prompt, document, output_format=""):
+        """Return the cached result dict, or None on a miss"""
+        key, _ = self.make_key(model_name, prompt, document, output_format)
+        now = time.time()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT payload, created_at FROM extractions WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl_seconds:
+                    conn.execute("UPDATE extractions SET last_used = ? WHERE cache_key = ?", (now, key))
+                    conn.commit()
+                    self.hits += 1
+                    return json.loads(row[0])
+                if row:
+                    conn.execute("DELETE FROM extractions WHERE cache_key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            finally:
+                conn.close()
+
+    def put(self, model_name, prompt, document, result, output_format=""):
+        """Store a result dict and evict expired or least recently used entries"""
+        key, (model_name, prompt_hash, document_hash) = self.make_key(model_name, prompt, document, output_format)
+        now = time.time()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, model_name, prompt_hash, document_hash, json.dumps(result), now, now)
+                )
+                conn.execute("DELETE FROM extractions WHERE created_at < ?", (now - self.ttl_seconds,))
+                conn.execute("""
+                    DELETE FROM extractions WHERE cache_key IN (
+                        SELECT cache_key FROM extractions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Shared cache used by all invoice apps
+extraction_cache = ExtractionCache()
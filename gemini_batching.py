@@ -0,0 +1,148 @@
+"""
+Multi-invoice batched Gemini requests.
+
+Packs several parsed invoices into one generate_content call so the
+instruction prompt is sent once per batch instead of once per invoice.
+Documents are delimited and numbered, the model is asked for a JSON array
+with one object per document, and every element is mapped back to its
+source_file. With a response schema the array is requested in JSON mode.
+Batch size adapts to a token budget, and any document the batch response
+does not cleanly cover falls back to a per-invoice call.
+"""
+
+import os
+
+from batch_executor import run_batch
+from rate_limiter import estimate_tokens, generate_content
+from structured_output import generate_json, repair_json
+
+GEMINI_BATCH_TOKEN_BUDGET = int(os.getenv("GEMINI_BATCH_TOKEN_BUDGET", "24000"))
+GEMINI_BATCH_MAX_DOCS = int(os.getenv("GEMINI_BATCH_MAX_DOCS", "8"))
+
+# Keys every batch array element carries on top of the extraction fields
+BATCH_KEYS = ("document_index", "source_file")
+
+BATCH_INSTRUCTIONS = """
+BATCH MODE: You will receive several invoice documents. Each one starts with a line
+"=== DOCUMENT <n> | source_file: <file name> ===" and ends with "=== END DOCUMENT <n> ===".
+
+Return ONLY a JSON array with exactly one object per document, in document order.
+Each object must use the JSON structure described above, plus:
+  "document_index": <n> (the document number),
+  "source_file": "<file name exactly as given>"
+Do not merge documents and do not skip any document.
+"""
+
+
+def plan_batches(documents, prompt, token_budget=GEMINI_BATCH_TOKEN_BUDGET, max_docs=GEMINI_BATCH_MAX_DOCS):
+    """Group document indexes into batches that fit the token budget.
+
+    documents is a list of (source_file, markdown_text). A document that is
+    larger than the budget on its own gets a batch of its own.
+    """
+    overhead = estimate_tokens(prompt + BATCH_INSTRUCTIONS)
+    batches = []
+    current, current_tokens = [], overhead
+    for idx, (source_file, markdown_text) in enumerate(documents):
+        doc_tokens = estimate_tokens(markdown_text) + estimate_tokens(source_file) + 20
+        if current and (current_tokens + doc_tokens > token_budget or len(current) >= max_docs):
+            batches.append(current)
+            current, current_tokens = [], overhead
+        current.append(idx)
+        current_tokens += doc_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_prompt(prompt, documents) -> str:
+    """Combine the instruction prompt with delimited documents"""
+    parts = [prompt, BATCH_INSTRUCTIONS, "\nInvoice documents:\n"]
+    for n, (source_file, markdown_text) in enumerate(documents, 1):
+        parts.append(f"=== DOCUMENT {n} | source_file: {source_file} ===\n{markdown_text}\n=== END DOCUMENT {n} ===\n")
+    return "\n".join(parts)
+
+
+def parse_json_array(text):
+    """Extract a JSON array from a model response, or raise ValueError"""
+    data = repair_json(text, "[")
+    if not isinstance(data, list):
+        raise ValueError("Batch response is not a JSON array")
+    return data
+
+
+def document_fields(element) -> dict:
+    """A batch array element without its bookkeeping keys (document_index, source_file)"""
+    return {key: value for key, value in element.items() if key not in BATCH_KEYS}
+
+
+def map_batch_results(documents, elements) -> list:
+    """Match array elements back to documents; unmatched documents get None"""
+    results = [None] * len(documents)
+    names = [source_file for source_file, _ in documents]
+    for element in elements:
+        if not isinstance(element, dict):
+            continue
+        element = dict(element)
+        position = element.pop("document_index", None)
+        source_file = element.get("source_file")
+
+        idx = None
+        if isinstance(position, int) and 1 <= position <= len(documents) and names[position - 1] == source_file:
+            idx = position - 1
+        elif source_file in names and names.count(source_file) == 1:
+            idx = names.index(source_file)
+
+        if idx is not None and results[idx] is None:
+            results[idx] = element
+    return results
+
+
+def extract_in_batches(model, prompt, documents, fallback, token_budget=GEMINI_BATCH_TOKEN_BUDGET,
+                       max_docs=GEMINI_BATCH_MAX_DOCS, max_workers=1, on_batch_complete=None,
+                       thread_initializer=None, schema=None) -> list:
+    """Extract many invoices with as few generate_content calls as possible.
+
+    documents is a list of (source_file, markdown_text). Returns one result per
+    document, in order: the dict from the batch response, or
+    fallback(source_file, markdown_text) when the batch response was malformed
+    or did not include that document. An exception raised by fallback is
+    returned in place of the result instead of aborting the batch. schema is
+    the array response schema (structured_output.batch_schema) for JSON mode.
+    """
+    batches = plan_batches(documents, prompt, token_budget, max_docs)
+
+    def run_fallback(doc):
+        try:
+            return fallback(*doc)
+        except Exception as e:
+            return e
+
+    def run_one_batch(indexes):
+        batch_docs = [documents[i] for i in indexes]
+        if len(batch_docs) == 1:
+            return [run_fallback(batch_docs[0])]
+        try:
+            batch_prompt = build_batch_prompt(prompt, batch_docs)
+            if schema is not None:
+                elements = generate_json(model, batch_prompt, schema)
+            else:
+                elements = parse_json_array(generate_content(model, batch_prompt).text)
+            mapped = map_batch_results(batch_docs, elements)
+        except Exception:
+            # Malformed batch - one bad document must not sink the others
+            mapped = [None] * len(batch_docs)
+        return [data if data is not None else run_fallback(doc) for data, doc in zip(mapped, batch_docs)]
+
+    def report(done, idx, indexes, batch_results):
+        if on_batch_complete:
+            on_batch_complete(done, len(batches), len(indexes))
+
+    batch_results = run_batch(run_one_batch, batches, max_workers=max_workers,
+                              on_complete=report, thread_initializer=thread_initializer)
+
+    results = [None] * len(documents)
+    for indexes, values in zip(batches, batch_results):
+        for i, value in zip(indexes, values):
+            results[i] = value
+    return results
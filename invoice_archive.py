@@ -0,0 +1,180 @@
+"""
+Partitioned Parquet archive of extracted invoices.
+
+Every run also appends its successful, normalized records to a Parquet
+dataset under INVOICE_ARCHIVE_DIR, hive-partitioned as
+kind=purchase|sales/year=YYYY/month=M (invoice date; undated invoices go
+to the default partition). Columns use the canonical InvoiceRecord field
+names, so purchase and sales records share one schema. A run is written
+in one pass, one Parquet file per partition, and every row carries its
+source file's fingerprint (file_key: batch_journal.file_key, name +
+content hash). Archiving a file again - in a later run, or when more
+uploads join the session - first removes that file's earlier rows (a
+scan of the file_key column), so no row is ever archived twice.
+
+Historical totals and re-exports are column scans over the dataset
+(load_archive / archive_totals) instead of opening old workbooks.
+Needs pyarrow; without it archiving is skipped.
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from invoice_records import LAYOUTS
+from normalization import to_float
+
+INVOICE_ARCHIVE = os.getenv("INVOICE_ARCHIVE", "1") == "1"
+INVOICE_ARCHIVE_DIR = os.getenv("INVOICE_ARCHIVE_DIR", "invoice_archive")
+
+# Canonical columns stored in the archive, with their Arrow types
+ARCHIVE_COLUMNS = (
+    ("source_file", "string"), ("invoice_date", "date32"), ("invoice_number", "string"),
+    ("party_name", "string"), ("party_address", "string"), ("trn", "string"),
+    ("subtotal", "float64"), ("tax_amount", "float64"), ("net_total", "float64"), ("currency", "string"),
+    ("description", "string"), ("quantity", "float64"), ("unit_price", "float64"),
+    ("payment_terms", "string"), ("items_count", "int64"),
+    ("parse_backend", "string"), ("extraction_method", "string"),
+    ("file_key", "string"), ("run_id", "string"), ("archived_at", "timestamp"),
+)
+PARTITION_COLUMNS = (("kind", "string"), ("year", "int16"), ("month", "int8"))
+
+
+def _arrow_type(name):
+    return pa.timestamp("s", tz="UTC") if name == "timestamp" else getattr(pa, name)()
+
+
+def archive_schema():
+    """Arrow schema of the archived records, partition columns last"""
+    return pa.schema([(column, _arrow_type(type_name)) for column, type_name in ARCHIVE_COLUMNS + PARTITION_COLUMNS])
+
+
+def archive_partitioning():
+    return ds.partitioning(
+        pa.schema([(column, _arrow_type(type_name)) for column, type_name in PARTITION_COLUMNS]), flavor="hive"
+    )
+
+
+def archive_available() -> bool:
+    return INVOICE_ARCHIVE and pa is not None
+
+
+def archive_table(frame, layout, kind, run_id, file_keys=None):
+    """Arrow table of a normalized results frame (successful rows, app layout) in the archive schema"""
+    canonical = frame.rename(columns={key: field for field, key in LAYOUTS[layout].items()})
+    file_keys = file_keys or {}
+    columns = {}
+    rows = len(canonical)
+    for column, type_name in ARCHIVE_COLUMNS:
+        if column == "file_key":
+            values = pa.array([file_keys.get(source, source) for source in canonical["source_file"]], pa.string())
+        elif column == "run_id":
+            values = pa.array([run_id] * rows, pa.string())
+        elif column == "archived_at":
+            values = pa.array([datetime.now(timezone.utc)] * rows, _arrow_type("timestamp"))
+        elif column not in canonical.columns:
+            values = pa.nulls(rows, _arrow_type(type_name))
+        elif type_name == "date32":
+            # ISO "YYYY-MM-DD" strings from normalization.normalize_dates
+            text = pa.array(canonical[column].astype("object").where(canonical[column].notna(), None), pa.string())
+            values = pc.cast(pc.strptime(text, format="%Y-%m-%d", unit="s", error_is_null=True), pa.date32())
+        else:
+            series = canonical[column].astype("object").where(canonical[column].notna(), None)
+            if type_name == "float64":
+                # Decimal amounts from normalization.normalize_money
+                series = series.map(to_float)
+            values = pa.array(series.tolist(), _arrow_type(type_name), from_pandas=True)
+        columns[column] = values
+
+    dates = columns["invoice_date"]
+    columns["kind"] = pa.array([kind] * rows, pa.string())
+    columns["year"] = pc.cast(pc.year(dates), pa.int16())
+    columns["month"] = pc.cast(pc.month(dates), pa.int8())
+    return pa.table(columns, schema=archive_schema())
+
+
+def remove_archived_files(kind, keys, archive_dir=INVOICE_ARCHIVE_DIR) -> int:
+    """Drop the rows of the given file keys from a kind's Parquet files; returns the rows removed"""
+    root = os.path.join(archive_dir, f"kind={kind}")
+    if not os.path.isdir(root) or not keys:
+        return 0
+    value_set = pa.array(sorted(keys), pa.string())
+    removed = 0
+    for path in ds.dataset(root, format="parquet").files:
+        with pq.ParquetFile(path) as parquet_file:
+            if "file_key" not in parquet_file.schema_arrow.names:
+                continue
+            hits = pc.fill_null(pc.is_in(parquet_file.read(columns=["file_key"]).column("file_key"),
+                                         value_set=value_set), False)
+            count = pc.sum(hits).as_py() or 0
+            kept = parquet_file.read().filter(pc.invert(hits)) if 0 < count < len(hits) else None
+        if not count:
+            continue
+        if kept is None:
+            os.remove(path)
+        else:
+            pq.write_table(kept, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        removed += count
+    return removed
+
+
+def archive_frame(frame, layout, kind, run_id, file_keys=None, archive_dir=INVOICE_ARCHIVE_DIR) -> int:
+    """Write a run's normalized results to the archive; returns the number of rows written.
+
+    frame holds rows in the given invoice_records layout; only successful
+    rows not flagged as duplicates are archived. file_keys maps source
+    files to their fingerprint (the file name is used when missing). Rows
+    archived before for the same files are replaced.
+    """
+    if not archive_available() or frame is None or len(frame) == 0:
+        return 0
+    status_key = LAYOUTS[layout].get("status")
+    if status_key in frame.columns:
+        frame = frame[frame[status_key] == "success"]
+    duplicate_key = LAYOUTS[layout].get("duplicate_of")
+    if duplicate_key in frame.columns:
+        frame = frame[frame[duplicate_key].isna()]
+    if len(frame) == 0:
+        return 0
+
+    table = archive_table(frame, layout, kind, run_id, file_keys)
+    # The files' rows may sit in other partitions than this time (e.g. a corrected date)
+    remove_archived_files(kind, set(table.column("file_key").to_pylist()), archive_dir)
+    ds.write_dataset(
+        table, archive_dir, format="parquet", partitioning=archive_partitioning(),
+        basename_template=f"run-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+def load_archive(kind=None, year=None, month=None, columns=None, archive_dir=INVOICE_ARCHIVE_DIR):
+    """Arrow table of archived records, pruned to the requested partitions and columns"""
+    if pa is None:
+        raise ImportError("pyarrow not installed. Install with: pip install pyarrow")
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning=archive_partitioning(), schema=archive_schema())
+    condition = None
+    for column, value in (("kind", kind), ("year", year), ("month", month)):
+        if value is not None:
+            term = ds.field(column) == value
+            condition = term if condition is None else condition & term
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def archive_totals(kind=None, year=None, group_by=("kind", "year", "month", "currency"),
+                   archive_dir=INVOICE_ARCHIVE_DIR):
+    """Invoice count and subtotal/tax/net sums per group, from a scan of the amount columns"""
+    table = load_archive(kind=kind, year=year, archive_dir=archive_dir,
+                         columns=list(group_by) + ["subtotal", "tax_amount", "net_total"])
+    return table.group_by(list(group_by)).aggregate([
+        ([], "count_all"), ("subtotal", "sum"), ("tax_amount", "sum"), ("net_total", "sum"),
+    ])
@@ -0,0 +1,307 @@
+"""
+Invoice extraction core shared by the Streamlit apps and the batch CLI.
+
+Nothing in here imports Streamlit: the apps wrap these functions with their
+own progress and error display, and batch_cli.py runs them headless.
+Purchase invoices use GEMINI_PROMPT (invoice_to_excel_enhanced.py) and
+sales invoices use SALES_EXTRACTION_PROMPT (sales_invoice_to_excel.py).
+"""
+
+import json
+from typing import Callable, NamedTuple, Optional
+
+from parse_cache import parse_cache
+from pdf_handoff import run_parser_on_pdf
+from extraction_cache import extraction_cache
+from local_pdf_text import extract_local_pages, BACKEND_LOCAL, BACKEND_LLAMAPARSE
+from rule_extractor import rule_based_fields
+from markdown_compaction import compact_pages
+from rate_limiter import rate_limited_parse
+from structured_output import (
+    generate_json, object_schema, batch_schema, output_format_key, PURCHASE_FIELDS, SALES_FIELDS
+)
+from client_registry import llama_parser_for_pages
+from invoice_records import InvoiceRecord, layout_columns
+from page_selection import (
+    select_pages, missing_required_fields, PURCHASE_REQUIRED_FIELDS, SALES_REQUIRED_FIELDS
+)
+
+PURCHASE_MODEL_NAME = "gemini-1.5-flash"
+SALES_MODEL_NAME = "gemini-2.0-flash-exp"
+
+# ==================== PROMPTS ====================
+
+# Enhanced Gemini Prompt
+GEMINI_PROMPT = """You are an expert invoice data extraction system.
+
+Analyze the invoice document and extract the following information with precision:
+
+CRITICAL: Return ONLY a valid JSON object with NO additional text, explanations, or markdown formatting.
+
+Required JSON structure:
+{
+  "date": "YYYY-MM-DD format (convert any date format to this)",
+  "invoice_number": "string (invoice/bill number)",
+  "party_name": "string (vendor/supplier name)",
+  "party_address": "string (complete vendor address)",
+  "trn": "string or null (Tax Registration Number/VAT/TIN)",
+  "subtotal": number (amount before tax),
+  "tax_amount": number (total tax/VAT amount),
+  "net_total": number (final amount including tax),
+  "currency": "string (currency code like USD, EUR, AED, etc.)",
+  "items_count": number (number of line items, or null if not clear)
+}
+
+Rules:
+- Use null for missing fields (not "N/A", "Unknown", or empty strings)
+- All numbers must be numeric values without currency symbols
+- Date must be in YYYY-MM-DD format
+- Extract the most prominent company name as party_name
+- Return ONLY the JSON object, no other text
+"""
+
+SALES_EXTRACTION_PROMPT = """
+You are an expert at extracting data from SALES INVOICES. 
+
+IMPORTANT: This is a SALES INVOICE where:
+- YOUR COMPANY is the vendor/seller (the company issuing and sending the invoice)
+- The CUSTOMER is the party being billed (in "Bill To" section)
+
+Extract the following information from this sales invoice and return ONLY valid JSON:
+
+{
+    "invoice_date": "YYYY-MM-DD format",
+    "invoice_number": "Invoice number",
+    "customer_name": "Customer company name (Bill To section)",
+    "customer_address": "Full customer address",
+    "customer_trn": "Customer TRN/Tax Registration Number if available, else null",
+    "subtotal": "Subtotal amount as number (no currency symbols)",
+    "tax_amount": "Tax/VAT amount as number",
+    "net_total": "Final total amount as number",
+    "currency": "Currency code (e.g., AED, USD)",
+    "description": "Brief description of items/services",
+    "payment_terms": "Payment terms if mentioned, else null",
+    "items_count": "Number of line items"
+}
+
+Rules:
+- Return ONLY valid JSON, no additional text
+- All amounts must be numbers without currency symbols
+- Date must be in YYYY-MM-DD format
+- Extract customer from "Bill To" section
+- Your company (the issuer) should NOT be in customer_name
+"""
+
+# Gemini response schemas (JSON mode) for the prompts above
+PURCHASE_SCHEMA = object_schema(PURCHASE_FIELDS)
+PURCHASE_BATCH_SCHEMA = batch_schema(PURCHASE_FIELDS)
+SALES_SCHEMA = object_schema(SALES_FIELDS)
+# Extraction-cache output formats of the single-document schemas
+PURCHASE_OUTPUT_FORMAT = output_format_key(PURCHASE_SCHEMA)
+SALES_OUTPUT_FORMAT = output_format_key(SALES_SCHEMA)
+
+# Column order of a purchase / sales result row
+PURCHASE_COLUMNS = layout_columns("purchase")
+SALES_COLUMNS = layout_columns("sales")
+
+# ==================== PARSING ====================
+
+class ParsedDocument(NamedTuple):
+    """Parse stage output handed to the extract stage"""
+    markdown_text: str
+    parse_backend: str
+    tokens_saved: int
+    # 0-based pages that were parsed (None for the whole document) and a
+    # callable returning the whole-document ParsedDocument for fallbacks
+    pages: Optional[list] = None
+    reparse_full: Optional[Callable] = None
+
+
+def parse_pdf_to_markdown(pdf_bytes, parser_factory, separator="\n", file_name="invoice.pdf",
+                          pages=None) -> ParsedDocument:
+    """Convert a PDF (or the 0-based pages of it) to compacted markdown.
+
+    pdf_bytes may be bytes or a memoryview over the upload (see pdf_handoff).
+    Digital PDFs are read from their text layer locally; LlamaParse (cached
+    by file content and page subset) is only used when that layer is missing
+    or too sparse. parser_factory() must return a LlamaParse instance and is
+    only called on a cache miss. The pages are compacted (repeated headers,
+    boilerplate, table padding, token cap) and tokens_saved is the estimated
+    reduction.
+    """
+    def parse_whole_document():
+        return parse_pdf_to_markdown(pdf_bytes, parser_factory, separator, file_name)
+
+    def parsed(page_texts, backend, parsed_pages):
+        markdown_text, tokens_saved = compact_pages(page_texts, separator)
+        reparse_full = parse_whole_document if parsed_pages is not None else None
+        return ParsedDocument(markdown_text, backend, tokens_saved, parsed_pages, reparse_full)
+
+    local_pages = extract_local_pages(pdf_bytes, pages)
+    if local_pages:
+        return parsed(local_pages, BACKEND_LOCAL, pages)
+
+    parser = None
+    if pages is not None:
+        parser = llama_parser_for_pages(parser_factory(), pages)
+        if parser is None:
+            # Installed llama_parse can't target pages - parse everything
+            pages = None
+
+    def run_llamaparse():
+        # Parse PDF to markdown straight from memory, within the API key's rate budget
+        client = parser or parser_factory()
+        documents = rate_limited_parse(client, lambda: run_parser_on_pdf(client.load_data, pdf_bytes, file_name))
+        return [doc.text for doc in documents]
+
+    # Cached by file content (and page subset), so re-uploads skip LlamaParse
+    page_texts = parse_cache.get_or_parse(pdf_bytes, run_llamaparse, result_type="markdown", language="en",
+                                          pages=pages)
+    return parsed(page_texts, BACKEND_LLAMAPARSE, pages)
+
+# ==================== EXTRACTION ====================
+
+def gemini_purchase_fields(markdown_text: str, model) -> dict:
+    """One Gemini call for the GEMINI_PROMPT fields (JSON mode, constrained to PURCHASE_SCHEMA), no rules or cache"""
+    return generate_json(model, GEMINI_PROMPT + "\n\nInvoice content:\n" + markdown_text, PURCHASE_SCHEMA)
+
+def extract_purchase_fields(markdown_text: str, model) -> dict:
+    """Extract the GEMINI_PROMPT fields from invoice markdown"""
+    # Easy invoices (all anchors found, totals reconcile) never reach Gemini
+    data = rule_based_fields(markdown_text)
+    if data is not None:
+        data["extraction_method"] = "rules"
+        return data
+
+    # Reuse a previous extraction of the same document with the same prompt/model
+    data = extraction_cache.get(model.model_name, GEMINI_PROMPT, markdown_text, PURCHASE_OUTPUT_FORMAT)
+    if data is None:
+        data = gemini_purchase_fields(markdown_text, model)
+        extraction_cache.put(model.model_name, GEMINI_PROMPT, markdown_text, data, PURCHASE_OUTPUT_FORMAT)
+    return data
+
+def extract_sales_fields(markdown_text: str, model) -> dict:
+    """Extract the SALES_EXTRACTION_PROMPT fields (memoized per model/prompt/document)"""
+    cached = extraction_cache.get(model.model_name, SALES_EXTRACTION_PROMPT, markdown_text, SALES_OUTPUT_FORMAT)
+    if cached is not None:
+        return cached
+
+    try:
+        prompt = f"{SALES_EXTRACTION_PROMPT}\n\nSALES INVOICE TEXT:\n{markdown_text}"
+
+        # JSON mode, constrained to SALES_SCHEMA
+        data = generate_json(model, prompt, SALES_SCHEMA)
+        extraction_cache.put(model.model_name, SALES_EXTRACTION_PROMPT, markdown_text, data, SALES_OUTPUT_FORMAT)
+        return data
+
+    except json.JSONDecodeError as e:
+        raise Exception(f"JSON parsing error: {str(e)}\nResponse: {e.doc[:200]}")
+    except Exception as e:
+        raise Exception(f"Gemini extraction error: {str(e)}")
+
+# ==================== RESULT RECORDS ====================
+
+def purchase_success_record(data: dict, source_file: str, parse_backend: str, tokens_saved: int = 0) -> InvoiceRecord:
+    """Record of extracted purchase data, tagged with its source filename, parse backend and success status"""
+    record = InvoiceRecord.from_row(data, "purchase")
+    record.source_file = source_file
+    record.parse_backend = parse_backend
+    record.tokens_saved = tokens_saved
+    record.extraction_method = data.get("extraction_method") or "gemini"
+    record.status = "success"
+    return record
+
+def purchase_failed_record(source_file: str, error: Exception) -> InvoiceRecord:
+    """Failed record for a purchase invoice"""
+    if isinstance(error, json.JSONDecodeError):
+        error_message = f"JSON parsing error: {str(error)}"
+    else:
+        error_message = str(error)
+    return InvoiceRecord.failed(source_file, error_message)
+
+def sales_success_record(data: dict, filename: str, parse_backend: str, tokens_saved: int = 0) -> InvoiceRecord:
+    """Record of extracted sales data, tagged with its filename, parse backend and success status"""
+    record = InvoiceRecord.from_row(data, "sales")
+    record.source_file = filename
+    record.parse_backend = parse_backend
+    record.tokens_saved = tokens_saved
+    record.status = "success"
+    return record
+
+def sales_failed_record(filename: str, error: Exception) -> InvoiceRecord:
+    """Failed record for a sales invoice"""
+    return InvoiceRecord.failed(filename, str(error))
+
+# ==================== PIPELINE STAGES ====================
+
+def extract_with_page_fallback(parsed, extract_fields, model, required_fields) -> tuple:
+    """Extract from the selected pages; re-parse the whole PDF if required fields are missing.
+
+    Returns (data, parsed) where parsed is the document the data came from.
+    """
+    data = extract_fields(parsed.markdown_text, model)
+    if parsed.reparse_full is not None and missing_required_fields(data, required_fields):
+        parsed = parsed.reparse_full()
+        data = extract_fields(parsed.markdown_text, model)
+    return data, parsed
+
+def parse_purchase_pdf(pdf_bytes, source_file, parser_factory) -> ParsedDocument:
+    """Parse stage for a purchase invoice (long PDFs: selected pages only)"""
+    return parse_pdf_to_markdown(pdf_bytes, parser_factory, file_name=source_file, pages=select_pages(pdf_bytes))
+
+def extract_purchase_invoice(parsed, source_file, model) -> InvoiceRecord:
+    """Extract stage for a purchase invoice: success record from parse_purchase_pdf output"""
+    data, parsed = extract_with_page_fallback(parsed, extract_purchase_fields, model, PURCHASE_REQUIRED_FIELDS)
+    return purchase_success_record(data, source_file, parsed.parse_backend, parsed.tokens_saved)
+
+def parse_sales_pdf(pdf_bytes, filename, parser_factory) -> ParsedDocument:
+    """Parse stage for a sales invoice (long PDFs: selected pages only)"""
+    try:
+        parsed = parse_pdf_to_markdown(pdf_bytes, parser_factory, separator="\n\n", file_name=filename,
+                                       pages=select_pages(pdf_bytes))
+    except Exception as e:
+        raise Exception(f"LlamaParse error: {str(e)}")
+    if parsed.reparse_full is not None:
+        # Keep the "LlamaParse error" wording if the whole-document fallback fails too
+        parse_whole_document = parsed.reparse_full
+
+        def reparse_full():
+            try:
+                return parse_whole_document()
+            except Exception as e:
+                raise Exception(f"LlamaParse error: {str(e)}")
+
+        parsed = parsed._replace(reparse_full=reparse_full)
+    return parsed
+
+def extract_sales_invoice(parsed, filename, model) -> InvoiceRecord:
+    """Extract stage for a sales invoice: success record from parse_sales_pdf output"""
+    invoice_data, parsed = extract_with_page_fallback(parsed, extract_sales_fields, model, SALES_REQUIRED_FIELDS)
+    return sales_success_record(invoice_data, filename, parsed.parse_backend, parsed.tokens_saved)
+
+# ==================== SINGLE-FILE PIPELINES ====================
+
+def process_purchase_invoice(pdf_bytes, source_file, parser_factory, model, on_error=None) -> InvoiceRecord:
+    """Parse and extract one purchase invoice; failures become failed records.
+
+    on_error(source_file, error) is called for failures so callers can report them.
+    """
+    try:
+        parsed = parse_purchase_pdf(pdf_bytes, source_file, parser_factory)
+        return extract_purchase_invoice(parsed, source_file, model)
+    except Exception as e:
+        if on_error:
+            on_error(source_file, e)
+        return purchase_failed_record(source_file, e)
+
+def process_sales_invoice(pdf_bytes, filename, parser_factory, model) -> InvoiceRecord:
+    """Parse and extract one sales invoice; failures become failed records"""
+    try:
+        # Step 1: Parse PDF
+        parsed = parse_sales_pdf(pdf_bytes, filename, parser_factory)
+
+        # Step 2: Extract data
+        return extract_sales_invoice(parsed, filename, model)
+
+    except Exception as e:
+        return sales_failed_record(filename, e)
@@ -0,0 +1,199 @@
+"""
+Slotted invoice record and column-oriented batch container.
+
+The apps name the same fields differently (party_name / customer_name /
+vendor_name, processing_status / status, source_file / filename, ...).
+InvoiceRecord holds one invoice under a single set of canonical field
+names, with __slots__ instead of a per-row dict. It is what the
+extraction stages return and what the journal, duplicate detection, the
+running totals and the writers take. Each row format the apps read or
+write (Gemini JSON, Excel rows, DataFrame columns) is a layout: a mapping
+from canonical fields to that format's keys, in column order; rows in a
+layout are only built at those boundaries. InvoiceBatch stores records
+column by column, so a batch becomes a DataFrame or an Arrow table
+without building a dict per row.
+"""
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Canonical invoice fields
+FIELDS = (
+    "status", "source_file", "invoice_date", "invoice_number",
+    "party_name", "party_address", "trn",
+    "subtotal", "tax_amount", "net_total", "currency",
+    "description", "quantity", "unit_price", "payment_terms", "items_count",
+    "parse_backend", "tokens_saved", "extraction_method", "duplicate_of", "error",
+)
+
+# Row formats: {canonical field: row key}, in column order
+LAYOUTS = {
+    # invoice_extraction.PURCHASE_COLUMNS
+    "purchase": {
+        "status": "processing_status", "source_file": "source_file", "invoice_date": "date",
+        "invoice_number": "invoice_number", "party_name": "party_name", "party_address": "party_address",
+        "trn": "trn", "currency": "currency", "subtotal": "subtotal", "tax_amount": "tax_amount",
+        "net_total": "net_total", "items_count": "items_count", "parse_backend": "parse_backend",
+        "tokens_saved": "tokens_saved", "extraction_method": "extraction_method", "duplicate_of": "duplicate_of",
+        "error": "error_message",
+    },
+    # invoice_extraction.SALES_COLUMNS
+    "sales": {
+        "status": "status", "source_file": "filename", "invoice_date": "invoice_date",
+        "invoice_number": "invoice_number", "party_name": "customer_name", "party_address": "customer_address",
+        "trn": "customer_trn", "subtotal": "subtotal", "tax_amount": "tax_amount", "net_total": "net_total",
+        "currency": "currency", "description": "description", "payment_terms": "payment_terms",
+        "items_count": "items_count", "parse_backend": "parse_backend", "tokens_saved": "tokens_saved",
+        "duplicate_of": "duplicate_of", "error": "error",
+    },
+    # Line-level rows of invoice_to_excel_enhanced_with_keys.py
+    "purchase_line": {
+        "invoice_number": "invoice_number", "invoice_date": "invoice_date", "party_name": "vendor_name",
+        "party_address": "vendor_address", "description": "description", "quantity": "quantity",
+        "unit_price": "unit_price", "net_total": "total_amount", "tax_amount": "tax_amount",
+        "currency": "currency", "source_file": "filename",
+    },
+    # Line-level rows of sales_invoice_to_excel_with_keys.py
+    "sales_line": {
+        "invoice_number": "invoice_number", "invoice_date": "invoice_date", "party_name": "customer_name",
+        "party_address": "customer_address", "description": "service_description", "quantity": "quantity",
+        "unit_price": "unit_price", "net_total": "total_amount", "tax_amount": "tax_amount",
+        "currency": "currency", "source_file": "filename",
+    },
+}
+
+
+def layout_columns(layout) -> list:
+    """Row keys of a layout, in column order"""
+    return list(LAYOUTS[layout].values())
+
+
+class InvoiceRecord:
+    """One invoice under canonical field names (unset fields are None)"""
+
+    __slots__ = FIELDS
+
+    def __init__(self, **values):
+        for field in FIELDS:
+            setattr(self, field, values.pop(field, None))
+        if values:
+            raise TypeError(f"Unknown invoice fields: {', '.join(values)}")
+
+    @classmethod
+    def from_row(cls, row, layout):
+        """Record from a row dict in the given layout (keys outside the layout are dropped)"""
+        record = cls.__new__(cls)
+        keys = LAYOUTS[layout]
+        for field in FIELDS:
+            key = keys.get(field)
+            setattr(record, field, row.get(key) if key is not None else None)
+        return record
+
+    @classmethod
+    def from_dict(cls, values):
+        """Record from to_dict() output (unknown fields are dropped)"""
+        return cls(**{field: value for field, value in values.items() if field in FIELDS})
+
+    @classmethod
+    def failed(cls, source_file, error):
+        """Record of a file that could not be processed"""
+        return cls(status="failed", source_file=source_file, error=error)
+
+    @property
+    def success(self) -> bool:
+        return self.status == "success"
+
+    def replace(self, **changes) -> "InvoiceRecord":
+        """Copy of the record with some fields changed"""
+        record = InvoiceRecord.__new__(InvoiceRecord)
+        for field in FIELDS:
+            setattr(record, field, changes.pop(field) if field in changes else getattr(self, field))
+        if changes:
+            raise TypeError(f"Unknown invoice fields: {', '.join(changes)}")
+        return record
+
+    def to_dict(self) -> dict:
+        """{canonical field: value} of the fields that are set (for the journal)"""
+        return {field: getattr(self, field) for field in FIELDS if getattr(self, field) is not None}
+
+    def values(self, layout) -> list:
+        """Field values in the given layout's column order"""
+        return [getattr(self, field) for field in LAYOUTS[layout]]
+
+    def to_row(self, layout) -> dict:
+        """Row dict in the given layout (keys in column order)"""
+        return {key: getattr(self, field) for field, key in LAYOUTS[layout].items()}
+
+
+class InvoiceBatch:
+    """Column-oriented invoice records: one list per canonical field.
+
+    A batch may be preallocated (size) and filled out of order with set(),
+    as results arrive from worker threads.
+    """
+
+    __slots__ = ("columns",)
+
+    def __init__(self, size=0):
+        self.columns = {field: [None] * size for field in FIELDS}
+
+    @classmethod
+    def from_records(cls, records):
+        """Batch of the given records, in order"""
+        batch = cls()
+        for record in records:
+            batch.append(record)
+        return batch
+
+    def __len__(self):
+        return len(self.columns["status"])
+
+    def __getitem__(self, idx) -> InvoiceRecord:
+        record = InvoiceRecord.__new__(InvoiceRecord)
+        for field, values in self.columns.items():
+            setattr(record, field, values[idx])
+        return record
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    def append(self, record):
+        for field, values in self.columns.items():
+            values.append(getattr(record, field))
+
+    def set(self, idx, record):
+        for field, values in self.columns.items():
+            values[idx] = getattr(record, field)
+
+    def select(self, status) -> "InvoiceBatch":
+        """Batch of the records with the given status ("success" / "failed")"""
+        keep = [idx for idx, value in enumerate(self.columns["status"]) if value == status]
+        selected = InvoiceBatch()
+        selected.columns = {field: [values[idx] for idx in keep] for field, values in self.columns.items()}
+        return selected
+
+    def column(self, field) -> list:
+        return self.columns[field]
+
+    def to_columns(self, layout) -> dict:
+        """{row key: column values} in the given layout"""
+        return {key: self.columns[field] for field, key in LAYOUTS[layout].items()}
+
+    def to_frame(self, layout):
+        """pandas DataFrame with the layout's columns, built column-wise"""
+        if pd is None:
+            raise ImportError("pandas not installed. Install with: pip install pandas")
+        return pd.DataFrame(self.to_columns(layout), columns=layout_columns(layout))
+
+    def to_arrow(self, layout):
+        """pyarrow Table with the layout's columns, built column-wise"""
+        if pa is None:
+            raise ImportError("pyarrow not installed. Install with: pip install pyarrow")
+        return pa.table(self.to_columns(layout))
@@ -0,0 +1,234 @@
+"""
+Persistent SQLite store of extracted invoices.
+
+Every run upserts its successful, normalized records into one table, so
+what was already extracted is remembered across runs. Each invoice has a
+natural key: kind (purchase/sales), the party's TRN (or its normalized
+name when there is no TRN) and the normalized invoice number, or the
+source file when neither the party nor the number is known; extracting
+the same invoice again updates its row instead of adding another one.
+Indexes on (trn, invoice_number), party name and invoice date keep
+lookups and period reports to indexed queries; the content hash and
+semantic fingerprint of each stored invoice back the cross-run duplicate
+checks in duplicate_detection.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from invoice_records import LAYOUTS
+from normalization import is_missing, to_float
+
+INVOICE_STORE_PATH = os.getenv("INVOICE_STORE_PATH", "invoice_store.sqlite3")
+
+# Canonical fields stored per invoice (see invoice_records.FIELDS)
+STORED_FIELDS = (
+    "invoice_date", "invoice_number", "party_name", "party_address", "trn",
+    "subtotal", "tax_amount", "net_total", "currency", "description", "quantity", "unit_price",
+    "payment_terms", "items_count", "source_file", "parse_backend", "extraction_method",
+)
+
+# Duplicate-check columns, added to stores created before they existed
+LOOKUP_COLUMNS = ("file_hash", "fingerprint")
+
+NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def normalize_key_part(value) -> str:
+    """Upper-case alphanumerics only ("inv-00 12" == "INV0012")"""
+    return "" if is_missing(value) else NON_ALNUM.sub("", str(value).upper())
+
+
+def natural_key(trn, party_name, invoice_number, source_file=None):
+    """Natural key of an invoice within its kind, or None when it has no identity at all"""
+    number = normalize_key_part(invoice_number)
+    name = normalize_key_part(party_name)
+    party = normalize_key_part(trn) or (f"NAME:{name}" if name else "")
+    if number and party:
+        return f"{party}|{number}"
+    # Without an invoice number, or without a party to scope it to, the file itself is
+    # the only identity we have ("INV-1" from two unknown vendors is not one invoice)
+    return f"FILE:{source_file}" if source_file else None
+
+
+def invoice_fingerprint(trn, invoice_number, net_total, invoice_date):
+    """Semantic identity of a normalized invoice: TRN, invoice number, net total in cents and ISO date.
+
+    None when there is no invoice number to match on.
+    """
+    number = normalize_key_part(invoice_number)
+    if not number:
+        return None
+    cents = "" if is_missing(net_total) else str(round(float(net_total) * 100))
+    date = "" if is_missing(invoice_date) else str(invoice_date)
+    return f"{normalize_key_part(trn)}|{number}|{cents}|{date}"
+
+
+def sql_value(value):
+    """Python value sqlite3 can bind (numpy scalars unwrapped, Decimal amounts as REAL, NaN/NA as NULL)"""
+    value = to_float(value)
+    return value.item() if hasattr(value, "item") else value
+
+
+class InvoiceStore:
+    """SQLite table of invoices with natural-key upserts and indexed lookups"""
+
+    def __init__(self, path=INVOICE_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            columns = ",\n".join(f"{field} {self._column_type(field)}" for field in STORED_FIELDS)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS invoices (
+                    kind TEXT NOT NULL,
+                    natural_key TEXT NOT NULL,
+                    {columns},
+                    file_hash TEXT,
+                    fingerprint TEXT,
+                    run_id TEXT,
+                    first_seen REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (kind, natural_key)
+                )
+            """)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(invoices)")}
+            for column in LOOKUP_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE invoices ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_trn_number ON invoices (trn, invoice_number)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_party ON invoices (party_name COLLATE NOCASE)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (kind, invoice_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_file_hash ON invoices (kind, file_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_fingerprint ON invoices (kind, fingerprint)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _column_type(field):
+        if field in ("subtotal", "tax_amount", "net_total", "quantity", "unit_price"):
+            return "REAL"
+        return "INTEGER" if field == "items_count" else "TEXT"
+
+    def upsert_frame(self, frame, layout, kind, run_id=None, file_hashes=None) -> tuple:
+        """Insert or update the successful rows of a normalized results frame.
+
+        frame holds rows in the given invoice_records layout; rows flagged as
+        duplicates are skipped. file_hashes maps source files to their
+        content hash. Returns (inserted, updated) counts.
+        """
+        if frame is None or len(frame) == 0:
+            return 0, 0
+        keys = LAYOUTS[layout]
+        status_key = keys.get("status")
+        if status_key in frame.columns:
+            frame = frame[frame[status_key] == "success"]
+        duplicate_key = keys.get("duplicate_of")
+        if duplicate_key in frame.columns:
+            frame = frame[frame[duplicate_key].isna()]
+        file_hashes = file_hashes or {}
+        canonical = frame.rename(columns={key: field for field, key in keys.items()})
+        columns = [field for field in STORED_FIELDS if field in canonical.columns]
+
+        now = time.time()
+        updates = ", ".join(f"{field} = excluded.{field}" for field in columns)
+        sql = f"""
+            INSERT INTO invoices (kind, natural_key, {", ".join(columns)}, file_hash, fingerprint,
+                                  run_id, first_seen, updated_at)
+            VALUES (?, ?, {", ".join("?" for _ in columns)}, ?, ?, ?, ?, ?)
+            ON CONFLICT (kind, natural_key) DO UPDATE SET {updates},
+                file_hash = excluded.file_hash, fingerprint = excluded.fingerprint,
+                run_id = excluded.run_id, updated_at = excluded.updated_at
+        """
+        inserted = updated = 0
+        with self._lock:
+            conn = self._connect()
+            try:
+                for row in canonical[columns].itertuples(index=False, name=None):
+                    record = dict(zip(columns, row))
+                    key = natural_key(record.get("trn"), record.get("party_name"),
+                                      record.get("invoice_number"), record.get("source_file"))
+                    if key is None:
+                        continue
+                    exists = conn.execute(
+                        "SELECT 1 FROM invoices WHERE kind = ? AND natural_key = ?", (kind, key)
+                    ).fetchone()
+                    fingerprint = invoice_fingerprint(record.get("trn"), record.get("invoice_number"),
+                                                      record.get("net_total"), record.get("invoice_date"))
+                    conn.execute(sql, (kind, key, *(sql_value(value) for value in row),
+                                       file_hashes.get(record.get("source_file")), fingerprint, run_id, now, now))
+                    if exists:
+                        updated += 1
+                    else:
+                        inserted += 1
+                conn.commit()
+            finally:
+                conn.close()
+        return inserted, updated
+
+    def _query(self, sql, params=()) -> list:
+        with self._lock:
+            conn = self._connect()
+            try:
+                return [dict(row) for row in conn.execute(sql, params).fetchall()]
+            finally:
+                conn.close()
+
+    def get(self, kind, key):
+        """Stored invoice for a natural key, or None"""
+        rows = self._query("SELECT * FROM invoices WHERE kind = ? AND natural_key = ?", (kind, key))
+        return rows[0] if rows else None
+
+    def find_file(self, kind, file_hash):
+        """Earliest stored invoice extracted from a file with this content hash, or None"""
+        rows = self._query("SELECT * FROM invoices WHERE kind = ? AND file_hash = ? ORDER BY first_seen LIMIT 1",
+                           (kind, file_hash))
+        return rows[0] if rows else None
+
+    def find_fingerprint(self, kind, fingerprint):
+        """Earliest stored invoice with this semantic fingerprint, or None"""
+        rows = self._query("SELECT * FROM invoices WHERE kind = ? AND fingerprint = ? ORDER BY first_seen LIMIT 1",
+                           (kind, fingerprint))
+        return rows[0] if rows else None
+
+    def find_by_number(self, trn, invoice_number) -> list:
+        """Invoices with this TRN and invoice number (both kinds)"""
+        return self._query("SELECT * FROM invoices WHERE trn = ? AND invoice_number = ?", (trn, invoice_number))
+
+    def find_by_party(self, party_name, kind=None) -> list:
+        """Invoices of a party (case-insensitive exact name), newest first"""
+        sql = "SELECT * FROM invoices WHERE party_name = ? COLLATE NOCASE"
+        params = [party_name]
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        return self._query(sql + " ORDER BY invoice_date DESC", params)
+
+    def period_report(self, kind, start_date, end_date) -> list:
+        """Count and sums per month and currency for ISO dates start_date..end_date (inclusive)"""
+        return self._query("""
+            SELECT substr(invoice_date, 1, 7) AS month, currency, COUNT(*) AS invoices,
+                   SUM(subtotal) AS subtotal, SUM(tax_amount) AS tax_amount, SUM(net_total) AS net_total
+            FROM invoices
+            WHERE kind = ? AND invoice_date BETWEEN ? AND ?
+            GROUP BY month, currency
+            ORDER BY month, currency
+        """, (kind, start_date, end_date))
+
+    def stats(self) -> dict:
+        """Stored invoice counts per kind"""
+        rows = self._query("SELECT kind, COUNT(*) AS invoices FROM invoices GROUP BY kind")
+        return {row["kind"]: row["invoices"] for row in rows}
+
+
+# Shared store used by all invoice apps
+invoice_store = InvoiceStore()
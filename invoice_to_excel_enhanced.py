@@ -1,12 +1,35 @@
 import streamlit as st
 import os
 import json
+import hashlib
 import pandas as pd
-import tempfile
 from datetime import datetime
-from llama_parse import LlamaParse
 import google.generativeai as genai
-import re
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from batch_executor import (
+    run_batch, run_pipeline, MAX_WORKERS_LIMIT, PIPELINE_PARSE_WORKERS, PIPELINE_EXTRACT_WORKERS
+)
+from batch_journal import BatchJournal, file_key
+from extraction_cache import extraction_cache
+from structured_output import json_output_stats
+from pdf_handoff import pdf_buffer
+from excel_export import XLSX_MIME, workbook_bytes
+from normalization import normalize_frame, PURCHASE_TYPES
+from currency_totals import CurrencyTotals, format_amounts
+from invoice_records import InvoiceBatch, InvoiceRecord
+from invoice_archive import archive_frame
+from invoice_store import invoice_store
+from duplicate_detection import DuplicateIndex, content_hash, duplicate_record
+from client_registry import get_llama_parser, get_gemini_model, warm_up_clients
+from gemini_batching import document_fields, extract_in_batches
+from rule_extractor import rule_based_fields
+from page_selection import missing_required_fields, PURCHASE_REQUIRED_FIELDS
+from invoice_extraction import (
+    GEMINI_PROMPT, PURCHASE_MODEL_NAME, PURCHASE_BATCH_SCHEMA, PURCHASE_OUTPUT_FORMAT,
+    gemini_purchase_fields, parse_purchase_pdf, extract_purchase_invoice,
+    purchase_success_record, purchase_failed_record
+)
 
 # ---------- CONFIG ----------
 st.set_page_config(
@@ -68,110 +91,137 @@ if not (LLAMA_KEY and GOOGLE_KEY):
 
 genai.configure(api_key=GOOGLE_KEY)
 
-# Enhanced Gemini Prompt
-GEMINI_PROMPT = """You are an expert invoice data extraction system.
-
-Analyze the invoice document and extract the following information with precision:
+@st.cache_resource(show_spinner="🔌 Connecting to LlamaParse and Gemini...")
+def warm_up():
+    """Create the shared API clients once per process and health-check them"""
+    status = warm_up_clients(LLAMA_KEY, [PURCHASE_MODEL_NAME])
+    errors = {name: error for name, error in status.items() if error}
+    if errors:
+        # Raising keeps a failed check out of the resource cache so the next rerun retries
+        raise RuntimeError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+    return status
 
-CRITICAL: Return ONLY a valid JSON object with NO additional text, explanations, or markdown formatting.
+try:
+    warm_up()
+except RuntimeError as e:
+    st.warning(f"⚠️ API health check failed: {str(e)}")
 
-Required JSON structure:
-{
-  "date": "YYYY-MM-DD format (convert any date format to this)",
-  "invoice_number": "string (invoice/bill number)",
-  "party_name": "string (vendor/supplier name)",
-  "party_address": "string (complete vendor address)",
-  "trn": "string or null (Tax Registration Number/VAT/TIN)",
-  "subtotal": number (amount before tax),
-  "tax_amount": number (total tax/VAT amount),
-  "net_total": number (final amount including tax),
-  "currency": "string (currency code like USD, EUR, AED, etc.)",
-  "items_count": number (number of line items, or null if not clear)
-}
-
-Rules:
-- Use null for missing fields (not "N/A", "Unknown", or empty strings)
-- All numbers must be numeric values without currency symbols
-- Date must be in YYYY-MM-DD format
-- Extract the most prominent company name as party_name
-- Return ONLY the JSON object, no other text
-"""
+def report_invoice_error(source_file: str, error: Exception):
+    """Show a processing error for one invoice"""
+    if isinstance(error, json.JSONDecodeError):
+        st.warning(f"⚠️ JSON parsing error for {source_file}: {str(error)}")
+    else:
+        st.error(f"❌ Error processing {source_file}: {str(error)}")
 
-def clean_json_response(text: str) -> str:
-    """Clean and extract JSON from Gemini response"""
-    # Remove markdown code blocks
-    text = re.sub(r'```json\s*', '', text)
-    text = re.sub(r'```\s*', '', text)
-    # Find JSON object
-    match = re.search(r'\{.*\}', text, re.DOTALL)
-    if match:
-        return match.group(0)
-    return text.strip()
+def failed_invoice_record(source_file: str, error: Exception) -> InvoiceRecord:
+    """Report a processing error and build the failed result record"""
+    report_invoice_error(source_file, error)
+    return purchase_failed_record(source_file, error)
 
-def parse_invoice(pdf_file, parser, model) -> dict:
-    """Parse a single invoice PDF and extract structured data"""
-    try:
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_file.read())
-            tmp_path = tmp.name
-        
-        # Parse PDF to markdown
-        documents = parser.load_data(tmp_path)
-        markdown_text = "\n".join(doc.text for doc in documents)
-        
-        # Clean up temp file
-        os.remove(tmp_path)
-        
-        # Extract data with Gemini
-        response = model.generate_content(GEMINI_PROMPT + "\n\nInvoice content:\n" + markdown_text)
-        cleaned_response = clean_json_response(response.text)
-        
-        # Parse JSON
-        data = json.loads(cleaned_response)
-        
-        # Add source filename
-        data["source_file"] = pdf_file.name
-        data["processing_status"] = "success"
-        data["error_message"] = None
-        
-        return data
-        
-    except json.JSONDecodeError as e:
-        st.warning(f"⚠️ JSON parsing error for {pdf_file.name}: {str(e)}")
-        return {
-            "source_file": pdf_file.name,
-            "processing_status": "failed",
-            "error_message": f"JSON parsing error: {str(e)}",
-            "date": None, "invoice_number": None, "party_name": None,
-            "party_address": None, "trn": None, "subtotal": None,
-            "tax_amount": None, "net_total": None, "currency": None,
-            "items_count": None
-        }
-    except Exception as e:
-        st.error(f"❌ Error processing {pdf_file.name}: {str(e)}")
-        return {
-            "source_file": pdf_file.name,
-            "processing_status": "failed",
-            "error_message": str(e),
-            "date": None, "invoice_number": None, "party_name": None,
-            "party_address": None, "trn": None, "subtotal": None,
-            "tax_amount": None, "net_total": None, "currency": None,
-            "items_count": None
-        }
+def parse_invoices_batched(uploaded_files, parser, model, max_workers, on_parsed, on_batch, thread_initializer) -> list:
+    """Parse all PDFs, then extract them with multi-invoice Gemini requests"""
+    def parse_only(pdf_file):
+        try:
+            return parse_purchase_pdf(pdf_buffer(pdf_file), pdf_file.name, lambda: parser)
+        except Exception as e:
+            return e
+    
+    parsed = run_batch(parse_only, uploaded_files, max_workers=max_workers,
+                       on_complete=on_parsed, thread_initializer=thread_initializer)
+    
+    records = [None] * len(uploaded_files)
+    pending = []
+    for idx, (pdf_file, parse_result) in enumerate(zip(uploaded_files, parsed)):
+        if isinstance(parse_result, Exception):
+            records[idx] = failed_invoice_record(pdf_file.name, parse_result)
+            continue
+        # Rule-extracted and previously extracted documents don't need to go into a batch
+        data = rule_based_fields(parse_result.markdown_text)
+        if data is not None:
+            data["extraction_method"] = "rules"
+        else:
+            data = extraction_cache.get(model.model_name, GEMINI_PROMPT, parse_result.markdown_text,
+                                        PURCHASE_OUTPUT_FORMAT)
+        if data is not None:
+            records[idx] = purchase_success_record(data, pdf_file.name, parse_result.parse_backend, parse_result.tokens_saved)
+        else:
+            pending.append(idx)
+    
+    # Rules and the cache were already checked above, so documents a batch answer
+    # doesn't cover go straight to a single Gemini call
+    documents = [(uploaded_files[idx].name, parsed[idx].markdown_text) for idx in pending]
+    results = extract_in_batches(
+        model, GEMINI_PROMPT, documents,
+        fallback=lambda source_file, markdown_text: gemini_purchase_fields(markdown_text, model),
+        max_workers=max_workers,
+        on_batch_complete=on_batch,
+        thread_initializer=thread_initializer,
+        schema=PURCHASE_BATCH_SCHEMA
+    )
+    
+    for idx, result in zip(pending, results):
+        source_file = uploaded_files[idx].name
+        if isinstance(result, Exception):
+            records[idx] = failed_invoice_record(source_file, result)
+        else:
+            document = parsed[idx]
+            # Batch answers and single-call fallbacks are cached here, once, like a
+            # per-file extraction and without the batch bookkeeping keys
+            result = document_fields(result)
+            extraction_cache.put(model.model_name, GEMINI_PROMPT, document.markdown_text, result,
+                                 PURCHASE_OUTPUT_FORMAT)
+            records[idx] = purchase_success_record(result, source_file, document.parse_backend, document.tokens_saved)
+            if document.reparse_full is not None and missing_required_fields(result, PURCHASE_REQUIRED_FIELDS):
+                # Only some pages were parsed and they lacked required fields - retry on the whole PDF
+                try:
+                    records[idx] = extract_purchase_invoice(document.reparse_full(), source_file, model)
+                except Exception as e:
+                    records[idx] = failed_invoice_record(source_file, e)
+    return records
 
 def create_summary_stats(df: pd.DataFrame) -> dict:
-    """Generate summary statistics from processed invoices"""
+    """Generate summary statistics from the normalized results frame (duplicates are not summed).
+
+    Amounts are running per-currency totals, added once per invoice.
+    """
     successful = df[df['processing_status'] == 'success']
+    counted = successful[successful['duplicate_of'].isna()]
+    totals = CurrencyTotals()
+    for row in zip(counted['currency'], counted['subtotal'], counted['tax_amount'], counted['net_total']):
+        totals.add(*row)
     return {
         "total_files": len(df),
         "successful": len(successful),
         "failed": len(df) - len(successful),
-        "total_amount": successful['net_total'].sum() if len(successful) > 0 else 0,
-        "avg_amount": successful['net_total'].mean() if len(successful) > 0 else 0,
-        "total_tax": successful['tax_amount'].sum() if len(successful) > 0 else 0
+        "duplicates": len(successful) - len(counted),
+        "total_amount": totals.describe("net_total"),
+        "total_in_base": totals.describe_base("net_total"),
+        "avg_amount": format_amounts(totals.means()),
+        "total_tax": totals.describe("tax_amount")
     }
 
+def file_fingerprint(pdf_file) -> str:
+    """Name + content hash of an uploaded file (memoized per upload id for the session)"""
+    upload_id = getattr(pdf_file, "file_id", None)
+    fingerprints = st.session_state.setdefault("file_fingerprints", {})
+    if upload_id is None or upload_id not in fingerprints:
+        fingerprint = file_key(pdf_file.name, pdf_buffer(pdf_file))
+        if upload_id is None:
+            return fingerprint
+        fingerprints[upload_id] = fingerprint
+    return fingerprints[upload_id]
+
+def fileset_fingerprint(file_keys) -> str:
+    """Fingerprint of the whole uploaded file set (order-independent)"""
+    return hashlib.sha256("\n".join(sorted(file_keys)).encode()).hexdigest()
+
+def build_downloads(df: pd.DataFrame):
+    """Serialize the normalized results once: (.xlsx bytes of all rows, CSV of successful rows or None)"""
+    excel_data = workbook_bytes({"Invoices": df})
+    successful_df = df[df['processing_status'] == 'success']
+    csv_data = successful_df.drop(columns=['error_message']).to_csv(index=False) if len(successful_df) > 0 else None
+    return excel_data, csv_data
+
 # ---------- UI ----------
 st.markdown('<h1 class="main-header">📄 Invoice → Excel Converter</h1>', unsafe_allow_html=True)
 st.markdown("---")
@@ -180,7 +230,7 @@ st.markdown("---")
 with st.expander("ℹ️ How to use", expanded=False):
     st.markdown("""
     1. **Upload** one or multiple PDF invoices
-    2. **Click Convert** to process all invoices
+    2. **Click Convert** to process all invoices (files already converted this session are reused)
     3. **Review** the extracted data in the preview table
     4. **Download** the Excel file with all invoice data
     
@@ -199,52 +249,186 @@ uploaded_files = st.file_uploader(
     help="You can upload multiple PDF invoices at once"
 )
 
+# Results persist across reruns: {file fingerprint: InvoiceRecord}
+results = st.session_state.setdefault("invoice_results", {})
+file_keys = [file_fingerprint(f) for f in uploaded_files] if uploaded_files else []
+pending = [(f, key) for f, key in zip(uploaded_files or [], file_keys) if key not in results]
+
 if uploaded_files:
     st.info(f"📊 {len(uploaded_files)} file(s) uploaded")
+    if results and len(pending) < len(uploaded_files):
+        st.caption(f"♻️ {len(uploaded_files) - len(pending)} file(s) already processed this session; "
+                   f"{len(pending)} new file(s) to convert")
+
+# Processing settings
+with st.expander("⚙️ Advanced settings", expanded=False):
+    max_workers = st.slider(
+        "Parallel workers",
+        min_value=1,
+        max_value=MAX_WORKERS_LIMIT,
+        value=min(PIPELINE_PARSE_WORKERS, MAX_WORKERS_LIMIT),
+        help="Number of invoices parsed (LlamaParse) at the same time. Use 1 to process files one by one."
+    )
+    extract_workers = st.slider(
+        "Extraction workers",
+        min_value=1,
+        max_value=MAX_WORKERS_LIMIT,
+        value=min(PIPELINE_EXTRACT_WORKERS, MAX_WORKERS_LIMIT),
+        help="Number of parsed invoices sent to Gemini at the same time, while parsing continues."
+    )
+    batch_requests = st.checkbox(
+        "Batch Gemini requests",
+        value=False,
+        help="Send several parsed invoices in one Gemini request. Invoices the batch answer doesn't cover are retried one by one."
+    )
 
 # Process button
-if st.button("🚀 Convert Invoices", disabled=not uploaded_files):
-    # Initialize parser and model
-    parser = LlamaParse(api_key=LLAMA_KEY, result_type="markdown")
-    model = genai.GenerativeModel("gemini-1.5-flash")
+if st.button("🚀 Convert Invoices", disabled=not pending):
+    # Files finished by an interrupted run over the same upload set come from its journal
+    journal = BatchJournal("purchase", file_keys)
+    for _, key in pending:
+        if journal.get(key) is not None:
+            results[key] = journal.get(key)
+    if any(key in results for _, key in pending):
+        st.info(f"↩️ Resumed {sum(key in results for _, key in pending)} file(s) from an interrupted run")
+    pending = [(f, key) for f, key in pending if key not in results]
+    
+    # Identical copies of a file earlier in the upload (or stored by an earlier run)
+    # reuse the original's result instead of going through LlamaParse and Gemini
+    duplicates = DuplicateIndex("purchase")
+    pending_keys = {key for _, key in pending}
+    copies = {}
+    for f, key in zip(uploaded_files, file_keys):
+        original = duplicates.check_file(f.name, content_hash(key))
+        if original is not None and key in pending_keys:
+            copies[key] = (f.name, original)
+    pending = [(f, key) for f, key in pending if key not in copies]
+    
+    # Only files not processed earlier in this session
+    pending_files = [f for f, _ in pending]
+    
+    # Shared parser and model (created once per process)
+    parser = get_llama_parser(LLAMA_KEY)
+    model = get_gemini_model(PURCHASE_MODEL_NAME)
     
     # Progress tracking
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    rows = []
+    # Let worker threads report warnings/errors into this session
+    script_ctx = get_script_run_ctx()
+    
+    def attach_script_ctx():
+        add_script_run_ctx(threading.current_thread(), script_ctx)
+    
+    def update_progress(done, idx, pdf_file, invoice_data):
+        status_text.text(f"Processing {done}/{len(pending_files)}: {pdf_file.name}")
+        progress_bar.progress(done / len(pending_files))
+    
+    def record_progress(done, idx, pdf_file, invoice_data):
+        # Journal each file as soon as it finishes so a dropped session can resume
+        journal.record(pending[idx][1], invoice_data)
+        update_progress(done, idx, pdf_file, invoice_data)
     
-    # Process each file
-    for idx, pdf_file in enumerate(uploaded_files):
-        status_text.text(f"Processing {idx + 1}/{len(uploaded_files)}: {pdf_file.name}")
+    if batch_requests:
+        def update_batch_progress(done, total, batch_size):
+            status_text.text(f"Extracting batch {done}/{total} ({batch_size} invoice(s))")
         
-        # Reset file pointer
-        pdf_file.seek(0)
+        records = parse_invoices_batched(
+            pending_files, parser, model, max_workers,
+            on_parsed=update_progress,
+            on_batch=update_batch_progress,
+            thread_initializer=attach_script_ctx
+        )
+    else:
+        # LlamaParse and Gemini run as separate stages; records keep the upload order
+        pipeline_text = st.empty()
+        pipeline_stats = []
         
-        # Parse invoice
-        invoice_data = parse_invoice(pdf_file, parser, model)
-        rows.append(invoice_data)
+        def show_pipeline(done, idx, pdf_file, invoice_data):
+            record_progress(done, idx, pdf_file, invoice_data)
+            pipeline_text.caption(f"⚙️ {pipeline_stats[0].describe()}")
         
-        # Update progress
-        progress_bar.progress((idx + 1) / len(uploaded_files))
+        records = run_pipeline(
+            pending_files,
+            parse=lambda pdf_file: parse_purchase_pdf(pdf_buffer(pdf_file), pdf_file.name, lambda: parser),
+            extract=lambda pdf_file, parsed: extract_purchase_invoice(parsed, pdf_file.name, model),
+            failed=lambda pdf_file, error: failed_invoice_record(pdf_file.name, error),
+            parse_workers=max_workers,
+            extract_workers=extract_workers,
+            on_complete=show_pipeline,
+            on_start=pipeline_stats.append,
+            thread_initializer=attach_script_ctx
+        )
+        pipeline_text.empty()
     
     # Clear progress indicators
     progress_bar.empty()
     status_text.empty()
     
-    # Create DataFrame
-    df = pd.DataFrame(rows)
+    for (_, key), record in zip(pending, records):
+        results[key] = record
+        if batch_requests:
+            journal.record(key, record)
+    upload_keys = {f.name: key for f, key in zip(uploaded_files, file_keys)}
+    for key, (name, original) in copies.items():
+        if upload_keys.get(original) in results:
+            record = duplicate_record(results[upload_keys[original]], name, original)
+        else:
+            record = duplicates.stored_record(content_hash(key), name) or failed_invoice_record(
+                name, f"Identical copy of {original}, whose stored result could not be read")
+        results[key] = record
+        journal.record(key, record)
+    if copies:
+        st.info(f"🔁 {len(copies)} file(s) are identical copies of another invoice and were not processed again")
+    journal.close()
+    pending = []
     
-    # Reorder columns for better readability
-    column_order = [
-        "processing_status", "source_file", "date", "invoice_number",
-        "party_name", "party_address", "trn", "currency",
-        "subtotal", "tax_amount", "net_total", "items_count", "error_message"
-    ]
-    df = df[column_order]
+    cache_stats = extraction_cache.stats()
+    st.caption(f"🧠 Extraction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses · "
+               f"✂️ ~{sum(record.tokens_saved or 0 for record in records):,} prompt tokens saved by compaction · "
+               f"🧾 {json_output_stats.describe()}")
     
-    # Generate summary statistics
-    stats = create_summary_stats(df)
+# Forget results (and hashes) for files that were removed from the upload list
+for key in set(results) - set(file_keys):
+    del results[key]
+fingerprints = st.session_state.setdefault("file_fingerprints", {})
+for upload_id in set(fingerprints) - {getattr(f, "file_id", None) for f in uploaded_files or []}:
+    del fingerprints[upload_id]
+
+# Show results whenever every uploaded file has one; filter changes and
+# downloads rerun the script without re-processing anything
+if uploaded_files and not pending:
+    fileset_key = fileset_fingerprint(file_keys)
+    view = st.session_state.get("results_view")
+    if view is None or view["fileset"] != fileset_key:
+        # Build the DataFrame column-wise (upload order, PURCHASE_COLUMNS) with typed
+        # amounts/dates/currencies, shared by the metrics, the table and both downloads
+        batch = InvoiceBatch.from_records(results[key] for key in file_keys)
+        df = normalize_frame(batch.to_frame("purchase"), PURCHASE_TYPES)
+        # Flag re-issued invoices (same TRN, number, total and date) so they aren't summed twice
+        df = DuplicateIndex("purchase").flag_frame(df, "purchase")
+        try:
+            # Keyed per file, so files archived before (e.g. when more uploads are added) are replaced
+            archive_frame(df, "purchase", "purchase", fileset_key,
+                          file_keys={f.name: key for f, key in zip(uploaded_files, file_keys)})
+        except Exception as e:
+            st.warning(f"⚠️ Could not archive results to Parquet: {str(e)}")
+        try:
+            inserted, updated = invoice_store.upsert_frame(
+                df, "purchase", "purchase", fileset_key,
+                file_hashes={f.name: content_hash(key) for f, key in zip(uploaded_files, file_keys)}
+            )
+            st.caption(f"🗃️ Invoice store: {inserted} new, {updated} updated")
+        except Exception as e:
+            st.warning(f"⚠️ Could not save results to the invoice store: {str(e)}")
+        view = {"fileset": fileset_key, "df": df, "downloads": build_downloads(df),
+                "stats": create_summary_stats(df)}
+        st.session_state["results_view"] = view
+    df = view["df"]
+    
+    # Summary statistics are computed once per result set, not on every rerun
+    stats = view["stats"]
     
     # Display results
     st.markdown("---")
@@ -259,7 +443,7 @@ if st.button("🚀 Convert Invoices", disabled=not uploaded_files):
     with col3:
         st.metric("❌ Failed", stats["failed"])
     with col4:
-        st.metric("Total Amount", f"${stats['total_amount']:,.2f}")
+        st.metric("Total Amount", stats["total_amount"], help=stats["total_in_base"])
     
     # Show warnings for failed files
     failed_files = df[df['processing_status'] == 'failed']
@@ -268,6 +452,13 @@ if st.button("🚀 Convert Invoices", disabled=not uploaded_files):
             for _, row in failed_files.iterrows():
                 st.error(f"**{row['source_file']}**: {row['error_message']}")
     
+    # Duplicates stay in the table and the workbook, but not in the totals
+    duplicate_files = df[df['duplicate_of'].notna()]
+    if len(duplicate_files) > 0:
+        with st.expander(f"🔁 {stats['duplicates']} duplicate invoice(s) not counted in totals", expanded=False):
+            for _, row in duplicate_files.iterrows():
+                st.warning(f"**{row['source_file']}** duplicates **{row['duplicate_of']}**")
+    
     # Display data table
     st.markdown("### 📋 Extracted Data")
     
@@ -293,31 +484,25 @@ if st.button("🚀 Convert Invoices", disabled=not uploaded_files):
     
     col1, col2 = st.columns(2)
     
+    excel_data, csv_data = view["downloads"]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
     # Excel download (all data)
     with col1:
-        excel_file = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
-        df.to_excel(excel_file.name, index=False, sheet_name="Invoices")
-        
-        with open(excel_file.name, "rb") as f:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            st.download_button(
-                "📥 Download Excel (All Data)",
-                data=f.read(),
-                file_name=f"invoices_summary_{timestamp}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
-        os.remove(excel_file.name)
+        st.download_button(
+            "📥 Download Excel (All Data)",
+            data=excel_data,
+            file_name=f"invoices_summary_{timestamp}.xlsx",
+            mime=XLSX_MIME,
+            use_container_width=True
+        )
     
     # CSV download (successful only)
     with col2:
-        successful_df = df[df['processing_status'] == 'success']
-        if len(successful_df) > 0:
-            csv = successful_df.drop(columns=['error_message']).to_csv(index=False)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if csv_data is not None:
             st.download_button(
                 "📥 Download CSV (Success Only)",
-                data=csv,
+                data=csv_data,
                 file_name=f"invoices_successful_{timestamp}.csv",
                 mime="text/csv",
                 use_container_width=True
@@ -1,12 +1,22 @@
 import streamlit as st
-import os
 import json
 import pandas as pd
-import tempfile
 from datetime import datetime
-from llama_parse import LlamaParse
 import google.generativeai as genai
 import re
+from parse_cache import parse_cache
+from pdf_handoff import pdf_buffer, run_parser_on_pdf
+from extraction_cache import extraction_cache
+from client_registry import get_llama_parser, get_gemini_model, warm_up_clients
+from rate_limiter import rate_limited_parse
+from structured_output import generate_json, object_schema, output_format_key
+from excel_export import XLSX_MIME, workbook_bytes
+from normalization import normalize_frame
+from currency_totals import CurrencyTotals
+from invoice_records import InvoiceBatch, InvoiceRecord
+from invoice_archive import archive_frame
+from batch_journal import file_key
+from party_names import party_index
 
 # ---------- CONFIG ----------
 st.set_page_config(
@@ -108,77 +118,74 @@ Format your response as a clean JSON object only:
     "currency": "value"
 }"""
 
-# Initialize LlamaParse with your API key
+# Gemini response schema (JSON mode) for the fields in the prompt
+PURCHASE_RESPONSE_SCHEMA = object_schema((
+    "invoice_number", "invoice_date", "vendor_name", "vendor_address", "description",
+    "quantity", "unit_price", "total_amount", "tax_amount", "currency"
+))
+
+# Typed columns of an extracted invoice (normalization.normalize_frame)
+PURCHASE_FIELD_TYPES = {
+    "money": ("unit_price", "total_amount", "tax_amount"),
+    "number": ("quantity",),
+    "date": ("invoice_date",),
+    "currency": ("currency",),
+}
+
+# Shared LlamaParse client (created once per process)
 def init_llama_parser():
     try:
-        parser = LlamaParse(
-            api_key=LLAMA_KEY,
-            result_type="markdown",
-            language="en"
-        )
+        parser = get_llama_parser(LLAMA_KEY, result_type="markdown", language="en")
         return parser
     except Exception as e:
         st.error(f"❌ Failed to initialize PDF parser: {str(e)}")
         return None
 
-# Process PDF with LlamaParse
+# Process PDF with LlamaParse (cached by file content, so re-uploads skip the API)
 def parse_pdf_with_llama(pdf_file):
-    parser = init_llama_parser()
-    if not parser:
-        return None
+    pdf_bytes = pdf_buffer(pdf_file)
+    
+    def run_llamaparse():
+        parser = init_llama_parser()
+        if not parser:
+            return None
+        
+        # Hand the upload's buffer straight to LlamaParse (no temp file copy), within the rate budget
+        docs = rate_limited_parse(parser, lambda: run_parser_on_pdf(parser.parse, pdf_bytes, pdf_file.name))
+        
+        if docs and hasattr(docs, 'text') and docs.text:
+            return [docs.text]
+        else:
+            st.error("❌ No text extracted from PDF")
+            return None
     
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(pdf_file.read())
-            temp_file.flush()
-            
-            docs = parser.parse(temp_file.name)
-            
-            if docs and hasattr(docs, 'text') and docs.text:
-                return docs.text
-            else:
-                st.error("❌ No text extracted from PDF")
-                return None
-                
+        pages = parse_cache.get_or_parse(pdf_bytes, run_llamaparse, result_type="markdown", language="en")
+        return "\n\n".join(pages) if pages else None
     except Exception as e:
         st.error(f"❌ Error parsing PDF: {str(e)}")
         return None
-    finally:
-        if 'temp_file' in locals():
-            try:
-                os.unlink(temp_file.name)
-            except:
-                pass
 
-# Extract data using Gemini
+# Extract data using Gemini (memoized per model/prompt/document)
 def extract_invoice_data_with_gemini(pdf_text, prompt):
+    model_name = 'gemini-1.5-flash'
+    cached = extraction_cache.get(model_name, prompt, pdf_text, output_format_key(PURCHASE_RESPONSE_SCHEMA))
+    if cached is not None:
+        return cached
+    
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_gemini_model(model_name)
         
         full_prompt = f"{prompt}\n\nInvoice content to analyze:\n{pdf_text}"
         
-        response = model.generate_content(full_prompt)
-        
-        if response and response.text:
-            # Clean the response - remove markdown code blocks if present
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:]
-            if response_text.endswith('```'):
-                response_text = response_text[:-3]
-            
-            response_text = response_text.strip()
-            
-            # Try to parse as JSON
-            try:
-                data = json.loads(response_text)
-                return data
-            except json.JSONDecodeError as json_error:
-                st.error(f"❌ JSON parsing error: {str(json_error)}")
-                st.error(f"Raw response: {response_text}")
-                return None
-        else:
-            st.error("❌ No response from Gemini AI")
+        # JSON mode, constrained to PURCHASE_RESPONSE_SCHEMA
+        try:
+            data = generate_json(model, full_prompt, PURCHASE_RESPONSE_SCHEMA)
+            extraction_cache.put(model_name, prompt, pdf_text, data, output_format_key(PURCHASE_RESPONSE_SCHEMA))
+            return data
+        except json.JSONDecodeError as json_error:
+            st.error(f"❌ JSON parsing error: {str(json_error)}")
+            st.error(f"Raw response: {json_error.doc}")
             return None
             
     except Exception as e:
@@ -186,40 +193,46 @@ def extract_invoice_data_with_gemini(pdf_text, prompt):
         return None
 
 # Create Excel file with multiple sheets
-def create_excel_file(invoices_data, summary_data):
+# (built in memory; returns the .xlsx bytes)
+def create_excel_file(invoices_df, summary_df):
     try:
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"invoices_{timestamp}.xlsx"
-        
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        return workbook_bytes({
             # Main invoices sheet
-            invoices_df = pd.DataFrame(invoices_data)
-            invoices_df.to_excel(writer, sheet_name='Invoices', index=False)
-            
+            'Invoices': invoices_df,
             # Summary sheet
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name='Summary', index=False)
-            
+            'Summary': summary_df,
             # Company info sheet
-            company_info = pd.DataFrame([
+            'Company Info': pd.DataFrame([
                 {'Field': 'Company Name', 'Value': 'Andez Business Consultancy'},
                 {'Field': 'Processing Date', 'Value': datetime.now().strftime("%Y-%m-%d %H:%M:%S")},
-                {'Field': 'Total Invoices', 'Value': len(invoices_data)},
+                {'Field': 'Total Invoices', 'Value': len(invoices_df)},
                 {'Field': 'System Type', 'Value': 'Purchase Invoice Processor'},
-            ])
-            company_info.to_excel(writer, sheet_name='Company Info', index=False)
-        
-        return filename
+            ]),
+        })
         
     except Exception as e:
         st.error(f"❌ Error creating Excel file: {str(e)}")
         return None
 
+# Create the shared API clients once per process and health-check them
+@st.cache_resource(show_spinner="🔌 Connecting to LlamaParse and Gemini...")
+def warm_up():
+    status = warm_up_clients(LLAMA_KEY, ['gemini-1.5-flash'])
+    errors = {name: error for name, error in status.items() if error}
+    if errors:
+        # Raising keeps a failed check out of the resource cache so the next rerun retries
+        raise RuntimeError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+    return status
+
 # Main Streamlit App
 def main():
     st.markdown('<h1 class="main-header">📄 Invoice → Excel Converter</h1>', unsafe_allow_html=True)
     
+    try:
+        warm_up()
+    except RuntimeError as e:
+        st.warning(f"⚠️ API health check failed: {str(e)}")
+    
     st.markdown("""
     <div class="info-box">
         <strong>🔧 Purchase Invoice Processor</strong><br>
@@ -238,8 +251,8 @@ def main():
     if uploaded_files:
         if st.button("🚀 Process Invoices", type="primary"):
             
-            invoices_data = []
-            summary_data = []
+            invoices_data = InvoiceBatch()
+            error_summary = []
             
             progress_bar = st.progress(0)
             status_text = st.empty()
@@ -261,27 +274,10 @@ def main():
                     if invoice_data:
                         # Add filename to data
                         invoice_data['filename'] = uploaded_file.name
-                        invoices_data.append(invoice_data)
-                        
-                        # Add to summary
-                        total_amount = invoice_data.get('total_amount', 0)
-                        if isinstance(total_amount, str):
-                            try:
-                                total_amount = float(total_amount.replace(',', ''))
-                            except:
-                                total_amount = 0
-                        
-                        summary_data.append({
-                            'Invoice': invoice_data.get('invoice_number', 'Unknown'),
-                            'Vendor': invoice_data.get('vendor_name', 'Unknown'),
-                            'Date': invoice_data.get('invoice_date', 'Unknown'),
-                            'Amount': total_amount,
-                            'Currency': invoice_data.get('currency', 'AED'),
-                            'Status': '✅ Extracted'
-                        })
+                        invoices_data.append(InvoiceRecord.from_row(invoice_data, 'purchase_line'))
                 
                 except Exception as e:
-                    summary_data.append({
+                    error_summary.append({
                         'Invoice': uploaded_file.name,
                         'Vendor': 'Error',
                         'Date': 'Error',
@@ -292,9 +288,23 @@ def main():
             
             # Create Excel file
             if invoices_data:
-                excel_filename = create_excel_file(invoices_data, summary_data)
+                # Typed amounts/dates/currencies in one pass, shared by the workbook, metrics and table
+                invoices_df = normalize_frame(invoices_data.to_frame('purchase_line'), PURCHASE_FIELD_TYPES)
+                try:
+                    archive_frame(invoices_df, 'purchase_line', 'purchase', datetime.now().strftime("%Y%m%d_%H%M%S"),
+                                  file_keys={f.name: file_key(f.name, pdf_buffer(f)) for f in uploaded_files})
+                except Exception as e:
+                    st.warning(f"⚠️ Could not archive results to Parquet: {str(e)}")
+                summary_df = invoices_df.reindex(
+                    columns=['invoice_number', 'vendor_name', 'invoice_date', 'total_amount', 'currency']
+                ).set_axis(['Invoice', 'Vendor', 'Date', 'Amount', 'Currency'], axis=1).assign(
+                    Status='✅ Extracted'
+                )
+                if error_summary:
+                    summary_df = pd.concat([summary_df, pd.DataFrame(error_summary)], ignore_index=True)
+                excel_bytes = create_excel_file(invoices_df, summary_df)
                 
-                if excel_filename:
+                if excel_bytes:
                     st.markdown("""
                     <div class="success-box">
                         <strong>✅ Processing Complete!</strong><br>
@@ -305,8 +315,12 @@ def main():
                     # Display summary
                     st.subheader("📊 Summary")
                     
-                    total_invoices = len(invoices_data)
-                    total_amount = sum([inv.get('total_amount', 0) for inv in invoices_data])
+                    total_invoices = len(invoices_df)
+                    totals = CurrencyTotals()
+                    for currency, tax_amount, amount in zip(
+                        invoices_df['currency'], invoices_df['tax_amount'], invoices_df['total_amount']
+                    ):
+                        totals.add(currency, tax_amount=tax_amount, net_total=amount)
                     
                     col1, col2, col3 = st.columns(3)
                     
@@ -314,25 +328,25 @@ def main():
                         st.metric("Total Invoices", total_invoices)
                     
                     with col2:
-                        st.metric("Total Amount", f"{total_amount:,.2f}")
+                        st.metric("Total Amount", totals.describe(), help=totals.describe_base())
                     
                     with col3:
-                        unique_vendors = len(set([inv.get('vendor_name', 'Unknown') for inv in invoices_data]))
+                        # Spelling variants of one vendor count once
+                        unique_vendors = party_index.count(invoices_df['vendor_name'])
                         st.metric("Unique Vendors", unique_vendors)
                     
                     # Show summary table
                     st.subheader("📋 Invoice Details")
-                    summary_df = pd.DataFrame(summary_data)
                     st.dataframe(summary_df, use_container_width=True)
                     
                     # Download button
-                    with open(excel_filename, 'rb') as f:
-                        st.download_button(
-                            label="📥 Download Excel File",
-                            data=f,
-                            file_name=excel_filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    st.download_button(
+                        label="📥 Download Excel File",
+                        data=excel_bytes,
+                        file_name=f"invoices_{timestamp}.xlsx",
+                        mime=XLSX_MIME
+                    )
                 else:
                     st.error("❌ Failed to create Excel file")
             else:
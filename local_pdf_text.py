@@ -0,0 +1,100 @@
+"""
+In-process text-layer extraction for digital PDFs.
+
+Machine-generated invoices already carry a text layer, so their text and
+tables can be read locally and turned into markdown without uploading the
+file to LlamaParse. Scanned or image-only PDFs (missing or sparse text
+layer) return None so the caller falls back to LlamaParse.
+"""
+
+import os
+import re
+
+from pdf_handoff import MemoryviewReader
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+LOCAL_TEXT_EXTRACTION = os.getenv("LOCAL_TEXT_EXTRACTION", "1") == "1"
+LOCAL_TEXT_MIN_CHARS_PER_PAGE = int(os.getenv("LOCAL_TEXT_MIN_CHARS_PER_PAGE", "200"))
+
+BACKEND_LOCAL = "local"
+BACKEND_LLAMAPARSE = "llamaparse"
+
+# pdfplumber emits "(cid:NN)" for glyphs it cannot map to characters
+UNMAPPED_GLYPH = re.compile(r"\(cid:\d+\)")
+
+
+def table_to_markdown(table) -> str:
+    """Render an extracted table (list of rows) as a markdown table"""
+    rows = [[" ".join((cell or "").split()) for cell in row] for row in table if row]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * width]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+
+def page_to_markdown(page) -> str:
+    """Text outside tables followed by the page's tables as markdown"""
+    tables = page.find_tables()
+    text_page = page
+    for table in tables:
+        text_page = text_page.outside_bbox(table.bbox)
+    parts = [text_page.extract_text() or ""]
+    parts += [table_to_markdown(table.extract()) for table in tables]
+    return "\n\n".join(part for part in parts if part.strip())
+
+
+def is_text_layer_usable(pages) -> bool:
+    """True when the text layer is dense enough to skip LlamaParse"""
+    if not pages:
+        return False
+    text = "\n".join(pages)
+    if len(UNMAPPED_GLYPH.findall(text)) > 10:
+        return False
+    visible_chars = sum(1 for ch in text if ch.isalnum())
+    return visible_chars / len(pages) >= LOCAL_TEXT_MIN_CHARS_PER_PAGE
+
+
+def extract_local_pages(pdf_bytes, pages=None):
+    """Return per-page markdown from the PDF text layer, or None if it is missing or too sparse.
+
+    pages restricts extraction to those 0-based page numbers.
+    """
+    if not LOCAL_TEXT_EXTRACTION or pdfplumber is None:
+        return None
+    try:
+        with pdfplumber.open(MemoryviewReader(pdf_bytes)) as pdf:
+            selected = pdf.pages if pages is None else [pdf.pages[i] for i in pages if i < len(pdf.pages)]
+            pages = [page_to_markdown(page) for page in selected]
+    except Exception:
+        # Encrypted or malformed for pdfplumber - let LlamaParse try
+        return None
+    return pages if is_text_layer_usable(pages) else None
+
+
+def count_pdf_pages(pdf_bytes):
+    """Number of pages (no text extraction), or None when pdfplumber can't read the PDF"""
+    if pdfplumber is None:
+        return None
+    try:
+        with pdfplumber.open(MemoryviewReader(pdf_bytes)) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return None
+
+
+def scan_page_texts(pdf_bytes):
+    """Plain text of every page (no table detection), or None when pdfplumber can't read the PDF"""
+    if pdfplumber is None:
+        return None
+    try:
+        with pdfplumber.open(MemoryviewReader(pdf_bytes)) as pdf:
+            return [page.extract_text() or "" for page in pdf.pages]
+    except Exception:
+        return None
@@ -0,0 +1,189 @@
+"""
+Compaction of parsed invoice markdown before it is sent to Gemini.
+
+Parsed pages carry a lot of text the extraction prompt never needs:
+page headers/footers repeated on every page, padded table cells, and
+boilerplate blocks such as bank/IBAN details and terms and conditions.
+compact_pages() removes those, caps the document to a token budget
+(keeping its beginning, where the header fields are, and its end, where
+the totals are) and reports how many tokens were saved. Lines that carry
+prompt fields (TRN, dates, totals, tax, invoice number) are never dropped
+as boilerplate.
+"""
+
+import os
+import re
+
+from rate_limiter import estimate_tokens
+
+MARKDOWN_COMPACTION = os.getenv("MARKDOWN_COMPACTION", "1") == "1"
+COMPACTION_TOKEN_BUDGET = int(os.getenv("COMPACTION_TOKEN_BUDGET", "6000"))
+
+# Share of the character budget kept from the start of the document (the rest comes from the end)
+HEAD_SHARE = 0.6
+
+# Lines that start a bank-details or terms block, by block kind
+BLOCK_STARTS = {
+    "bank": re.compile(
+        r"^[|*#\s]*(bank\s+details|banking\s+details|bank\s+name|account\s+name|account\s+(no|number)|"
+        r"beneficiary|iban|swift|bic\s+code|routing)\b",
+        re.IGNORECASE,
+    ),
+    "terms": re.compile(
+        r"^[|*#\s]*(terms\s*(and|&)\s*conditions|terms\s+of\s+(sale|service)|general\s+conditions|declaration|"
+        r"this\s+is\s+a\s+(computer|system)\s+generated)\b",
+        re.IGNORECASE,
+    ),
+}
+# Lines that continue a block; the first line that doesn't ends it
+BLOCK_LINES = {
+    # "Account Name: ...", "Branch: Deira", "| SWIFT | EBILAEAD |"
+    "bank": re.compile(
+        r"^[|*\s]*(bank|branch|account|a/c|beneficiary|iban|swift|bic|routing|sort\s+code)\b[\w ./]{0,25}[:#|]",
+        re.IGNORECASE,
+    ),
+    # Numbered or bulleted clauses and legal wording
+    "terms": re.compile(
+        r"^\s*([-*•]|\(?\d{1,2}[.)]|\(?[a-z][.)])\s+|\b(shall|liable|liability|warrant\w*|returnable|refund\w*|"
+        r"jurisdiction|governed|disputes?|cancell?ation|goods\s+once\s+sold|conditions)\b",
+        re.IGNORECASE,
+    ),
+}
+# Single lines that are boilerplate wherever they appear: a bank label and its code, nothing else
+BOILERPLATE_LINE = re.compile(
+    r"^[|*\s]*(iban|swift(\s+code)?|bic(\s+code)?|account\s+(no|number)|a/c\s+no|sort\s+code)\.?"
+    r"[|*\s]*[:#]?[|*\s]*([0-9A-Z][0-9A-Z ./-]*)?[|*\s]*$",
+    re.IGNORECASE,
+)
+# Lines carrying fields from the extraction prompts are always kept
+PROTECTED_LINE = re.compile(
+    r"\b(trn|tax\s+registration|vat|tax|total|sub\s*-?total|net|amount|invoice|date|currency|"
+    r"aed|usd|eur|qty|quantity|customer|supplier|vendor|bill\s+to|sold\s+to|payment\s+terms)\b",
+    re.IGNORECASE,
+)
+DIGITS = re.compile(r"\d+")
+TABLE_SEPARATOR = re.compile(r"^\|?(\s*:?-{2,}:?\s*\|)+\s*:?-*:?\s*$")
+
+
+def normalize_line(line) -> str:
+    """Line identity for header/footer detection ("Page 2 of 9" == "Page 3 of 9")"""
+    return DIGITS.sub("#", " ".join(line.split())).lower()
+
+
+def remove_repeated_lines(pages) -> list:
+    """Keep only the first occurrence of lines repeated on more than half of the pages"""
+    if len(pages) < 2:
+        return pages
+    counts = {}
+    for page in pages:
+        for key in {normalize_line(line) for line in page.splitlines() if line.strip()}:
+            counts[key] = counts.get(key, 0) + 1
+    repeated = {key for key, count in counts.items() if count > len(pages) / 2 and count >= 2}
+    seen = set()
+    compacted = []
+    for page in pages:
+        kept = []
+        for line in page.splitlines():
+            key = normalize_line(line)
+            if key in repeated:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(line)
+        compacted.append("\n".join(kept))
+    return compacted
+
+
+def compact_table_line(line) -> str:
+    """Collapse padding inside a markdown table row"""
+    if TABLE_SEPARATOR.match(line.strip()):
+        return "|" + "---|" * max(1, line.count("|") - 1)
+    cells = [" ".join(cell.split()) for cell in line.strip().strip("|").split("|")]
+    return "| " + " | ".join(cells) + " |"
+
+
+def block_start(line):
+    """Kind of boilerplate block a line starts ("bank" / "terms"), or None"""
+    for kind, pattern in BLOCK_STARTS.items():
+        if pattern.search(line):
+            return kind
+    return None
+
+
+def remove_boilerplate(text) -> str:
+    """Drop bank/terms blocks and account-number lines, keeping protected lines.
+
+    A block runs from its start line through the bank or legal lines that
+    follow it; a blank line, a heading or any other line ends it, so text
+    without blank lines (local text layers) only loses the block itself.
+    """
+    kept = []
+    block = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            block = None
+            kept.append(line)
+            continue
+        if stripped.startswith("#"):
+            # A heading ends a block, unless it starts a new one ("## Bank Details")
+            block = block_start(stripped)
+            if block is None:
+                kept.append(line)
+            continue
+        if BOILERPLATE_LINE.search(stripped):
+            continue
+        if PROTECTED_LINE.search(stripped):
+            kept.append(line)
+            continue
+        kind = block_start(stripped)
+        if kind is not None:
+            block = kind
+            continue
+        if block is not None and BLOCK_LINES[block].search(stripped):
+            continue
+        block = None
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def collapse_whitespace(text) -> str:
+    """Trim lines, compact table rows and collapse runs of blank lines"""
+    lines = []
+    blank = False
+    for line in text.splitlines():
+        line = line.rstrip()
+        if line.lstrip().startswith("|"):
+            line = compact_table_line(line)
+        elif line.strip():
+            line = " ".join(line.split())
+        if not line:
+            if blank:
+                continue
+            blank = True
+        else:
+            blank = False
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def cap_to_budget(text, token_budget=COMPACTION_TOKEN_BUDGET) -> str:
+    """Keep the start and end of a document that is over the token budget"""
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return text
+    max_chars = token_budget * 4
+    head = int(max_chars * HEAD_SHARE)
+    tail = max_chars - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n\n[... {omitted} characters omitted ...]\n\n{text[-tail:]}"
+
+
+def compact_pages(pages, separator="\n", token_budget=COMPACTION_TOKEN_BUDGET) -> tuple:
+    """Compact parsed pages into one document: (markdown_text, tokens_saved)"""
+    original = separator.join(pages)
+    if not MARKDOWN_COMPACTION:
+        return original, 0
+    pages = remove_repeated_lines(list(pages))
+    pages = [collapse_whitespace(remove_boilerplate(page)) for page in pages]
+    compacted = cap_to_budget(separator.join(page for page in pages if page), token_budget)
+    return compacted, max(0, estimate_tokens(original) - estimate_tokens(compacted))
@@ -0,0 +1,214 @@
+"""
+Typed normalization of extracted invoice fields.
+
+Gemini and the rule extractor hand back amounts as numbers or strings
+("1,234.50", "AED 990", "(120.00)", "Not specified"), dates in whatever
+format the invoice used, and currencies as codes, symbols or names.
+normalize_frame() turns a results DataFrame into typed columns in one
+vectorized pass:
+  - money: Decimal rounded to whole cents, parsed from the number's text
+    and never through a binary float, so sums are exact (unparseable
+    values become None, never 0); writers convert to float at the end,
+  - dates: ISO "YYYY-MM-DD" strings (ISO first, then day-first formats),
+  - currency: ISO-4217 codes (symbols and common names mapped, anything
+    else becomes NA),
+  - counts: nullable integers.
+The Summary sheet, on-screen metrics and exports all read the typed frame
+instead of converting values again. Streaming writers normalize each
+InvoiceRecord once with normalize_invoice() (plain row dicts with
+normalize_record()).
+"""
+
+import math
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import pandas as pd
+
+from invoice_records import InvoiceRecord
+
+# Active ISO-4217 currency codes
+ISO_4217_CODES = frozenset("""
+AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN BWP BYN BZD
+CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD
+GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT
+LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR
+NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP
+STN SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF
+XPF YER ZAR ZMW ZWL
+""".split())
+
+# Symbols and names seen on invoices (upper-cased) mapped to ISO codes
+CURRENCY_ALIASES = {
+    "$": "USD", "US$": "USD", "US DOLLAR": "USD", "US DOLLARS": "USD", "DOLLAR": "USD", "DOLLARS": "USD",
+    "€": "EUR", "EURO": "EUR", "EUROS": "EUR",
+    "£": "GBP", "POUND": "GBP", "POUNDS": "GBP", "POUND STERLING": "GBP",
+    "₹": "INR", "RS": "INR", "RS.": "INR", "RUPEE": "INR", "RUPEES": "INR",
+    "¥": "JPY", "YEN": "JPY",
+    "DH": "AED", "DHS": "AED", "DHS.": "AED", "DIRHAM": "AED", "DIRHAMS": "AED", "UAE DIRHAM": "AED",
+    "UAE DIRHAMS": "AED", "د.إ": "AED",
+    "SR": "SAR", "SAUDI RIYAL": "SAR", "QR": "QAR", "QATARI RIYAL": "QAR", "OMANI RIAL": "OMR",
+    "BD": "BHD", "KD": "KWD",
+}
+
+ISO_CODE_PATTERN = r"\b(" + "|".join(sorted(ISO_4217_CODES)) + r")\b"
+# First number in the text that isn't a percentage ("Rs. 1,000" -> "1,000", "5% VAT: 900" -> "900")
+AMOUNT_PATTERN = r"(?<!\d)(\d(?:[\d.,]*\d)?)(?!\d|[.,]\d|\s*%)"
+# "1.234,56" / "12,50": comma is the decimal separator
+DECIMAL_COMMA = r"^\d{1,3}(?:\.\d{3})+,\d{1,2}$|^\d+,\d{1,2}$"
+NEGATIVE_AMOUNT = r"^\(.*\)$|^-|-$"
+CENT = Decimal("0.01")
+
+# Field types of the core result rows (invoice_extraction.PURCHASE_COLUMNS / SALES_COLUMNS)
+PURCHASE_TYPES = {
+    "money": ("subtotal", "tax_amount", "net_total"),
+    "count": ("items_count", "tokens_saved"),
+    "date": ("date",),
+    "currency": ("currency",),
+}
+SALES_TYPES = {
+    "money": ("subtotal", "tax_amount", "net_total"),
+    "count": ("items_count", "tokens_saved"),
+    "date": ("invoice_date",),
+    "currency": ("currency",),
+}
+# Field types of an invoice_records.InvoiceRecord (canonical field names)
+RECORD_TYPES = {
+    "money": ("subtotal", "tax_amount", "net_total"),
+    "count": ("items_count", "tokens_saved"),
+    "date": ("invoice_date",),
+    "currency": ("currency",),
+}
+
+
+def amount_text(values) -> pd.Series:
+    """First amount in each value as plain number text ("(1,234.50)" -> "-1234.50"); NA when there is none"""
+    text = pd.Series(values, dtype="object").astype("string").str.strip()
+    negative = text.str.contains(NEGATIVE_AMOUNT, regex=True, na=False)
+    digits = text.str.extract(AMOUNT_PATTERN, expand=False)
+    decimal_comma = digits.str.contains(DECIMAL_COMMA, regex=True, na=False)
+    digits = digits.where(
+        ~decimal_comma, digits.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    ).str.replace(",", "", regex=False)
+    return digits.where(~negative, "-" + digits)
+
+
+def to_decimal(value):
+    """Decimal of a number or plain numeric text ("1050.5"), or None"""
+    if is_missing(value) or isinstance(value, bool):
+        return None
+    if not isinstance(value, Decimal):
+        try:
+            # str() of a float is its shortest round-trip form (0.1 -> "0.1"), not its binary expansion
+            value = Decimal(str(value).strip())
+        except (InvalidOperation, ValueError):
+            return None
+    return value if value.is_finite() else None
+
+
+def normalize_number(values) -> pd.Series:
+    """Numbers from numeric or text values ("1,234.50", "AED 99", "(12.00)"); NaN when unparseable"""
+    series = pd.Series(values, dtype="object")
+    numeric = pd.to_numeric(series, errors="coerce")
+    parsed = pd.to_numeric(amount_text(series).fillna("").astype("object"), errors="coerce").astype("float64")
+    return numeric.astype("float64").fillna(parsed)
+
+
+def normalize_money(values) -> pd.Series:
+    """Amounts as Decimal rounded to whole cents (object column, None when unparseable)"""
+    series = pd.Series(values, dtype="object")
+    amounts = []
+    for value, text in zip(series, amount_text(series)):
+        amount = to_decimal(value)
+        if amount is None and not is_missing(text):
+            amount = to_decimal(text)
+        try:
+            amounts.append(None if amount is None else amount.quantize(CENT, rounding=ROUND_HALF_UP))
+        except InvalidOperation:
+            # More digits than Decimal's precision - not an invoice amount
+            amounts.append(None)
+    return pd.Series(amounts, index=series.index, dtype="object")
+
+
+def normalize_count(values) -> pd.Series:
+    """Whole-number counts as a nullable integer column"""
+    return normalize_number(values).round().astype("Int64")
+
+
+def normalize_dates(values) -> pd.Series:
+    """ISO "YYYY-MM-DD" strings; ISO input first, then day-first formats (dd/mm/yyyy, 8 Aug 2025, ...)"""
+    text = pd.Series(values, dtype="object").astype("string").str.strip()
+    dates = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+    rest = dates.isna() & text.notna() & (text != "")
+    if rest.any():
+        dates[rest] = pd.to_datetime(text[rest], format="mixed", dayfirst=True, errors="coerce")
+    return dates.dt.strftime("%Y-%m-%d").astype("string")
+
+
+def normalize_currency(values) -> pd.Series:
+    """ISO-4217 codes from codes, symbols or currency names; NA when not recognised"""
+    text = pd.Series(values, dtype="object").astype("string").str.strip().str.upper()
+    aliased = text.map(CURRENCY_ALIASES, na_action="ignore").astype("string")
+    codes = text.str.extract(ISO_CODE_PATTERN, expand=False).astype("string")
+    return aliased.fillna(codes)
+
+
+def currency_code(value):
+    """ISO-4217 code of a single currency value (same rules as normalize_currency); None when not recognised"""
+    if is_missing(value):
+        return None
+    text = str(value).strip().upper()
+    if text in CURRENCY_ALIASES:
+        return CURRENCY_ALIASES[text]
+    match = re.search(ISO_CODE_PATTERN, text)
+    return match.group(1) if match else None
+
+
+NORMALIZERS = {
+    "money": normalize_money,
+    "number": normalize_number,
+    "count": normalize_count,
+    "date": normalize_dates,
+    "currency": normalize_currency,
+}
+
+
+def normalize_frame(df, types) -> pd.DataFrame:
+    """Copy of df with the columns listed in types ({kind: columns}) converted to typed columns"""
+    typed = df.copy()
+    for kind, columns in types.items():
+        normalize = NORMALIZERS[kind]
+        for col in columns:
+            if col in typed.columns:
+                typed[col] = normalize(typed[col]).set_axis(typed.index)
+    return typed
+
+
+def is_missing(value) -> bool:
+    """True for None, NaN, NA and NaT"""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return True
+    return isinstance(value, float) and math.isnan(value)
+
+
+def normalize_record(row, types) -> dict:
+    """Normalize a single result row (for writers that stream rows as they finish)"""
+    typed = normalize_frame(pd.DataFrame([row]), types).astype(object).iloc[0].to_dict()
+    return {key: None if is_missing(value) else value for key, value in typed.items()}
+
+
+def normalize_invoice(record) -> InvoiceRecord:
+    """Normalized copy of an InvoiceRecord (same rules as normalize_record)"""
+    return InvoiceRecord.from_dict(normalize_record(record.to_dict(), RECORD_TYPES))
+
+
+def money_total(values) -> Decimal:
+    """Exact sum of amounts in whole cents (missing and unparseable amounts are skipped)"""
+    return sum((amount for amount in normalize_money(values) if amount is not None), Decimal("0.00"))
+
+
+def to_float(value):
+    """Amount for writers that take binary floats (Decimal -> float, missing -> None)"""
+    if is_missing(value):
+        return None
+    return float(value) if isinstance(value, Decimal) else value
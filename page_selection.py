@@ -0,0 +1,69 @@
+"""
+Page selection for long multi-page invoices.
+
+Header fields and totals sit almost entirely on the first and last pages;
+annexures and timesheets in between only cost parse time and prompt
+tokens. For PDFs longer than PAGE_SELECTION_MIN_PAGES, select_pages()
+picks the first and last few pages plus any page whose text layer
+mentions totals/TRN (from a cheap local scan). Shorter PDFs are only
+counted, never scanned. Callers parse only those pages and fall back to
+the whole document when required fields are missing from the result.
+"""
+
+import os
+import re
+
+from local_pdf_text import count_pdf_pages, scan_page_texts
+
+PAGE_SELECTION = os.getenv("PAGE_SELECTION", "1") == "1"
+PAGE_SELECTION_MIN_PAGES = int(os.getenv("PAGE_SELECTION_MIN_PAGES", "6"))
+PAGE_SELECTION_HEAD = int(os.getenv("PAGE_SELECTION_HEAD", "2"))
+PAGE_SELECTION_TAIL = int(os.getenv("PAGE_SELECTION_TAIL", "2"))
+PAGE_SELECTION_MAX_PAGES = int(os.getenv("PAGE_SELECTION_MAX_PAGES", "8"))
+
+# Fields whose absence after a page-selected extraction triggers a full-document retry
+PURCHASE_REQUIRED_FIELDS = ("date", "invoice_number", "net_total")
+SALES_REQUIRED_FIELDS = ("invoice_date", "invoice_number", "net_total")
+
+KEYWORD_PAGE = re.compile(
+    r"\b(grand\s+total|net\s+total|total\s+amount|amount\s+due|sub\s*-?total|total\s+vat|"
+    r"vat\s+amount|trn|tax\s+registration|tax\s+invoice)\b",
+    re.IGNORECASE,
+)
+PDF_PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![s\w])")
+
+
+def count_pages(pdf_bytes) -> int:
+    """Page count from pdfplumber, or from the PDF's page objects"""
+    page_count = count_pdf_pages(pdf_bytes)
+    if page_count is not None:
+        return page_count
+    return len(PDF_PAGE_OBJECT.findall(pdf_bytes))
+
+
+def select_pages(pdf_bytes):
+    """0-based pages to parse, or None to parse the whole document"""
+    if not PAGE_SELECTION:
+        return None
+    page_count = count_pages(pdf_bytes)
+    if page_count < PAGE_SELECTION_MIN_PAGES:
+        return None
+    page_texts = scan_page_texts(pdf_bytes)
+
+    selected = set(range(min(PAGE_SELECTION_HEAD, page_count)))
+    selected |= set(range(max(0, page_count - PAGE_SELECTION_TAIL), page_count))
+    if page_texts is not None:
+        for idx, text in enumerate(page_texts):
+            if len(selected) >= PAGE_SELECTION_MAX_PAGES:
+                break
+            if KEYWORD_PAGE.search(text):
+                selected.add(idx)
+
+    if len(selected) >= page_count:
+        return None
+    return sorted(selected)
+
+
+def missing_required_fields(data, required_fields) -> list:
+    """Required fields that are absent or empty in an extraction result"""
+    return [field for field in required_fields if data.get(field) in (None, "", "null")]
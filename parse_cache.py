@@ -0,0 +1,134 @@
+"""
+Content-addressed on-disk cache for LlamaParse output.
+
+Entries are keyed by the SHA-256 of the PDF bytes plus the parser settings
+(result_type, language), stored gzip-compressed, and evicted least recently
+used first once the cache grows past its size cap. A per-key lock makes
+identical uploads in the same batch wait for a single parse instead of
+each paying for their own LlamaParse round trip.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(".invoice_cache", "llamaparse"))
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", "200"))
+
+ENTRY_SUFFIX = ".json.gz"
+
+
+def make_parse_key(pdf_bytes, result_type="markdown", language="en", pages=None) -> str:
+    """Build the cache key for a PDF and the parser settings (and page subset) used on it"""
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    settings = f"{result_type}|{language}"
+    if pages is not None:
+        settings += "|pages=" + ",".join(str(page) for page in pages)
+    settings = settings.encode("utf-8")
+    return hashlib.sha256(digest.encode("ascii") + b"|" + settings).hexdigest()
+
+
+class ParseCache:
+    """Size-capped LRU cache of parsed page texts on disk"""
+
+    def __init__(self, cache_dir=PARSE_CACHE_DIR, max_bytes=int(PARSE_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, callers using it]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    @contextmanager
+    def _key_lock(self, key):
+        """Hold the key's lock; the entry is dropped once no caller is using the key"""
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def get(self, key):
+        """Return the cached page texts for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                pages = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return pages
+
+    def put(self, key, pages):
+        """Store page texts under key and evict old entries past the size cap"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(list(pages)).encode("utf-8"))
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            try:
+                names = [n for n in os.listdir(self.cache_dir) if n.endswith(ENTRY_SUFFIX)]
+            except OSError:
+                return
+            entries = []
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+                except OSError:
+                    pass
+
+    def get_or_parse(self, pdf_bytes, parse_func, result_type="markdown", language="en", pages=None):
+        """Return cached page texts for the PDF, calling parse_func() only on a miss.
+
+        parse_func must return a list of page texts. Empty results are not cached.
+        pages is the 0-based page subset that was parsed (None for the whole PDF).
+        """
+        key = make_parse_key(pdf_bytes, result_type, language, pages)
+        with self._key_lock(key):
+            pages = self.get(key)
+            if pages is not None:
+                return pages
+            pages = parse_func()
+            if pages:
+                self.put(key, pages)
+            return pages
+
+
+# Shared cache used by all invoice apps
+parse_cache = ParseCache()
@@ -0,0 +1,169 @@
+"""
+Canonical party (vendor / customer) names for roll-ups.
+
+The same company shows up as "UMAR BIN SALAM", "Umar Bin Salam " or
+"Acme Trading L.L.C." / "ACME TRADING LLC". PartyIndex maps every name to
+a canonical entity (named after the first spelling seen):
+  - a TRN, when present, identifies the entity outright,
+  - cleaned names (case, punctuation and legal suffixes dropped) are
+    looked up in a dict,
+  - anything else goes through a MinHash LSH index over character
+    trigrams: only entities sharing a band bucket are compared (trigram
+    Jaccard >= PARTY_MATCH_THRESHOLD), so a lookup stays sublinear in the
+    number of known parties.
+Names with different TRNs are never merged.
+"""
+
+import os
+import random
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from invoice_store import normalize_key_part
+from normalization import is_missing
+
+PARTY_MATCH_THRESHOLD = float(os.getenv("PARTY_MATCH_THRESHOLD", "0.8"))
+
+# 16 bands x 4 rows: names at the threshold share a bucket with near certainty
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+# a * h + b stays below 2**64 for 32-bit shingle hashes h
+MERSENNE_PRIME = (1 << 31) - 1
+# Fixed seed so signatures are the same in every process
+_rng = random.Random(20250901)
+PERMUTATION_A = np.array([_rng.randrange(1, MERSENNE_PRIME) for _ in range(MINHASH_BANDS * MINHASH_ROWS)],
+                         dtype=np.uint64)
+PERMUTATION_B = np.array([_rng.randrange(0, MERSENNE_PRIME) for _ in range(MINHASH_BANDS * MINHASH_ROWS)],
+                         dtype=np.uint64)
+
+# Trailing legal-form tokens that don't distinguish one company from another
+LEGAL_SUFFIXES = frozenset({
+    "LLC", "FZE", "FZCO", "FZC", "FZ", "LTD", "LIMITED", "INC", "CO", "COMPANY", "CORP",
+    "EST", "ESTABLISHMENT", "PJSC", "PSC", "PLC", "LLP", "GMBH", "WLL", "SPC", "DMCC",
+})
+NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def clean_name(name) -> str:
+    """Upper-case words without punctuation or trailing legal suffixes ("Acme Trading L.L.C." -> "ACME TRADING")"""
+    if is_missing(name):
+        return ""
+    text = str(name).upper().replace("&", " AND ").replace(".", "")
+    tokens = NON_ALNUM.sub(" ", text).split()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def trigrams(cleaned) -> frozenset:
+    padded = f" {cleaned} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def minhash(shingles):
+    """MinHash signature of a shingle set, one value per permutation"""
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64)
+    return ((np.outer(PERMUTATION_A, hashes) + PERMUTATION_B[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+def jaccard(left, right) -> float:
+    return len(left & right) / len(left | right) if left or right else 0.0
+
+
+class PartyIndex:
+    """Canonical party entities with TRN, exact-name and MinHash LSH lookups"""
+
+    def __init__(self, threshold=PARTY_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.names = []       # entity id -> canonical (first seen) name
+        self._trns = []       # entity id -> normalized TRN or ""
+        self._shingles = []   # entity id -> trigrams of its cleaned name
+        self._by_name = {}    # cleaned name -> entity id
+        self._by_trn = {}     # normalized TRN -> entity id
+        self._buckets = {}    # (band, band values) -> entity ids
+
+    def _bands(self, shingles):
+        signature = minhash(shingles)
+        return [(band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS].tobytes())
+                for band in range(MINHASH_BANDS)]
+
+    def _similar(self, shingles, bands):
+        """Most similar known entity at or above the threshold, or None"""
+        candidates = set()
+        for bucket in bands:
+            candidates.update(self._buckets.get(bucket, ()))
+        best, best_score = None, self.threshold
+        for entity in candidates:
+            score = jaccard(shingles, self._shingles[entity])
+            if score >= best_score:
+                best, best_score = entity, score
+        return best
+
+    def _add(self, name, shingles, bands):
+        entity = len(self.names)
+        self.names.append(" ".join(str(name).split()))
+        self._trns.append("")
+        self._shingles.append(shingles)
+        for bucket in bands:
+            self._buckets.setdefault(bucket, []).append(entity)
+        return entity
+
+    def resolve(self, name, trn=None):
+        """Entity id of a party name (and optional TRN), adding a new entity when nothing matches.
+
+        None when there is neither a name nor a TRN.
+        """
+        cleaned = clean_name(name)
+        trn_key = normalize_key_part(trn)
+        if not cleaned and not trn_key:
+            return None
+        shingles = trigrams(cleaned) if cleaned else frozenset()
+        bands = None
+        with self._lock:
+            entity = self._by_trn.get(trn_key) if trn_key else None
+            if entity is None and cleaned:
+                entity = self._by_name.get(cleaned)
+                if entity is None:
+                    bands = self._bands(shingles)
+                    entity = self._similar(shingles, bands)
+                if entity is not None and trn_key and self._trns[entity] not in ("", trn_key):
+                    # Same-looking name under another TRN is another company
+                    entity = None
+            if entity is None:
+                if cleaned and bands is None:
+                    bands = self._bands(shingles)
+                entity = self._add(name if cleaned else trn_key, shingles, bands or [])
+            if trn_key and not self._trns[entity]:
+                self._trns[entity] = trn_key
+                self._by_trn[trn_key] = entity
+            if cleaned:
+                self._by_name.setdefault(cleaned, entity)
+            return entity
+
+    def canonical(self, name, trn=None):
+        """Canonical name of a party, or None when there is neither a name nor a TRN"""
+        entity = self.resolve(name, trn)
+        return None if entity is None else self.names[entity]
+
+    def canonicalize(self, names, trns=None) -> list:
+        """Canonical names for a column of party names (and optional TRNs)"""
+        trns = [None] * len(names) if trns is None else list(trns)
+        return [self.canonical(name, trn) for name, trn in zip(list(names), trns)]
+
+    def count(self, names, trns=None) -> int:
+        """Number of distinct parties in a column of names (missing names are not counted)"""
+        trns = [None] * len(names) if trns is None else list(trns)
+        entities = {self.resolve(name, trn) for name, trn in zip(list(names), trns)}
+        entities.discard(None)
+        return len(entities)
+
+    def stats(self) -> dict:
+        return {"entities": len(self.names), "names": len(self._by_name)}
+
+
+# Shared index used by all invoice apps
+party_index = PartyIndex()
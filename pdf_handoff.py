@@ -0,0 +1,88 @@
+"""
+Zero-copy handoff of uploaded PDFs to the parse backends.
+
+Uploads are exposed as a memoryview over the upload's own buffer instead of
+being read into a second bytes object, and are passed to LlamaParse (and
+pdfplumber) through a file-like reader over that view. Only when the
+installed llama_parse cannot take file objects is a temporary file
+written, and it is always removed afterwards.
+"""
+
+import inspect
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+class MemoryviewReader(io.BufferedIOBase):
+    """Read-only, seekable file object over a buffer that does not copy it"""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return chunk
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def pdf_buffer(uploaded_file):
+    """Return the upload's bytes without copying them when possible"""
+    if hasattr(uploaded_file, "getbuffer"):
+        return uploaded_file.getbuffer()
+    uploaded_file.seek(0)
+    return uploaded_file.read()
+
+
+@contextmanager
+def temporary_pdf_path(pdf_data):
+    """Write pdf_data to a temporary .pdf file that is removed on exit, even on error"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_data)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def accepts_file_objects(parse_method) -> bool:
+    """True when a LlamaParse method takes bytes/file objects (it has an extra_info parameter)"""
+    try:
+        return "extra_info" in inspect.signature(parse_method).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def run_parser_on_pdf(parse_method, pdf_data, file_name="invoice.pdf"):
+    """Call parser.load_data / parser.parse on in-memory PDF data"""
+    if accepts_file_objects(parse_method):
+        return parse_method(MemoryviewReader(pdf_data), extra_info={"file_name": file_name})
+    with temporary_pdf_path(pdf_data) as path:
+        return parse_method(path)
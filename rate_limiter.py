@@ -0,0 +1,198 @@
+"""
+Quota-aware scheduling for LlamaParse and Gemini calls.
+
+Every external call goes through a shared Scheduler that
+  - waits for a requests-per-minute token bucket (and, for Gemini, a
+    tokens-per-minute bucket sized by the prompt),
+  - retries rate-limit / transient errors (429, 5xx, timeouts) with
+    jittered exponential backoff,
+  - opens a circuit breaker after several consecutive retryable failures,
+    pausing every caller for a cool-down instead of failing the rest of
+    the batch one file after another.
+
+Schedulers are process-wide: LlamaParse gets one per API key, Gemini one
+per model name (genai is configured with a single key per process and
+quotas apply per model).
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+LLAMAPARSE_RPM = float(os.getenv("LLAMAPARSE_RPM", "60"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "60"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+}
+RETRYABLE_MESSAGES = ("429", "rate limit", "quota", "throttl", "too many requests", "temporarily unavailable")
+
+
+def estimate_tokens(text) -> int:
+    """Rough token count (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error) -> bool:
+    """True for rate-limit and transient server/network errors"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "code", None), getattr(error, "status_code", None),
+                   getattr(response, "status_code", None)):
+        if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+            return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MESSAGES)
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter for retry number attempt (1-based)"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Block until amount tokens are available, then take them"""
+        if self.rate <= 0:
+            return
+        # A request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Pause all callers after too many consecutive retryable failures"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def wait_until_closed(self):
+        """Sleep while the breaker is open (the batch is paused)"""
+        while True:
+            remaining = self._open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.cooldown
+                # Half-open after the cool-down: one more failure re-opens it
+                self._failures = self.failure_threshold - 1
+
+
+class Scheduler:
+    """Rate-limited, retrying, circuit-broken gateway to one backend/key"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None, max_attempts=RETRY_MAX_ATTEMPTS,
+                 breaker=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_attempts = max(1, max_attempts)
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+
+    def call(self, func, tokens=0):
+        """Run func() within the budgets, retrying retryable errors; re-raises the last error"""
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.wait_until_closed()
+            self.requests.acquire()
+            if self.tokens is not None and tokens:
+                self.tokens.acquire(tokens)
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_attempts:
+                    raise
+                self.retries += 1
+                time.sleep(backoff_delay(attempt))
+            else:
+                self.breaker.record_success()
+                return result
+
+
+_schedulers = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = factory()
+            _schedulers[key] = scheduler
+        return scheduler
+
+
+def gemini_scheduler(model_name) -> Scheduler:
+    """Shared scheduler for a Gemini model"""
+    return _get_or_create(("gemini", model_name), lambda: Scheduler(GEMINI_RPM, GEMINI_TPM))
+
+
+def llamaparse_scheduler(api_key) -> Scheduler:
+    """Shared scheduler for a LlamaParse API key"""
+    key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return _get_or_create(("llamaparse", key_id), lambda: Scheduler(LLAMAPARSE_RPM))
+
+
+def generate_content(model, prompt, generation_config=None):
+    """model.generate_content(prompt) through the model's shared scheduler"""
+    kwargs = {"generation_config": generation_config} if generation_config else {}
+    return gemini_scheduler(model.model_name).call(lambda: model.generate_content(prompt, **kwargs),
+                                                   tokens=estimate_tokens(prompt))
+
+
+def rate_limited_parse(parser, func):
+    """Run a LlamaParse call (func()) through the parser's API-key scheduler"""
+    return llamaparse_scheduler(getattr(parser, "api_key", None)).call(func)
@@ -0,0 +1,285 @@
+"""
+Deterministic pre-extraction of invoice fields from markdown.
+
+UAE invoices have very regular anchors: 15-digit TRNs, "Invoice No" and
+"Date" labels, and "Sub Total" / "VAT 5%" / "Total" lines. This module
+fills the GEMINI_PROMPT schema from those anchors with a confidence score
+per field. When every required field is found with enough confidence and
+subtotal + tax reconciles with net_total, the Gemini call can be skipped.
+"""
+
+import os
+import re
+from datetime import date
+
+RULE_EXTRACTION = os.getenv("RULE_EXTRACTION", "1") == "1"
+RULE_MIN_CONFIDENCE = float(os.getenv("RULE_MIN_CONFIDENCE", "0.8"))
+
+REQUIRED_FIELDS = ["date", "invoice_number", "party_name", "trn", "subtotal", "tax_amount", "net_total", "currency"]
+TOTALS_TOLERANCE = 0.05
+
+CURRENCY_CODES = ["AED", "USD", "EUR", "GBP", "SAR", "QAR", "OMR", "KWD", "BHD", "INR", "PKR", "CNY", "JPY"]
+CURRENCY_ALIASES = {"DHS": "AED", "DIRHAM": "AED", "DIRHAMS": "AED", "$": "USD", "€": "EUR", "£": "GBP"}
+
+MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+
+COMPANY_SUFFIX = re.compile(
+    r"\b(L\.?L\.?C|FZ-?LLC|FZE|FZC|FZCO|DMCC|LTD|LIMITED|INC|CORP(?:ORATION)?|"
+    r"TRADING|EST(?:ABLISHMENT)?|CONTRACTING|SERVICES|ENTERPRISES?|GROUP)\b\.?",
+    re.IGNORECASE
+)
+PARTY_STOP = re.compile(r"\b(bill(?:ed)?\s+to|customer|buyer|ship\s+to|sold\s+to|client)\b", re.IGNORECASE)
+
+TRN_LABELED = re.compile(r"\b(?:TRN|VAT\s*(?:Reg(?:istration)?\.?)?\s*(?:No\.?|Number|#)?|Tax\s+Reg\w*\s*(?:No\.?|Number)?)"
+                         r"[^0-9\n]{0,20}((?:\d[\s-]?){14}\d)", re.IGNORECASE)
+TRN_BARE = re.compile(r"(?<!\d)(1\d{14})(?!\d)")
+
+INVOICE_NUMBER = re.compile(
+    r"\b(?:Tax\s+)?(?:Invoice|Inv|Bill)\s*(?:No\.?|Number|Num|#)\s*[:.\-#]?\s*([A-Z0-9][A-Z0-9/\-_.]*\d[A-Z0-9/\-_]*)",
+    re.IGNORECASE
+)
+
+DATE_LABEL = re.compile(r"\b(?:Invoice\s+)?Date\b|\bDated\b", re.IGNORECASE)
+DATE_ISO = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+DATE_NUMERIC = re.compile(r"\b(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{2,4})\b")
+DATE_TEXT_DMY = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?[\s\-]+([A-Za-z]{3,9})[\s\-,]+(\d{4})\b")
+DATE_TEXT_MDY = re.compile(r"\b([A-Za-z]{3,9})\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b")
+
+PERCENT = re.compile(r"\d+(?:\.\d+)?\s*%")
+AMOUNT = re.compile(r"(?<![\d.,])(\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d{1,9}(?:\.\d{1,2})?)(?![\d,]|\.\d)")
+
+SUBTOTAL_LABEL = re.compile(r"\bsub[\s\-]*total\b|\btotal\s+(?:before|excl\w*|exclusive\s+of)\s+(?:vat|tax)\b|"
+                            r"\btaxable\s+(?:amount|value)\b|\bamount\s+before\s+(?:vat|tax)\b", re.IGNORECASE)
+TAX_LABEL = re.compile(r"\b(?:vat|tax)\b", re.IGNORECASE)
+TAX_EXCLUDE = re.compile(r"\b(?:trn|reg\w*|incl\w*|inclusive|invoice|number|no\.?)\b", re.IGNORECASE)
+NET_LABEL = re.compile(r"\b(?:grand\s+total|net\s+total|total\s+amount|invoice\s+total|total\s+due|"
+                       r"amount\s+due|balance\s+due|total\s+payable|total)\b", re.IGNORECASE)
+# "Total Qty 1,200" / "Total Items 12" are counts, not amounts
+NET_EXCLUDE = re.compile(r"\b(?:words?|qty|quantity|items?|pcs|units?|weight|kgs?)\b", re.IGNORECASE)
+# Lines after a "Bill To" / "Customer" line that still belong to the customer block
+CUSTOMER_BLOCK_LINES = 3
+
+
+def normalize_lines(markdown_text):
+    """Strip markdown decoration and table pipes so labels and values share a line"""
+    lines = []
+    for line in markdown_text.splitlines():
+        if re.fullmatch(r"\s*\|?[\s:\-|]+\|?\s*", line):
+            continue  # table separator row
+        line = line.replace("|", "  ")
+        line = re.sub(r"[#*_`>]+", " ", line)
+        line = " ".join(line.split())
+        if line:
+            lines.append(line)
+    return lines
+
+
+def to_iso_date(day, month, year):
+    """Build a YYYY-MM-DD string, or None if the parts are not a real date"""
+    try:
+        year = int(year)
+        if year < 100:
+            year += 2000
+        return date(year, int(month), int(day)).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def find_dates(line):
+    """All (iso_date, unambiguous) pairs found on a line"""
+    found = []
+    for y, m, d in DATE_ISO.findall(line):
+        iso = to_iso_date(d, m, y)
+        if iso:
+            found.append((iso, True))
+    for d, m, y in DATE_NUMERIC.findall(line):
+        # UAE invoices use day-first dates; only unambiguous when day > 12
+        iso = to_iso_date(d, m, y)
+        if iso:
+            found.append((iso, int(d) > 12 or d == m))
+        elif int(m) > 12:
+            iso = to_iso_date(m, d, y)
+            if iso:
+                found.append((iso, True))
+    for d, mon, y in DATE_TEXT_DMY.findall(line):
+        month = MONTHS.get(mon[:3].lower())
+        iso = to_iso_date(d, month, y) if month else None
+        if iso:
+            found.append((iso, True))
+    for mon, d, y in DATE_TEXT_MDY.findall(line):
+        month = MONTHS.get(mon[:3].lower())
+        iso = to_iso_date(d, month, y) if month else None
+        if iso:
+            found.append((iso, True))
+    return found
+
+
+def last_amount(line):
+    """Last monetary amount on a line, ignoring percentages"""
+    amounts = AMOUNT.findall(PERCENT.sub(" ", line))
+    if not amounts:
+        return None
+    return float(amounts[-1].replace(",", ""))
+
+
+def customer_lines(lines) -> set:
+    """Indexes of lines in a customer block ("Bill To" / "Customer" line and the lines right after it)"""
+    indexes = set()
+    for idx, line in enumerate(lines):
+        if PARTY_STOP.search(line):
+            indexes.update(range(idx, idx + CUSTOMER_BLOCK_LINES + 1))
+    return indexes
+
+
+def extract_trn(lines):
+    """Vendor TRN: TRNs in the customer block are skipped, and two different candidates are not trusted"""
+    customer = customer_lines(lines)
+    for pattern, confidence in ((TRN_LABELED, 0.95), (TRN_BARE, 0.7)):
+        candidates = []
+        for idx, line in enumerate(lines):
+            match = pattern.search(line)
+            if match and idx not in customer:
+                trn = re.sub(r"\D", "", match.group(1))
+                if trn not in candidates:
+                    candidates.append(trn)
+        if candidates:
+            return candidates[0], confidence if len(candidates) == 1 else 0.5
+    return None, 0.0
+
+
+def extract_invoice_number(lines):
+    for line in lines:
+        match = INVOICE_NUMBER.search(line)
+        if match:
+            return match.group(1).rstrip(".-/"), 0.9
+    return None, 0.0
+
+
+def extract_date(lines):
+    # Prefer a date on a line with a "Date" label, ignoring due dates
+    for line in lines:
+        if DATE_LABEL.search(line) and not re.search(r"\bdue\b", line, re.IGNORECASE):
+            dates = find_dates(line)
+            if dates:
+                iso, unambiguous = dates[0]
+                # 03/04/2025 is read day-first, but not trusted enough to skip Gemini
+                return iso, 0.95 if unambiguous else 0.6
+    for line in lines:
+        dates = find_dates(line)
+        if dates:
+            iso, unambiguous = dates[0]
+            return iso, 0.7 if unambiguous else 0.5
+    return None, 0.0
+
+
+def extract_party(lines):
+    """Vendor name and address from the letterhead at the top of the invoice"""
+    for idx, line in enumerate(lines[:20]):
+        if PARTY_STOP.search(line):
+            break
+        if COMPANY_SUFFIX.search(line) and not re.search(r"\b(?:trn|tel|phone|email)\b", line, re.IGNORECASE):
+            name = re.sub(r"^(?:from|vendor|supplier)\s*[:\-]\s*", "", line, flags=re.IGNORECASE).strip()
+            address_lines = []
+            for next_line in lines[idx + 1:idx + 4]:
+                if re.search(r"\b(?:trn|vat|tel|phone|fax|email|invoice|date)\b|@|\d{15}", next_line, re.IGNORECASE):
+                    break
+                address_lines.append(next_line)
+            address = ", ".join(address_lines) or None
+            return (name, 0.85 if idx < 10 else 0.6), (address, 0.6 if address else 0.0)
+    return (None, 0.0), (None, 0.0)
+
+
+def extract_currency(lines):
+    counts = {}
+    for line in lines:
+        for token in re.findall(r"[A-Za-z]+|[$€£]", line):
+            code = token.upper()
+            code = CURRENCY_ALIASES.get(code, code)
+            if code in CURRENCY_CODES:
+                counts[code] = counts.get(code, 0) + 1
+    if not counts:
+        return None, 0.0
+    best = max(counts, key=counts.get)
+    return best, 0.9 if len(counts) == 1 else 0.7
+
+
+def extract_totals(lines):
+    subtotal = tax = None
+    net_candidates = []
+    for line in lines:
+        amount = last_amount(line)
+        if amount is None:
+            continue
+        if SUBTOTAL_LABEL.search(line):
+            if subtotal is None:
+                subtotal = amount
+        elif TAX_LABEL.search(line) and not TAX_EXCLUDE.search(line):
+            if tax is None:
+                tax = amount
+        elif NET_LABEL.search(line) and not NET_EXCLUDE.search(line):
+            net_candidates.append(amount)
+    # The candidate that subtotal + tax adds up to, else the largest one
+    matching = [amount for amount in net_candidates if totals_reconcile(subtotal, tax, amount)]
+    net_total = matching[0] if matching else max(net_candidates, default=None)
+    return subtotal, tax, net_total
+
+
+def totals_reconcile(subtotal, tax_amount, net_total) -> bool:
+    """True when subtotal + tax matches net_total within rounding"""
+    if None in (subtotal, tax_amount, net_total):
+        return False
+    return abs(subtotal + tax_amount - net_total) <= TOTALS_TOLERANCE
+
+
+def pre_extract_invoice(markdown_text) -> tuple:
+    """Fill the GEMINI_PROMPT fields from text anchors.
+
+    Returns (data, confidence) where confidence maps each field to 0.0-1.0.
+    """
+    lines = normalize_lines(markdown_text)
+    (party_name, party_conf), (party_address, address_conf) = extract_party(lines)
+    trn, trn_conf = extract_trn(lines)
+    invoice_number, number_conf = extract_invoice_number(lines)
+    invoice_date, date_conf = extract_date(lines)
+    currency, currency_conf = extract_currency(lines)
+    subtotal, tax_amount, net_total = extract_totals(lines)
+
+    # Totals are only trusted when they add up
+    totals_conf = 0.95 if totals_reconcile(subtotal, tax_amount, net_total) else 0.4
+
+    data = {
+        "date": invoice_date,
+        "invoice_number": invoice_number,
+        "party_name": party_name,
+        "party_address": party_address,
+        "trn": trn,
+        "subtotal": subtotal,
+        "tax_amount": tax_amount,
+        "net_total": net_total,
+        "currency": currency,
+        "items_count": None,
+    }
+    confidence = {
+        "date": date_conf,
+        "invoice_number": number_conf,
+        "party_name": party_conf,
+        "party_address": address_conf,
+        "trn": trn_conf,
+        "subtotal": totals_conf if subtotal is not None else 0.0,
+        "tax_amount": totals_conf if tax_amount is not None else 0.0,
+        "net_total": totals_conf if net_total is not None else 0.0,
+        "currency": currency_conf,
+        "items_count": 0.0,
+    }
+    return data, confidence
+
+
+def rule_based_fields(markdown_text):
+    """Return the rule-extracted fields when confident enough to skip Gemini, else None"""
+    if not RULE_EXTRACTION:
+        return None
+    data, confidence = pre_extract_invoice(markdown_text)
+    if all(data[field] is not None and confidence[field] >= RULE_MIN_CONFIDENCE for field in REQUIRED_FIELDS):
+        return data
+    return None
@@ -1,9 +1,21 @@
 import streamlit as st
 import os
-import json
 import pandas as pd
 from datetime import datetime
-import tempfile
+from extraction_cache import extraction_cache
+from structured_output import json_output_stats
+from pdf_handoff import pdf_buffer
+from client_registry import get_llama_parser, get_gemini_model, warm_up_clients
+from invoice_extraction import SALES_MODEL_NAME, parse_sales_pdf, extract_sales_invoice, sales_failed_record
+from batch_executor import run_pipeline
+from streaming_excel import StreamingWorkbookWriter, SummaryTotals
+from batch_journal import BatchJournal, batch_id, file_key
+from excel_export import XLSX_MIME
+from normalization import normalize_invoice
+from invoice_records import InvoiceBatch
+from invoice_archive import archive_frame
+from invoice_store import invoice_store
+from duplicate_detection import DuplicateIndex, content_hash, duplicate_record
 
 # For PDF parsing
 try:
@@ -80,204 +92,101 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-# ==================== EXTRACTION PROMPT ====================
-
-SALES_EXTRACTION_PROMPT = """
-You are an expert at extracting data from SALES INVOICES. 
+# ==================== CORE FUNCTIONS ====================
 
-IMPORTANT: This is a SALES INVOICE where:
-- YOUR COMPANY is the vendor/seller (the company issuing and sending the invoice)
-- The CUSTOMER is the party being billed (in "Bill To" section)
+@st.cache_resource(show_spinner="🔌 Connecting to LlamaParse and Gemini...")
+def warm_up():
+    """Create the shared API clients once per process and health-check them"""
+    status = warm_up_clients(LLAMA_API_KEY, [SALES_MODEL_NAME])
+    errors = {name: error for name, error in status.items() if error}
+    if errors:
+        # Raising keeps a failed check out of the resource cache so the next rerun retries
+        raise RuntimeError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+    return status
 
-Extract the following information from this sales invoice and return ONLY valid JSON:
+def parse_single_invoice(pdf_file):
+    """Parse stage: PDF to markdown with the shared LlamaParse client"""
+    return parse_sales_pdf(pdf_buffer(pdf_file), pdf_file.name, lambda: get_llama_parser(LLAMA_API_KEY))
 
-{
-    "invoice_date": "YYYY-MM-DD format",
-    "invoice_number": "Invoice number",
-    "customer_name": "Customer company name (Bill To section)",
-    "customer_address": "Full customer address",
-    "customer_trn": "Customer TRN/Tax Registration Number if available, else null",
-    "subtotal": "Subtotal amount as number (no currency symbols)",
-    "tax_amount": "Tax/VAT amount as number",
-    "net_total": "Final total amount as number",
-    "currency": "Currency code (e.g., AED, USD)",
-    "description": "Brief description of items/services",
-    "payment_terms": "Payment terms if mentioned, else null",
-    "items_count": "Number of line items"
-}
+def extract_single_invoice(pdf_file, parsed):
+    """Extract stage: markdown to a result record with the shared Gemini model"""
+    return extract_sales_invoice(parsed, pdf_file.name, get_gemini_model(SALES_MODEL_NAME))
 
-Rules:
-- Return ONLY valid JSON, no additional text
-- All amounts must be numbers without currency symbols
-- Date must be in YYYY-MM-DD format
-- Extract customer from "Bill To" section
-- Your company (the issuer) should NOT be in customer_name
-"""
+# Invoices sheet columns: (InvoiceRecord field, column header)
+INVOICE_SHEET_COLUMNS = [
+    ('invoice_date', 'Invoice Date'),
+    ('invoice_number', 'Invoice Number'),
+    ('party_name', 'Customer Name'),
+    ('party_address', 'Customer Address'),
+    ('trn', 'Customer TRN'),
+    ('subtotal', 'Subtotal'),
+    ('tax_amount', 'Tax Amount'),
+    ('net_total', 'Net Total'),
+    ('currency', 'Currency'),
+    ('description', 'Description'),
+    ('payment_terms', 'Payment Terms'),
+    ('items_count', 'Items Count'),
+    ('source_file', 'Filename'),
+    ('parse_backend', 'Parse Backend'),
+    ('duplicate_of', 'Duplicate Of'),
+]
 
-# ==================== CORE FUNCTIONS ====================
+def open_excel_output():
+    """Start an in-memory streaming workbook that invoice records are appended to as they finish"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"sales_invoices_{timestamp}.xlsx"
+    
+    writer = StreamingWorkbookWriter()
+    writer.add_table('Invoices', [header for _, header in INVOICE_SHEET_COLUMNS])
+    writer.add_table('Summary', ['Metric', 'Value'])
+    return filename, writer, SummaryTotals(party_label='Unique Customers')
 
-def parse_pdf_with_llamaparse(pdf_file):
-    """Parse PDF using LlamaParse"""
-    try:
-        parser = LlamaParse(
-            api_key=LLAMA_API_KEY,
-            result_type="markdown"
-        )
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Parse the PDF
-        documents = parser.load_data(tmp_path)
-        
-        # Clean up temp file
-        os.unlink(tmp_path)
-        
-        # Extract text from parsed documents
-        text_content = "\n\n".join([doc.text for doc in documents])
-        return text_content
-        
-    except Exception as e:
-        raise Exception(f"LlamaParse error: {str(e)}")
+def append_excel_row(writer, totals, inv, duplicates):
+    """Write one InvoiceRecord to the Invoices (or Errors) sheet and update the totals.
 
-def extract_with_gemini(markdown_text):
-    """Extract structured data using Gemini"""
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"{SALES_EXTRACTION_PROMPT}\n\nSALES INVOICE TEXT:\n{markdown_text}"
-        
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean response
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
-        
-        # Parse JSON
-        data = json.loads(response_text)
-        return data
-        
-    except json.JSONDecodeError as e:
-        raise Exception(f"JSON parsing error: {str(e)}\nResponse: {response_text[:200]}")
-    except Exception as e:
-        raise Exception(f"Gemini extraction error: {str(e)}")
+    Successful records are normalized once here (typed amounts, ISO date
+    and currency) and checked against the invoices seen so far; the
+    normalized record is returned for the on-screen frames.
+    """
+    if inv.success:
+        inv = normalize_invoice(inv)
+        inv.duplicate_of = inv.duplicate_of or duplicates.check_invoice(inv)
+    totals.add(inv)
+    if inv.success:
+        writer.append('Invoices', [getattr(inv, field) for field, _ in INVOICE_SHEET_COLUMNS])
+    else:
+        # Errors sheet is only created once something fails
+        writer.add_table('Errors', ['Filename', 'Error'])
+        writer.append('Errors', [inv.source_file, inv.error])
+    return inv
 
-def process_single_invoice(pdf_file, filename):
-    """Process a single sales invoice"""
-    try:
-        # Step 1: Parse PDF
-        markdown_text = parse_pdf_with_llamaparse(pdf_file)
-        
-        # Step 2: Extract data
-        invoice_data = extract_with_gemini(markdown_text)
-        
-        # Add filename for reference
-        invoice_data['filename'] = filename
-        invoice_data['status'] = 'success'
-        invoice_data['error'] = None
-        
-        return invoice_data
-        
-    except Exception as e:
-        return {
-            'filename': filename,
-            'status': 'failed',
-            'error': str(e),
-            'invoice_date': None,
-            'invoice_number': None,
-            'customer_name': None,
-            'customer_address': None,
-            'customer_trn': None,
-            'subtotal': 0,
-            'tax_amount': 0,
-            'net_total': 0,
-            'currency': None,
-            'description': None,
-            'payment_terms': None,
-            'items_count': 0
-        }
+def close_excel_output(writer, totals):
+    """Write the Summary sheet from the running totals; returns the workbook bytes"""
+    for row in totals.summary_rows():
+        writer.append('Summary', row)
+    return writer.close()
 
-def create_excel_output(invoices_data):
-    """Create Excel file from extracted invoice data"""
-    # Filter successful extractions
-    successful = [inv for inv in invoices_data if inv['status'] == 'success']
-    failed = [inv for inv in invoices_data if inv['status'] == 'failed']
+def create_result_frames(invoices_data, totals):
+    """DataFrames of the (already normalized) InvoiceBatch results for on-screen display"""
+    successful = invoices_data.select('success')
+    failed = invoices_data.select('failed')
     
-    # Create DataFrame for invoices
-    if successful:
-        df_invoices = pd.DataFrame(successful)
-        # Reorder columns
-        column_order = [
-            'invoice_date', 'invoice_number', 'customer_name', 'customer_address',
-            'customer_trn', 'subtotal', 'tax_amount', 'net_total', 'currency',
-            'description', 'payment_terms', 'items_count', 'filename'
-        ]
-        df_invoices = df_invoices[[col for col in column_order if col in df_invoices.columns]]
-        
-        # Rename columns for better readability
-        df_invoices.columns = [
-            'Invoice Date', 'Invoice Number', 'Customer Name', 'Customer Address',
-            'Customer TRN', 'Subtotal', 'Tax Amount', 'Net Total', 'Currency',
-            'Description', 'Payment Terms', 'Items Count', 'Filename'
-        ]
+    if len(successful):
+        df_invoices = pd.DataFrame({header: successful.column(field) for field, header in INVOICE_SHEET_COLUMNS})
     else:
         df_invoices = pd.DataFrame()
     
-    # Create summary DataFrame
-    summary_data = {
-        'Metric': [
-            'Total Invoices',
-            'Successfully Processed',
-            'Failed',
-            'Success Rate',
-            'Total Subtotal',
-            'Total Tax',
-            'Total Amount',
-            'Currency'
-        ],
-        'Value': [
-            len(invoices_data),
-            len(successful),
-            len(failed),
-            f"{(len(successful)/len(invoices_data)*100):.1f}%" if invoices_data else "0%",
-            f"{df_invoices['Subtotal'].sum():.2f}" if not df_invoices.empty else "0.00",
-            f"{df_invoices['Tax Amount'].sum():.2f}" if not df_invoices.empty else "0.00",
-            f"{df_invoices['Net Total'].sum():.2f}" if not df_invoices.empty else "0.00",
-            df_invoices['Currency'].iloc[0] if not df_invoices.empty else "N/A"
-        ]
-    }
-    df_summary = pd.DataFrame(summary_data)
+    df_summary = pd.DataFrame(totals.summary_rows(), columns=['Metric', 'Value'])
     
-    # Create errors DataFrame if any failed
-    if failed:
-        df_errors = pd.DataFrame([{
-            'Filename': inv['filename'],
-            'Error': inv['error']
-        } for inv in failed])
+    if len(failed):
+        df_errors = pd.DataFrame({
+            'Filename': failed.column('source_file'),
+            'Error': failed.column('error')
+        })
     else:
         df_errors = pd.DataFrame()
     
-    # Generate Excel file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"sales_invoices_{timestamp}.xlsx"
-    
-    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
-        if not df_invoices.empty:
-            df_invoices.to_excel(writer, sheet_name='Invoices', index=False)
-        df_summary.to_excel(writer, sheet_name='Summary', index=False)
-        if not df_errors.empty:
-            df_errors.to_excel(writer, sheet_name='Errors', index=False)
-    
-    return filename, df_invoices, df_summary, df_errors
+    return df_invoices, df_summary, df_errors
 
 # ==================== STREAMLIT UI ====================
 
@@ -285,6 +194,11 @@ def main():
     # Load custom CSS
     load_css()
     
+    try:
+        warm_up()
+    except RuntimeError as e:
+        st.warning(f"⚠️ API health check failed: {str(e)}")
+    
     # Header
     st.markdown('<div class="main-header">📤 Sales Invoice Extraction System</div>', unsafe_allow_html=True)
     
@@ -319,25 +233,93 @@ def main():
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            invoices_data = []
+            excel_filename, excel_writer, totals = open_excel_output()
             
-            # Process each file
-            for idx, uploaded_file in enumerate(uploaded_files):
-                status_text.text(f"Processing {idx + 1}/{len(uploaded_files)}: {uploaded_file.name}")
-                progress_bar.progress((idx) / len(uploaded_files))
-                
-                result = process_single_invoice(uploaded_file, uploaded_file.name)
-                invoices_data.append(result)
+            # Files finished by an interrupted run over the same upload set come from its journal
+            file_keys = [file_key(f.name, pdf_buffer(f)) for f in uploaded_files]
+            journal = BatchJournal("sales", file_keys)
+            invoices_data = InvoiceBatch(len(file_keys))
+            duplicates = DuplicateIndex('sales')
+            for idx, key in enumerate(file_keys):
+                result = journal.get(key)
+                if result is not None:
+                    invoices_data.set(idx, append_excel_row(excel_writer, totals, result, duplicates))
+            
+            # Identical copies of a file earlier in the upload (or stored by an earlier run)
+            # reuse the original's result instead of going through LlamaParse and Gemini
+            copies = {}
+            for idx, (f, key) in enumerate(zip(uploaded_files, file_keys)):
+                original = duplicates.check_file(f.name, content_hash(key))
+                if original is not None and invoices_data.column('status')[idx] is None:
+                    copies[idx] = original
+            todo = [idx for idx, status in enumerate(invoices_data.column('status'))
+                    if status is None and idx not in copies]
+            
+            # Parse (LlamaParse) and extract (Gemini) run as separate stages;
+            # records go straight to the journal and the Excel file as they finish
+            pipeline_text = st.empty()
+            pipeline_stats = []
+            
+            def on_complete(done, _, idx, result):
+                journal.record(file_keys[idx], result)
+                invoices_data.set(idx, append_excel_row(excel_writer, totals, result, duplicates))
+                status_text.text(f"Processed {done}/{len(todo)}: {uploaded_files[idx].name}")
+                progress_bar.progress(done / len(todo))
+                pipeline_text.caption(f"⚙️ {pipeline_stats[0].describe()}")
+            
+            run_pipeline(
+                todo,
+                parse=lambda idx: parse_single_invoice(uploaded_files[idx]),
+                extract=lambda idx, parsed: extract_single_invoice(uploaded_files[idx], parsed),
+                failed=lambda idx, error: sales_failed_record(uploaded_files[idx].name, error),
+                on_complete=on_complete,
+                on_start=pipeline_stats.append
+            )
+            upload_index = {f.name: idx for idx, f in enumerate(uploaded_files)}
+            for idx, original in copies.items():
+                name = uploaded_files[idx].name
+                if original in upload_index:
+                    result = duplicate_record(invoices_data[upload_index[original]], name, original)
+                else:
+                    result = duplicates.stored_record(content_hash(file_keys[idx]), name) or sales_failed_record(
+                        name, f"Identical copy of {original}, whose stored result could not be read")
+                journal.record(file_keys[idx], result)
+                invoices_data.set(idx, append_excel_row(excel_writer, totals, result, duplicates))
+            journal.close()
+            pipeline_text.empty()
+            
+            try:
+                archive_frame(invoices_data.select('success').to_frame('sales'), 'sales', 'sales',
+                              batch_id('sales', file_keys),
+                              file_keys={f.name: key for f, key in zip(uploaded_files, file_keys)})
+            except Exception as e:
+                st.warning(f"⚠️ Could not archive results to Parquet: {str(e)}")
+            try:
+                inserted, updated = invoice_store.upsert_frame(
+                    invoices_data.select('success').to_frame('sales'), 'sales', 'sales', batch_id('sales', file_keys),
+                    file_hashes={f.name: content_hash(key) for f, key in zip(uploaded_files, file_keys)}
+                )
+                st.caption(f"🗃️ Invoice store: {inserted} new, {updated} updated")
+            except Exception as e:
+                st.warning(f"⚠️ Could not save results to the invoice store: {str(e)}")
             
             # Complete progress
             progress_bar.progress(1.0)
             status_text.text("✅ Processing complete!")
             
+            cache_stats = extraction_cache.stats()
+            st.caption(f"🧠 Extraction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses · "
+                       f"✂️ ~{sum(n or 0 for n in invoices_data.column('tokens_saved')):,} prompt tokens saved by compaction · "
+                       f"🧾 {json_output_stats.describe()}")
+            if duplicates.file_duplicates or duplicates.invoice_duplicates:
+                st.info(f"🔁 {duplicates.describe()}; they are listed in the workbook but not counted in totals")
+            
             # Generate Excel
             st.subheader("📊 Results")
             
             try:
-                excel_filename, df_invoices, df_summary, df_errors = create_excel_output(invoices_data)
+                excel_bytes = close_excel_output(excel_writer, totals)
+                df_invoices, df_summary, df_errors = create_result_frames(invoices_data, totals)
                 
                 # Display summary
                 st.markdown("### 📈 Summary Statistics")
@@ -353,14 +335,13 @@ def main():
                     st.markdown("### ⚠️ Failed Extractions")
                     st.dataframe(df_errors, use_container_width=True)
                 
-                # Download button
-                with open(excel_filename, 'rb') as f:
-                    st.download_button(
-                        label="⬇️ Download Excel File",
-                        data=f,
-                        file_name=excel_filename,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                # Download button (served from memory, nothing is written to disk)
+                st.download_button(
+                    label="⬇️ Download Excel File",
+                    data=excel_bytes,
+                    file_name=excel_filename,
+                    mime=XLSX_MIME
+                )
                 
                 st.success(f"✅ Excel file generated: {excel_filename}")
                 
@@ -1,9 +1,21 @@
 import streamlit as st
-import os
 import json
 import pandas as pd
 from datetime import datetime
-import tempfile
+from parse_cache import parse_cache
+from pdf_handoff import pdf_buffer, run_parser_on_pdf
+from extraction_cache import extraction_cache
+from client_registry import get_llama_parser, get_gemini_model, warm_up_clients
+from rate_limiter import rate_limited_parse
+from structured_output import generate_json, object_schema, output_format_key
+from streaming_excel import StreamingWorkbookWriter
+from normalization import normalize_record
+from currency_totals import CurrencyTotals
+from invoice_records import InvoiceBatch, InvoiceRecord
+from invoice_archive import archive_frame
+from batch_journal import file_key
+from party_names import party_index
+from excel_export import XLSX_MIME
 
 # For PDF parsing
 try:
@@ -96,42 +108,48 @@ load_css()
 # ==================== HELPER FUNCTIONS ====================
 
 def init_llama_parser():
-    """Initialize LlamaParse with API key"""
+    """Get the shared LlamaParse client (created once per process)"""
     try:
-        parser = LlamaParse(
-            api_key=LLAMA_API_KEY,
-            result_type="markdown",
-            language="en"
-        )
+        parser = get_llama_parser(LLAMA_API_KEY, result_type="markdown", language="en")
         return parser
     except Exception as e:
         st.error(f"❌ Failed to initialize PDF parser: {str(e)}")
         return None
 
 def parse_pdf_with_llama(pdf_file, parser):
-    """Parse PDF using LlamaParse"""
+    """Parse PDF using LlamaParse (cached by file content)"""
+    pdf_bytes = pdf_buffer(pdf_file)
+    
+    def run_llamaparse():
+        # Hand the upload's buffer straight to LlamaParse (no temp file copy), within the rate budget
+        docs = rate_limited_parse(parser, lambda: run_parser_on_pdf(parser.parse, pdf_bytes, pdf_file.name))
+        
+        if docs and len(docs) > 0:
+            return [docs[0].text]
+        else:
+            st.error("❌ No text extracted from PDF")
+            return None
+    
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(pdf_file.read())
-            temp_file.flush()
-            
-            docs = parser.parse(temp_file.name)
-            
-            if docs and len(docs) > 0:
-                return docs[0].text
-            else:
-                st.error("❌ No text extracted from PDF")
-                return None
-                
+        pages = parse_cache.get_or_parse(pdf_bytes, run_llamaparse, result_type="markdown", language="en")
+        return "\n\n".join(pages) if pages else None
     except Exception as e:
         st.error(f"❌ Error parsing PDF: {str(e)}")
         return None
-    finally:
-        if 'temp_file' in locals():
-            try:
-                os.unlink(temp_file.name)
-            except:
-                pass
+
+# Gemini response schema (JSON mode) for the fields in the prompt
+SALES_RESPONSE_SCHEMA = object_schema((
+    "invoice_number", "invoice_date", "customer_name", "customer_address", "service_description",
+    "quantity", "unit_price", "total_amount", "tax_amount", "currency"
+))
+
+# Typed columns of an extracted invoice (normalization.normalize_record)
+SALES_FIELD_TYPES = {
+    "money": ("unit_price", "total_amount", "tax_amount"),
+    "number": ("quantity",),
+    "date": ("invoice_date",),
+    "currency": ("currency",),
+}
 
 def extract_sales_invoice_data(pdf_text):
     """Extract sales invoice data using Gemini AI"""
@@ -172,111 +190,108 @@ Format your response as a clean JSON object only:
     "currency": "value"
 }"""
 
+    model_name = 'gemini-1.5-flash'
+    cached = extraction_cache.get(model_name, prompt, pdf_text, output_format_key(SALES_RESPONSE_SCHEMA))
+    if cached is not None:
+        return cached
+    
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_gemini_model(model_name)
         
         full_prompt = f"{prompt}\n\nInvoice content to analyze:\n{pdf_text}"
         
-        response = model.generate_content(full_prompt)
-        
-        if response and response.text:
-            # Clean the response - remove markdown code blocks if present
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:]
-            if response_text.endswith('```'):
-                response_text = response_text[:-3]
-            
-            response_text = response_text.strip()
-            
-            # Try to parse as JSON
-            try:
-                data = json.loads(response_text)
-                return data
-            except json.JSONDecodeError as json_error:
-                st.error(f"❌ JSON parsing error: {str(json_error)}")
-                st.error(f"Raw response: {response_text}")
-                return None
-        else:
-            st.error("❌ No response from Gemini AI")
+        # JSON mode, constrained to SALES_RESPONSE_SCHEMA
+        try:
+            data = generate_json(model, full_prompt, SALES_RESPONSE_SCHEMA)
+            extraction_cache.put(model_name, prompt, pdf_text, data, output_format_key(SALES_RESPONSE_SCHEMA))
+            return data
+        except json.JSONDecodeError as json_error:
+            st.error(f"❌ JSON parsing error: {str(json_error)}")
+            st.error(f"Raw response: {json_error.doc}")
             return None
             
     except Exception as e:
         st.error(f"❌ Error with Gemini AI: {str(e)}")
         return None
 
-def create_sales_excel_file(invoices_data):
-    """Create Excel file with sales invoice data"""
+def open_sales_excel_file():
+    """Start an in-memory streaming sales workbook that rows are appended to as invoices finish"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"sales_invoices_{timestamp}.xlsx"
+    
+    writer = StreamingWorkbookWriter()
+    writer.add_table('Sales Invoices', [
+        'Invoice Number', 'Invoice Date', 'Customer Name', 'Customer Address',
+        'Service Description', 'Quantity', 'Unit Price', 'Total Amount',
+        'Tax Amount', 'Currency', 'Source File'
+    ])
+    writer.add_table('Summary', ['Invoice', 'Customer', 'Date', 'Amount', 'Currency', 'Status'])
+    return filename, writer
+
+def append_sales_excel_row(writer, inv, index):
+    """Write one normalized invoice to the Sales Invoices and Summary sheets"""
+    # Main sales data sheet
+    writer.append('Sales Invoices', [
+        inv.get('invoice_number', 'Not specified'),
+        inv.get('invoice_date', 'Not specified'),
+        inv.get('customer_name', 'Not specified'),
+        inv.get('customer_address', 'Not specified'),
+        inv.get('service_description', 'Not specified'),
+        inv.get('quantity', 0),
+        inv.get('unit_price', 0),
+        inv.get('total_amount', 0),
+        inv.get('tax_amount', 0),
+        inv.get('currency', 'AED'),
+        inv.get('filename', 'Unknown')
+    ])
+    
+    # Summary sheet
+    writer.append('Summary', [
+        inv.get('invoice_number', f'INV-{index+1}'),
+        inv.get('customer_name', 'Unknown'),
+        inv.get('invoice_date', 'Not specified'),
+        inv.get('total_amount'),
+        inv.get('currency', 'AED'),
+        '✅ Extracted'
+    ])
+
+def close_sales_excel_file(writer, invoice_count, revenue):
+    """Write the Company Info sheet and finish the workbook; returns (xlsx bytes, total revenue text)"""
+    total_revenue = revenue.describe()
+    if revenue.describe_base():
+        total_revenue += f" ({revenue.describe_base()})"
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"sales_invoices_{timestamp}.xlsx"
-        
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            
-            # Main sales data sheet
-            sales_data = []
-            for inv in invoices_data:
-                sales_data.append({
-                    'Invoice Number': inv.get('invoice_number', 'Not specified'),
-                    'Invoice Date': inv.get('invoice_date', 'Not specified'),
-                    'Customer Name': inv.get('customer_name', 'Not specified'),
-                    'Customer Address': inv.get('customer_address', 'Not specified'),
-                    'Service Description': inv.get('service_description', 'Not specified'),
-                    'Quantity': inv.get('quantity', 0),
-                    'Unit Price': inv.get('unit_price', 0),
-                    'Total Amount': inv.get('total_amount', 0),
-                    'Tax Amount': inv.get('tax_amount', 0),
-                    'Currency': inv.get('currency', 'AED'),
-                    'Source File': inv.get('filename', 'Unknown')
-                })
-            
-            df_sales = pd.DataFrame(sales_data)
-            df_sales.to_excel(writer, sheet_name='Sales Invoices', index=False)
-            
-            # Summary sheet
-            summary_data = []
-            total_revenue = 0
-            for i, inv in enumerate(invoices_data):
-                total_amount = inv.get('total_amount', 0)
-                if isinstance(total_amount, str):
-                    try:
-                        total_amount = float(total_amount.replace(',', ''))
-                    except:
-                        total_amount = 0
-                
-                total_revenue += total_amount
-                
-                summary_data.append({
-                    'Invoice': inv.get('invoice_number', f'INV-{i+1}'),
-                    'Customer': inv.get('customer_name', 'Unknown'),
-                    'Date': inv.get('invoice_date', 'Not specified'),
-                    'Amount': total_amount,
-                    'Currency': inv.get('currency', 'AED'),
-                    'Status': '✅ Extracted'
-                })
-            
-            df_summary = pd.DataFrame(summary_data)
-            df_summary.to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Company info sheet  
-            company_info = pd.DataFrame([
-                {'Field': 'Company Name', 'Value': 'AL ATAAYA WATER WELLS DRILLING CONTRACTING LLC'},
-                {'Field': 'Processing Date', 'Value': datetime.now().strftime("%Y-%m-%d %H:%M:%S")},
-                {'Field': 'Total Sales Invoices', 'Value': len(invoices_data)},
-                {'Field': 'Total Revenue', 'Value': f"{total_revenue:.2f} AED"},
-                {'Field': 'System Type', 'Value': 'Sales Invoice Processor'},
-            ])
-            company_info.to_excel(writer, sheet_name='Company Info', index=False)
-        
-        return filename, total_revenue
+        writer.write_table('Company Info', ['Field', 'Value'], [
+            ('Company Name', 'AL ATAAYA WATER WELLS DRILLING CONTRACTING LLC'),
+            ('Processing Date', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            ('Total Sales Invoices', invoice_count),
+            ('Total Revenue', total_revenue),
+            ('System Type', 'Sales Invoice Processor'),
+        ])
+        return writer.close(), total_revenue
         
     except Exception as e:
         st.error(f"❌ Error creating Excel file: {str(e)}")
-        return None, 0
+        return None, total_revenue
+
+@st.cache_resource(show_spinner="🔌 Connecting to LlamaParse and Gemini...")
+def warm_up():
+    """Create the shared API clients once per process and health-check them"""
+    status = warm_up_clients(LLAMA_API_KEY, ['gemini-1.5-flash'])
+    errors = {name: error for name, error in status.items() if error}
+    if errors:
+        # Raising keeps a failed check out of the resource cache so the next rerun retries
+        raise RuntimeError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+    return status
 
 # ==================== MAIN APP ====================
 
 def main():
+    try:
+        warm_up()
+    except RuntimeError as e:
+        st.warning(f"⚠️ API health check failed: {str(e)}")
+    
     st.markdown('<h1 class="main-header">🏢 Sales Invoice → Excel Converter</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">Extract customer data from your sales invoices and convert to Excel</p>', unsafe_allow_html=True)
     
@@ -311,7 +326,10 @@ def main():
                 st.error("❌ Could not initialize PDF parser. Please check your API keys.")
                 return
             
-            invoices_data = []
+            invoices_data = InvoiceBatch()
+            # Revenue per currency, added as each row is extracted
+            revenue = CurrencyTotals()
+            excel_filename, excel_writer = None, None
             
             # Progress tracking
             progress_bar = st.progress(0)
@@ -332,18 +350,33 @@ def main():
                     # Extract data
                     invoice_data = extract_sales_invoice_data(pdf_text)
                     if invoice_data:
-                        # Add filename to data
+                        # Add filename to data; amounts, date and currency are typed once here
                         invoice_data['filename'] = uploaded_file.name
-                        invoices_data.append(invoice_data)
+                        invoice_data = normalize_record(invoice_data, SALES_FIELD_TYPES)
+                        invoices_data.append(InvoiceRecord.from_row(invoice_data, 'sales_line'))
+                        revenue.add(invoice_data.get('currency'), tax_amount=invoice_data.get('tax_amount'),
+                                    net_total=invoice_data.get('total_amount'))
+                        
+                        # Stream the row to the Excel file as soon as it is extracted
+                        if excel_writer is None:
+                            excel_filename, excel_writer = open_sales_excel_file()
+                        append_sales_excel_row(excel_writer, invoice_data, len(invoices_data) - 1)
                     
                 except Exception as e:
                     st.error(f"❌ Error processing {uploaded_file.name}: {str(e)}")
             
             # Create Excel file
             if invoices_data:
-                excel_filename, total_revenue = create_sales_excel_file(invoices_data)
+                # One frame of the normalized rows (built column-wise) feeds the metrics and summary table
+                df_results = invoices_data.to_frame('sales_line')
+                try:
+                    archive_frame(df_results, 'sales_line', 'sales', datetime.now().strftime("%Y%m%d_%H%M%S"),
+                                  file_keys={f.name: file_key(f.name, pdf_buffer(f)) for f in uploaded_files})
+                except Exception as e:
+                    st.warning(f"⚠️ Could not archive results to Parquet: {str(e)}")
+                excel_bytes, total_revenue = close_sales_excel_file(excel_writer, len(df_results), revenue)
                 
-                if excel_filename:
+                if excel_bytes:
                     st.markdown("""
                     <div class="success-box">
                         <strong>✅ Sales Processing Complete!</strong><br>
@@ -352,8 +385,9 @@ def main():
                     """, unsafe_allow_html=True)
                     
                     # Display metrics
-                    total_invoices = len(invoices_data)
-                    total_customers = len(set([inv.get('customer_name', 'Unknown') for inv in invoices_data]))
+                    total_invoices = len(df_results)
+                    # Spelling variants of one customer count once
+                    total_customers = party_index.count(df_results['customer_name'])
                     
                     col1, col2, col3 = st.columns(3)
                     
@@ -361,7 +395,7 @@ def main():
                         st.metric("Total Invoices", total_invoices)
                     
                     with col2:
-                        st.metric("Total Revenue", f"{total_revenue:,.2f}")
+                        st.metric("Total Revenue", total_revenue)
                     
                     with col3:
                         st.metric("Unique Customers", total_customers)
@@ -369,35 +403,20 @@ def main():
                     # Show detailed results
                     st.subheader("📊 Sales Summary")
                     
-                    summary_data = []
-                    for i, inv in enumerate(invoices_data):
-                        total_amount = inv.get('total_amount', 0)
-                        if isinstance(total_amount, str):
-                            try:
-                                total_amount = float(total_amount.replace(',', ''))
-                            except:
-                                total_amount = 0
-                        
-                        summary_data.append({
-                            'Invoice': inv.get('invoice_number', f'SINV-{i+1}'),
-                            'Customer': inv.get('customer_name', 'Unknown'),
-                            'Date': inv.get('invoice_date', 'Not specified'),
-                            'Amount': total_amount,
-                            'Currency': inv.get('currency', 'AED'),
-                            'Status': '✅ Extracted'
-                        })
-                    
-                    df_summary = pd.DataFrame(summary_data)
+                    df_summary = df_results.reindex(
+                        columns=['invoice_number', 'customer_name', 'invoice_date', 'total_amount', 'currency']
+                    ).set_axis(['Invoice', 'Customer', 'Date', 'Amount', 'Currency'], axis=1).assign(
+                        Status='✅ Extracted'
+                    )
                     st.dataframe(df_summary, use_container_width=True)
                     
                     # Download button
-                    with open(excel_filename, 'rb') as f:
-                        st.download_button(
-                            label="📥 Download Sales Excel File",
-                            data=f,
-                            file_name=excel_filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                    st.download_button(
+                        label="📥 Download Sales Excel File",
+                        data=excel_bytes,
+                        file_name=excel_filename,
+                        mime=XLSX_MIME
+                    )
                 else:
                     st.error("❌ Failed to create Excel file")
             else:
@@ -0,0 +1,147 @@
+"""
+Constant-memory, append-only Excel workbook writer.
+
+Rows are written to disk as each invoice finishes using xlsxwriter's
+constant_memory mode, so peak memory no longer grows with batch size.
+A sheet that reaches Excel's row limit spills into "<name> (2)",
+"<name> (3)", ... automatically. Summary numbers are kept as running
+totals (SummaryTotals, with per-currency sums from CurrencyTotals) and
+written when the workbook is closed.
+"""
+
+import io
+from decimal import Decimal
+
+from currency_totals import CurrencyTotals
+from party_names import party_index
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# Excel's hard limit per worksheet, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def to_cell(value):
+    """Convert a row value to something xlsxwriter can write"""
+    if isinstance(value, (dict, list, tuple, set)):
+        return str(value)
+    if isinstance(value, Decimal):
+        # Normalized amounts; Excel stores numbers as doubles
+        return float(value)
+    return value
+
+
+class StreamingWorkbookWriter:
+    """Append rows to named sheets of an .xlsx file without holding them in memory.
+
+    target may be a filename or a binary file object; when omitted the
+    workbook is built in memory and close() returns its bytes.
+    Sheets appear in the workbook in the order they are added.
+    """
+
+    def __init__(self, target=None, max_rows=EXCEL_MAX_ROWS):
+        if xlsxwriter is None:
+            raise ImportError("xlsxwriter not installed. Install with: pip install xlsxwriter")
+        self._buffer = io.BytesIO() if target is None else None
+        self.workbook = xlsxwriter.Workbook(
+            self._buffer if target is None else target, {'constant_memory': True}
+        )
+        self.max_rows = max_rows
+        self.header_format = self.workbook.add_format({'bold': True})
+        self._tables = {}
+
+    def _new_sheet(self, title, headers):
+        worksheet = self.workbook.add_worksheet(title[:31])
+        for col, header in enumerate(headers):
+            worksheet.write(0, col, header, self.header_format)
+        return worksheet
+
+    def add_table(self, name, headers):
+        """Create a sheet with a header row; later rows are added with append()"""
+        if name not in self._tables:
+            self._tables[name] = {
+                'headers': list(headers),
+                'sheet': self._new_sheet(name, headers),
+                'part': 1,
+                'next_row': 1,
+                'rows': 0,
+            }
+        return self._tables[name]
+
+    def has_table(self, name) -> bool:
+        return name in self._tables
+
+    def append(self, name, values):
+        """Append one row (a sequence matching the table headers)"""
+        table = self._tables[name]
+        if table['next_row'] >= self.max_rows:
+            # Sheet is full - continue on "<name> (2)", "<name> (3)", ...
+            table['part'] += 1
+            table['sheet'] = self._new_sheet(f"{name} ({table['part']})", table['headers'])
+            table['next_row'] = 1
+        sheet = table['sheet']
+        for col, value in enumerate(values):
+            sheet.write(table['next_row'], col, to_cell(value))
+        table['next_row'] += 1
+        table['rows'] += 1
+
+    def write_table(self, name, headers, rows):
+        """Add a small sheet in one go (e.g. Summary at close time)"""
+        self.add_table(name, headers)
+        for values in rows:
+            self.append(name, values)
+
+    def row_count(self, name) -> int:
+        return self._tables[name]['rows'] if name in self._tables else 0
+
+    def close(self):
+        """Finish the workbook; returns its bytes when it was built in memory"""
+        self.workbook.close()
+        return self._buffer.getvalue() if self._buffer is not None else None
+
+
+class SummaryTotals:
+    """Running batch totals for the Summary sheet, updated once per invoice (duplicates are not summed)"""
+
+    def __init__(self, party_label=None):
+        # party_label: Summary sheet label for the count of distinct canonical parties
+        self.party_label = party_label
+        self.party_ids = set()
+        self.total = 0
+        self.successful = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.currencies = CurrencyTotals()
+
+    def add(self, record):
+        """Count one InvoiceRecord"""
+        self.total += 1
+        if not record.success:
+            self.failed += 1
+            return
+        self.successful += 1
+        if self.party_label is not None:
+            self.party_ids.add(party_index.resolve(record.party_name, record.trn))
+            self.party_ids.discard(None)
+        if record.duplicate_of:
+            self.duplicates += 1
+            return
+        self.currencies.add(record.currency, record.subtotal, record.tax_amount, record.net_total)
+
+    def summary_rows(self) -> list:
+        """(Metric, Value) rows in the Summary sheet layout"""
+        rows = [
+            ('Total Invoices', self.total),
+            ('Successfully Processed', self.successful),
+            ('Failed', self.failed),
+            ('Success Rate', f"{(self.successful / self.total * 100):.1f}%" if self.total else "0%"),
+            ('Duplicates (not summed)', self.duplicates),
+            ('Currencies', ", ".join(self.currencies.currencies()) or "N/A"),
+            *self.currencies.summary_rows(),
+        ]
+        if self.party_label is not None:
+            rows.append((self.party_label, len(self.party_ids)))
+        return rows
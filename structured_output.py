@@ -0,0 +1,237 @@
+"""
+Schema-constrained JSON output from Gemini.
+
+Every extraction field has one typed definition in FIELD_TYPES; the
+purchase and sales field sets (and the batch array of either) are built
+from it as Gemini response schemas, so the model is asked for JSON of
+exactly that shape (response_mime_type="application/json") instead of
+free text that has to be cut out of prose and code fences.
+
+If a response still is not valid JSON (truncated output, a trailing
+comma, text around the object), repair_json() scans it once, keeps the
+first JSON value, drops stray closers and trailing commas and closes
+whatever was left open. Only when that fails is the request sent again.
+Outcome counters (and the retry rate) are kept per process. JSON_MODE=0
+sends plain requests and relies on the repair alone.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from rate_limiter import generate_content
+
+JSON_MODE = os.getenv("JSON_MODE", "1") == "1"
+JSON_RETRY_ATTEMPTS = int(os.getenv("JSON_RETRY_ATTEMPTS", "1"))
+
+# Gemini schema type of every extraction field (all fields are nullable)
+FIELD_TYPES = {
+    # Shared by purchase and sales invoices
+    "invoice_number": "STRING",
+    "subtotal": "NUMBER",
+    "tax_amount": "NUMBER",
+    "net_total": "NUMBER",
+    "currency": "STRING",
+    "items_count": "INTEGER",
+    # Purchase invoices (GEMINI_PROMPT)
+    "date": "STRING",
+    "party_name": "STRING",
+    "party_address": "STRING",
+    "trn": "STRING",
+    # Sales invoices (SALES_EXTRACTION_PROMPT)
+    "invoice_date": "STRING",
+    "customer_name": "STRING",
+    "customer_address": "STRING",
+    "customer_trn": "STRING",
+    "description": "STRING",
+    "payment_terms": "STRING",
+    # Line-level fields used by the single-file apps
+    "vendor_name": "STRING",
+    "vendor_address": "STRING",
+    "service_description": "STRING",
+    "quantity": "NUMBER",
+    "unit_price": "NUMBER",
+    "total_amount": "NUMBER",
+}
+
+PURCHASE_FIELDS = (
+    "date", "invoice_number", "party_name", "party_address", "trn",
+    "subtotal", "tax_amount", "net_total", "currency", "items_count",
+)
+SALES_FIELDS = (
+    "invoice_date", "invoice_number", "customer_name", "customer_address", "customer_trn",
+    "subtotal", "tax_amount", "net_total", "currency", "description", "payment_terms", "items_count",
+)
+
+
+def object_schema(fields) -> dict:
+    """Response schema for one JSON object with the given fields"""
+    return {
+        "type": "OBJECT",
+        "properties": {field: {"type": FIELD_TYPES[field], "nullable": True} for field in fields},
+        "required": list(fields),
+    }
+
+
+def batch_schema(fields) -> dict:
+    """Response schema for a batch: an array of objects tagged with their document"""
+    item = object_schema(fields)
+    item["properties"]["document_index"] = {"type": "INTEGER"}
+    item["properties"]["source_file"] = {"type": "STRING"}
+    item["required"] += ["document_index", "source_file"]
+    return {"type": "ARRAY", "items": item}
+
+
+def json_generation_config(schema) -> dict:
+    """generation_config asking Gemini for JSON matching schema (None without JSON_MODE)"""
+    if not JSON_MODE:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def output_format_key(schema) -> str:
+    """Hash of the JSON-mode flag and schema, so cached results are not shared across output formats"""
+    config = json.dumps({"json_mode": JSON_MODE, "schema": schema}, sort_keys=True)
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def _close_truncated(out, stack, commas):
+    """Close a JSON value cut off mid-way; fall back to the last complete member"""
+    text = "".join(out).rstrip()
+    if text.endswith(":"):
+        text += " null"
+    candidates = [text.rstrip(",") + "".join(reversed(stack))]
+    for position, open_stack in reversed(commas):
+        candidates.append("".join(out[:position]).rstrip().rstrip(",") + "".join(reversed(open_stack)))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+    return json.loads(candidates[0], strict=False)
+
+
+def repair_json(text, opening="{"):
+    """Parse the first JSON object ("{") or array ("[") in text, repairing common damage.
+
+    Raises json.JSONDecodeError when nothing usable is found.
+    """
+    start = text.find(opening)
+    if start < 0:
+        raise json.JSONDecodeError(f"No JSON value starting with {opening!r} found", text, 0)
+
+    out = []
+    stack = []
+    # (length of out, open containers) at every comma, to cut back to on truncation
+    commas = []
+    in_string = escaped = False
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if char not in stack:
+                # Stray closer
+                continue
+            while True:
+                while out and out[-1].isspace():
+                    out.pop()
+                if out and out[-1] == ",":
+                    out.pop()
+                closer = stack.pop()
+                out.append(closer)
+                if closer == char:
+                    break
+            if not stack:
+                return json.loads("".join(out), strict=False)
+            continue
+        elif char == ",":
+            commas.append((len(out), list(stack)))
+        out.append(char)
+
+    # Truncated response: finish the open string and containers
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    return _close_truncated(out, stack, commas)
+
+
+class JsonOutputStats:
+    """Thread-safe counters of structured-output outcomes for this process"""
+
+    def __init__(self):
+        self.responses = 0
+        self.repaired = 0
+        self.retried = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        """Count one response: "valid", "repaired", "retried" or "failed" """
+        with self._lock:
+            self.responses += 1
+            if outcome != "valid":
+                setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> dict:
+        """Outcome counters and the share of responses that had to be requested again"""
+        return {
+            "responses": self.responses,
+            "repaired": self.repaired,
+            "retried": self.retried,
+            "failed": self.failed,
+            "retry_rate": self.retried / self.responses if self.responses else 0.0,
+        }
+
+    def describe(self) -> str:
+        stats = self.stats()
+        return (f"{stats['responses']} JSON responses · {stats['repaired']} repaired · "
+                f"{stats['retried']} retried ({stats['retry_rate']:.1%}) · {stats['failed']} failed")
+
+
+# Shared counters used by all invoice apps
+json_output_stats = JsonOutputStats()
+
+
+def generate_json(model, prompt, schema):
+    """Schema-constrained generate_content, parsed to a dict (object schema) or list (array schema).
+
+    Raises json.JSONDecodeError when no attempt yields the expected JSON value.
+    """
+    opening = "[" if schema.get("type") == "ARRAY" else "{"
+    expected = list if opening == "[" else dict
+    config = json_generation_config(schema)
+
+    for attempt in range(JSON_RETRY_ATTEMPTS + 1):
+        response = generate_content(model, prompt, generation_config=config)
+        text = response.text or ""
+        try:
+            data = json.loads(text)
+            outcome = "valid"
+        except ValueError:
+            try:
+                data = repair_json(text, opening)
+                outcome = "repaired"
+            except ValueError as e:
+                data, error = None, e
+        if isinstance(data, expected):
+            json_output_stats.record(outcome)
+            return data
+        if data is not None:
+            error = json.JSONDecodeError(f"Expected a JSON {expected.__name__}", text, 0)
+        if attempt < JSON_RETRY_ATTEMPTS:
+            json_output_stats.record("retried")
+    json_output_stats.record("failed")
+    raise error
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+
+import batch_cli
+from duplicate_detection import DuplicateIndex
+from invoice_extraction import purchase_success_record
+from invoice_store import InvoiceStore
+
+RAW = {
+    "a.pdf": {"date": "21/08/2025", "invoice_number": "INV-1", "party_name": "Acme Trading LLC",
+              "trn": "100333333333333", "subtotal": "1,000.00", "tax_amount": "AED 50", "net_total": "1,050.00",
+              "currency": "dhs"},
+    "b.pdf": {"date": "2025-09-09", "invoice_number": "INV-2", "party_name": "Gulf Builders",
+              "subtotal": 200, "tax_amount": 10, "net_total": "210", "currency": "AED"},
+}
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """batch_cli.main over two fake PDFs with stubbed clients and extraction, inside tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in").mkdir()
+    for name in RAW:
+        (tmp_path / "in" / name).write_bytes(b"%PDF-1.4 " + name.encode())
+    reads = []
+    store = InvoiceStore(str(tmp_path / "invoices.sqlite3"))
+    monkeypatch.setattr(batch_cli, "invoice_store", store)
+    monkeypatch.setattr(batch_cli, "DuplicateIndex", lambda kind: DuplicateIndex(kind, store))
+    monkeypatch.setattr(batch_cli, "build_clients", lambda mode: (None, None))
+    monkeypatch.setattr(batch_cli, "parse_purchase_pdf", lambda pdf_bytes, name, factory: reads.append(name) or name)
+    monkeypatch.setattr(batch_cli, "extract_purchase_invoice",
+                        lambda parsed, name, model: purchase_success_record(RAW[name], name, "local"))
+
+    def main(output):
+        assert batch_cli.main(["in", "--workers", "2", "--output", output]) == 0
+        return reads
+
+    return main
+
+
+def test_output_rows_are_normalized_like_the_apps(run, tmp_path):
+    reads = run("out.jsonl")
+    rows = {row["source_file"]: row for row in map(json.loads, (tmp_path / "out.jsonl").read_text().splitlines())}
+    assert rows["a.pdf"]["date"] == "2025-08-21"
+    assert (rows["a.pdf"]["subtotal"], rows["a.pdf"]["tax_amount"], rows["a.pdf"]["net_total"]) == (1000, 50, 1050)
+    assert rows["a.pdf"]["currency"] == "AED"
+    assert rows["b.pdf"]["net_total"] == 210 and isinstance(rows["b.pdf"]["net_total"], float)
+    # Keys are hashed from disk up front; each PDF is read whole once, by the parse stage
+    assert sorted(reads) == ["a.pdf", "b.pdf"]
+
+
+def test_a_second_run_resumes_from_the_journal(run, tmp_path):
+    run("first.jsonl")
+    # Nothing is parsed again
+    assert len(run("second.jsonl")) == 2
+    second = [json.loads(line) for line in (tmp_path / "second.jsonl").read_text().splitlines()]
+    assert sorted(row["source_file"] for row in second) == ["a.pdf", "b.pdf"]
+    assert all(row["date"].startswith("2025-") for row in second)
+
+
+def test_csv_and_xlsx_outputs_use_the_purchase_layout(run, tmp_path):
+    import csv
+
+    run("out.csv")
+    with open(tmp_path / "out.csv", newline="", encoding="utf-8") as f:
+        rows = sorted(csv.DictReader(f), key=lambda row: row["source_file"])
+    assert [row["invoice_number"] for row in rows] == ["INV-1", "INV-2"]
+    assert rows[0]["processing_status"] == "success" and rows[0]["date"] == "2025-08-21"
+
+    openpyxl = pytest.importorskip("openpyxl")
+    run("out.xlsx")
+    workbook = openpyxl.load_workbook(tmp_path / "out.xlsx")
+    invoices = list(workbook["Invoices"].values)
+    assert invoices[0][:3] == ("processing_status", "source_file", "date")
+    summary = dict(workbook["Summary"].values)
+    assert summary["Total Invoices"] == 2 and summary["Unique Vendors"] == 2
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from batch_executor import PIPELINE_POLL_SECONDS, run_pipeline
+
+
+def pipeline_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
+
+
+def wait_for_pipeline_threads(timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while pipeline_threads() and time.monotonic() < deadline:
+        time.sleep(PIPELINE_POLL_SECONDS)
+    return pipeline_threads()
+
+
+def test_results_keep_input_order():
+    results = run_pipeline(range(10), parse=lambda n: n * 2, extract=lambda n, parsed: parsed + 1,
+                           failed=lambda n, e: None, parse_workers=3, extract_workers=2, queue_size=2)
+    assert results == [n * 2 + 1 for n in range(10)]
+
+
+def test_failures_become_failed_rows():
+    def parse(n):
+        if n == 1:
+            raise ValueError("bad pdf")
+        return n
+
+    def extract(n, parsed):
+        if n == 2:
+            raise RuntimeError("bad json")
+        return parsed
+
+    results = run_pipeline([0, 1, 2, 3], parse, extract, failed=lambda n, e: f"failed: {e}")
+    assert results == [0, "failed: bad pdf", "failed: bad json", 3]
+
+
+def test_workers_exit_when_they_outnumber_queue_slots():
+    results = run_pipeline(range(20), parse=lambda n: n, extract=lambda n, parsed: parsed,
+                           failed=lambda n, e: None, parse_workers=4, extract_workers=6, queue_size=2)
+    assert results == list(range(20))
+    assert wait_for_pipeline_threads() == []
+
+
+def test_workers_exit_when_on_complete_raises():
+    def on_complete(done, idx, item, result):
+        raise KeyboardInterrupt
+
+    try:
+        run_pipeline(range(20), parse=lambda n: n, extract=lambda n, parsed: parsed, failed=lambda n, e: None,
+                     parse_workers=2, extract_workers=6, queue_size=1, on_complete=on_complete)
+    except KeyboardInterrupt:
+        pass
+    assert wait_for_pipeline_threads() == []
+
+
+def test_stop_reaches_parse_workers_blocked_on_a_full_queue():
+    extracted = []
+    lock = threading.Lock()
+
+    def parse(n):
+        time.sleep(0.01)
+        return n
+
+    def extract(n, parsed):
+        with lock:
+            extracted.append(n)
+        time.sleep(0.05)
+        return parsed
+
+    def on_complete(done, idx, item, result):
+        raise KeyboardInterrupt
+
+    try:
+        run_pipeline(range(50), parse, extract, failed=lambda n, e: None,
+                     parse_workers=4, extract_workers=1, queue_size=1, on_complete=on_complete)
+    except KeyboardInterrupt:
+        pass
+    assert wait_for_pipeline_threads() == []
+    # Documents still queued at the stop are not extracted
+    assert len(extracted) <= 3
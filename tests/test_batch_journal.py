@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+from batch_journal import BatchJournal, batch_id, file_key, path_file_key
+from invoice_records import InvoiceRecord
+
+KEYS = [file_key("a.pdf", b"%PDF a"), file_key("b.pdf", b"%PDF b"), file_key("c.pdf", b"%PDF c")]
+
+
+def success(name, **fields):
+    return InvoiceRecord(status="success", source_file=name, invoice_number=name.upper(), **fields)
+
+
+def test_a_crashed_run_resumes_finished_files_and_retries_failed_ones(tmp_path):
+    journal = BatchJournal("purchase", KEYS, journal_dir=str(tmp_path))
+    journal.record(KEYS[0], success("a.pdf", net_total=1050.0))
+    journal.record(KEYS[1], InvoiceRecord.failed("b.pdf", "Gemini extraction error: timeout"))
+    # Crash: the journal is never closed
+
+    resumed = BatchJournal("purchase", list(reversed(KEYS)), journal_dir=str(tmp_path))
+    assert resumed.path == journal.path
+    record = resumed.get(KEYS[0])
+    assert (record.source_file, record.invoice_number, record.net_total) == ("a.pdf", "A.PDF", 1050.0)
+    assert resumed.get(KEYS[1]) is None and resumed.get(KEYS[2]) is None
+    journal.close()
+    resumed.close()
+
+
+def test_a_later_failure_replaces_an_earlier_success(tmp_path):
+    journal = BatchJournal("sales", KEYS, journal_dir=str(tmp_path))
+    journal.record(KEYS[0], success("a.pdf"))
+    journal.record(KEYS[0], InvoiceRecord.failed("a.pdf", "bad pdf"))
+    journal.close()
+    assert BatchJournal("sales", KEYS, journal_dir=str(tmp_path)).get(KEYS[0]) is None
+
+
+def test_corrupt_and_torn_lines_are_skipped(tmp_path):
+    journal = BatchJournal("purchase", KEYS, journal_dir=str(tmp_path))
+    journal.record(KEYS[0], success("a.pdf"))
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+        f.write("[1, 2]\n")
+        f.write(json.dumps({"status": "success", "record": {"source_file": "x.pdf"}}) + "\n")
+        f.write(json.dumps({"file_key": KEYS[2], "status": "success", "row": {"source_file": "c.pdf"}}) + "\n")
+        f.write('{"file_key": "' + KEYS[1] + '", "status": "succ')  # crash mid-write
+
+    resumed = BatchJournal("purchase", KEYS, journal_dir=str(tmp_path))
+    assert resumed.get(KEYS[0]).source_file == "a.pdf"
+    assert resumed.get(KEYS[1]) is None and resumed.get(KEYS[2]) is None
+    # The torn line is terminated, so the next entry is readable
+    resumed.record(KEYS[1], success("b.pdf"))
+    resumed.close()
+    assert BatchJournal("purchase", KEYS, journal_dir=str(tmp_path)).get(KEYS[1]).source_file == "b.pdf"
+
+
+def test_restart_and_other_batches_do_not_resume(tmp_path):
+    journal = BatchJournal("purchase", KEYS, journal_dir=str(tmp_path))
+    journal.record(KEYS[0], success("a.pdf"))
+    journal.close()
+    assert BatchJournal("sales", KEYS, journal_dir=str(tmp_path)).get(KEYS[0]) is None
+    assert BatchJournal("purchase", KEYS[:2], journal_dir=str(tmp_path)).get(KEYS[0]) is None
+    assert BatchJournal("purchase", KEYS, resume=False, journal_dir=str(tmp_path)).get(KEYS[0]) is None
+    assert batch_id("purchase", KEYS) == batch_id("purchase", KEYS[::-1])
+
+
+def test_stale_journals_are_pruned(tmp_path):
+    stale = tmp_path / "purchase_old.jsonl"
+    stale.write_text("")
+    old = time.time() - 30 * 86400
+    os.utime(stale, (old, old))
+    BatchJournal("purchase", KEYS, journal_dir=str(tmp_path)).close()
+    assert not stale.exists()
+
+
+def test_path_file_key_matches_file_key(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF " + b"x" * 5000)
+    assert path_file_key("a.pdf", str(path), chunk_size=1024) == file_key("a.pdf", path.read_bytes())
@@ -0,0 +1,87 @@
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import client_registry
+from client_registry import get_gemini_model, get_llama_parser, llama_parser_for_pages, warm_up_clients
+
+
+class FakeLlamaParse:
+    created = 0
+
+    def __init__(self, api_key, result_type, language, target_pages=""):
+        FakeLlamaParse.created += 1
+        time.sleep(0.01)
+        self.api_key, self.result_type, self.language, self.target_pages = api_key, result_type, language, target_pages
+
+    def model_copy(self, update):
+        settings = {**vars(self), **update}
+        return FakeLlamaParse(**settings)
+
+
+@pytest.fixture
+def genai(monkeypatch):
+    """Fresh registry with stand-in llama_parse and google.generativeai modules"""
+    monkeypatch.setattr(client_registry, "_clients", {})
+    FakeLlamaParse.created = 0
+    unreachable = set()
+
+    def get_model(name):
+        if name in unreachable:
+            raise RuntimeError("404 model not found")
+
+    module = SimpleNamespace(GenerativeModel=lambda name: SimpleNamespace(model_name=name), get_model=get_model,
+                             unreachable=unreachable)
+    monkeypatch.setitem(sys.modules, "llama_parse", SimpleNamespace(LlamaParse=FakeLlamaParse))
+    monkeypatch.setitem(sys.modules, "google", SimpleNamespace(generativeai=module))
+    monkeypatch.setitem(sys.modules, "google.generativeai", module)
+    return module
+
+
+def test_one_client_per_key_and_settings(genai):
+    parser = get_llama_parser("key-1")
+    assert get_llama_parser("key-1") is parser
+    assert get_llama_parser("key-2") is not parser
+    assert get_llama_parser("key-1", result_type="text") is not parser
+    assert FakeLlamaParse.created == 3
+    model = get_gemini_model("gemini-1.5-flash")
+    assert get_gemini_model("gemini-1.5-flash") is model
+    assert get_gemini_model("gemini-2.0-flash-exp") is not model
+
+
+def test_concurrent_first_use_creates_one_client(genai):
+    start = threading.Barrier(8)
+    parsers = []
+
+    def worker():
+        start.wait()
+        parsers.append(get_llama_parser("key-1"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert FakeLlamaParse.created == 1
+    assert all(parser is parsers[0] for parser in parsers)
+
+
+def test_page_restricted_copies_leave_the_shared_client_alone(genai):
+    parser = get_llama_parser("key-1")
+    subset = llama_parser_for_pages(parser, [0, 2])
+    assert subset.target_pages == "0,2" and parser.target_pages == ""
+    assert get_llama_parser("key-1") is parser
+    assert llama_parser_for_pages(SimpleNamespace(), [0]) is None
+
+
+def test_warm_up_reports_each_client(genai):
+    genai.unreachable.add("models/gemini-2.0-flash-exp")
+    status = warm_up_clients("key-1", ["gemini-1.5-flash", "gemini-2.0-flash-exp"])
+    assert status == {"llamaparse": None, "gemini-1.5-flash": None, "gemini-2.0-flash-exp": "404 model not found"}
+    # The warmed-up clients are the ones the workers get
+    assert FakeLlamaParse.created == 1
+    get_llama_parser("key-1")
+    assert FakeLlamaParse.created == 1
@@ -0,0 +1,65 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from currency_totals import UNKNOWN_CURRENCY, CurrencyTotals, format_amounts, load_fx_rates, to_cents
+
+
+def test_currencies_are_never_mixed():
+    totals = CurrencyTotals(base_currency="")
+    totals.add("AED", subtotal=1000, tax_amount=50, net_total=1050)
+    totals.add("dhs", net_total="2,100.10")
+    totals.add("$", subtotal=40, tax_amount=10, net_total=50)
+    totals.add("EUR", net_total=0.1)
+    totals.add("EUR", net_total=0.2)
+    assert totals.sums() == {"AED": 3150.1, "EUR": 0.3, "USD": 50.0}
+    assert totals.sums("tax_amount") == {"AED": 50.0, "EUR": 0.0, "USD": 10.0}
+    assert totals.counts() == {"AED": 2, "EUR": 2, "USD": 1}
+    assert totals.describe() == "AED 3,150.10 · EUR 0.30 · USD 50.00"
+    assert totals.in_base() is None and totals.describe_base() is None
+
+
+def test_unknown_currencies_and_missing_amounts():
+    totals = CurrencyTotals(base_currency="")
+    totals.add("points", net_total=10)
+    totals.add(None, net_total="Not specified")
+    totals.add("AED")
+    assert totals.counts() == {UNKNOWN_CURRENCY: 2, "AED": 1}
+    assert totals.sums() == {UNKNOWN_CURRENCY: 10.0, "AED": 0.0}
+    # The mean only counts invoices that have a net total
+    assert totals.means() == {UNKNOWN_CURRENCY: 10.0}
+    assert dict(totals.summary_rows())["Average Amount (AED)"] == "N/A"
+
+
+def test_base_currency_total_lists_unconverted_currencies():
+    totals = CurrencyTotals(base_currency="aed", rates={"USD": 3.6725})
+    totals.add("AED", net_total=1000)
+    totals.add("USD", net_total=100)
+    totals.add("EUR", net_total=10)
+    assert totals.in_base() == (1367.25, ["EUR"])
+    assert totals.describe_base() == "≈ AED 1,367.25 (not converted: EUR)"
+    summary = dict(totals.summary_rows())
+    assert summary["Total Amount in AED"] == "1367.25" and summary["Not Converted (no FX rate)"] == "EUR"
+    # Per-currency rows stay in their own currency
+    assert summary["Total Amount (USD)"] == "100.00"
+
+
+def test_fx_table(tmp_path):
+    path = tmp_path / "fx_rates.json"
+    assert load_fx_rates(str(path)) == {}
+    path.write_text(json.dumps({"usd": 3.6725, "€": "4.0"}))
+    assert load_fx_rates(str(path)) == {"USD": 3.6725, "EUR": 4.0}
+    path.write_text(json.dumps({"GOLD": 1}))
+    with pytest.raises(ValueError):
+        load_fx_rates(str(path))
+
+
+def test_cents_and_formatting():
+    assert [to_cents(v) for v in (10.5, "1,234.56", 0.1 + 0.2, None, float("nan"), "N/A", True)] == [
+        1050, 123456, 30, None, None, None, None]
+    assert [to_cents(Decimal(v)) for v in ("1050.10", "10.005", "-0.01", "NaN")] == [105010, 1001, -1, None]
+    assert format_amounts({}) == "0.00"
+    assert format_amounts({"AED": 1234.5}) == "AED 1,234.50"
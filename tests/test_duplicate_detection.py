@@ -0,0 +1,81 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import duplicate_detection
+from duplicate_detection import DuplicateIndex, content_hash, duplicate_record
+from invoice_records import InvoiceRecord
+from invoice_store import InvoiceStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return InvoiceStore(str(tmp_path / "invoices.sqlite3"))
+
+
+def purchase_record(source_file, invoice_number="INV-1", net_total=1050.0, date="2025-08-21", trn="100200300400003"):
+    return InvoiceRecord(status="success", source_file=source_file, invoice_date=date, trn=trn,
+                         invoice_number=invoice_number, net_total=net_total, currency="AED")
+
+
+def test_identical_files_are_flagged_and_reruns_are_not(store):
+    index = DuplicateIndex("purchase", store)
+    assert index.check_file("a.pdf", content_hash("a.pdf:abc")) is None
+    assert index.check_file("copy of a.pdf", content_hash("copy of a.pdf:abc")) == "a.pdf"
+    assert index.check_file("a.pdf", "abc") is None
+    assert index.file_duplicates == 1
+
+
+def test_reissued_invoice_is_flagged_by_fingerprint(store):
+    index = DuplicateIndex("purchase", store)
+    assert index.check_invoice(purchase_record("a.pdf")) is None
+    # Same TRN, number (formatted differently), total and date under another file name
+    assert index.check_invoice(purchase_record("a-resent.pdf", invoice_number="inv 1")) == "a.pdf"
+    assert index.check_invoice(purchase_record("b.pdf", net_total=1060.0)) is None
+    assert index.invoice_duplicates == 1
+
+
+def test_rows_without_a_fingerprint_or_success_are_not_checked(store):
+    index = DuplicateIndex("purchase", store)
+    assert index.check_invoice(purchase_record("a.pdf", invoice_number=None)) is None
+    assert index.check_invoice(purchase_record("b.pdf", invoice_number=None)) is None
+    failed = purchase_record("a.pdf").replace(status="failed")
+    assert index.check_invoice(failed) is None
+    assert index.check_invoice(failed) is None
+
+
+def test_detection_can_be_turned_off(store, monkeypatch):
+    monkeypatch.setattr(duplicate_detection, "DUPLICATE_DETECTION", False)
+    index = DuplicateIndex("purchase", store)
+    assert index.check_file("a.pdf", "abc") is None
+    assert index.check_file("b.pdf", "abc") is None
+
+
+def test_invoices_stored_by_earlier_runs_are_found(store):
+    first_run = DuplicateIndex("purchase", store)
+    rows = [purchase_record(name).to_row("purchase") for name in ("a.pdf", "a-copy.pdf")]
+    frame = first_run.flag_frame(pd.DataFrame(rows), "purchase")
+    assert frame["duplicate_of"].fillna("").tolist() == ["", "a.pdf"]
+    assert store.upsert_frame(frame, "purchase", "purchase", file_hashes={"a.pdf": "abc"}) == (1, 0)
+
+    next_run = DuplicateIndex("purchase", store)
+    assert next_run.check_file("renamed.pdf", "abc") == "a.pdf"
+    assert next_run.check_invoice(purchase_record("resent.pdf")) == "a.pdf"
+    assert next_run.check_invoice(purchase_record("a.pdf")) is None
+    record = next_run.stored_record("abc", "renamed.pdf")
+    assert (record.duplicate_of, record.invoice_number, record.source_file) == ("a.pdf", "INV-1", "renamed.pdf")
+
+
+def test_duplicate_record_copies_the_original():
+    original = purchase_record("a.pdf")
+    original.tokens_saved = 120
+    copy = duplicate_record(original, "copy of a.pdf", "a.pdf")
+    assert (copy.source_file, copy.duplicate_of, copy.tokens_saved) == ("copy of a.pdf", "a.pdf", None)
+    assert copy.invoice_number == "INV-1" and original.duplicate_of is None
+
+
+def test_unusable_store_falls_back_to_the_run(tmp_path):
+    index = DuplicateIndex("purchase", InvoiceStore(str(tmp_path)))  # a directory, not a database
+    assert index.check_file("a.pdf", "abc") is None
+    assert index.check_file("b.pdf", "abc") == "a.pdf"
+    assert index.store is None
@@ -0,0 +1,54 @@
+from extraction_cache import ExtractionCache
+from structured_output import object_schema, output_format_key
+
+
+def test_entries_are_kept_apart_per_output_format(tmp_path):
+    cache = ExtractionCache(path=str(tmp_path / "extractions.sqlite3"))
+    narrow = output_format_key(object_schema(("invoice_number",)))
+    wide = output_format_key(object_schema(("invoice_number", "net_total")))
+    cache.put("gemini", "prompt", "document", {"invoice_number": "1"}, narrow)
+
+    assert cache.get("gemini", "prompt", "document", narrow) == {"invoice_number": "1"}
+    assert cache.get("gemini", "prompt", "document", wide) is None
+    assert cache.get("gemini", "other prompt", "document", narrow) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_output_format_includes_json_mode(monkeypatch):
+    import structured_output
+
+    schema = object_schema(("invoice_number",))
+    json_mode = output_format_key(schema)
+    monkeypatch.setattr(structured_output, "JSON_MODE", False)
+    assert output_format_key(schema) != json_mode
+    assert structured_output.json_generation_config(schema) is None
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ExtractionCache(path=str(tmp_path / "extractions.sqlite3"), ttl_hours=-1)
+    cache.put("gemini", "prompt", "document", {"invoice_number": "1"})
+    assert cache.get("gemini", "prompt", "document") is None
+
+
+def test_batch_fallback_call_skips_the_cache_lookups(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    import invoice_extraction
+
+    cache = ExtractionCache(path=str(tmp_path / "extractions.sqlite3"))
+    calls = []
+    monkeypatch.setattr(invoice_extraction, "extraction_cache", cache)
+    monkeypatch.setattr(invoice_extraction, "rule_based_fields", lambda text: None)
+    monkeypatch.setattr(invoice_extraction, "generate_json",
+                        lambda model, prompt, schema: calls.append(prompt) or {"invoice_number": "1"})
+    model = SimpleNamespace(model_name="gemini")
+
+    # Used after the batched path already looked the document up once
+    assert invoice_extraction.gemini_purchase_fields("document", model) == {"invoice_number": "1"}
+    assert cache.stats()["misses"] == 0
+
+    # Nothing was cached by the fallback call: the per-file path misses, calls Gemini and caches once
+    invoice_extraction.extract_purchase_fields("document", model)
+    invoice_extraction.extract_purchase_fields("document", model)
+    assert len(calls) == 2
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
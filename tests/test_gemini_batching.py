@@ -0,0 +1,55 @@
+import json
+
+from gemini_batching import document_fields, extract_in_batches, map_batch_results
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    model_name = "fake-batching-model"
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.text)
+
+
+DOCUMENTS = [("a.pdf", "invoice a"), ("b.pdf", "invoice b"), ("c.pdf", "invoice c")]
+
+
+def test_elements_map_back_by_index_or_file_name():
+    elements = [
+        {"document_index": 2, "source_file": "b.pdf", "invoice_number": "2"},
+        {"document_index": 9, "source_file": "a.pdf", "invoice_number": "1"},
+        "not an object",
+    ]
+    assert map_batch_results(DOCUMENTS, elements) == [
+        {"source_file": "a.pdf", "invoice_number": "1"}, {"source_file": "b.pdf", "invoice_number": "2"}, None,
+    ]
+
+
+def test_document_fields_match_a_per_file_extraction():
+    element = {"document_index": 1, "source_file": "a.pdf", "invoice_number": "1", "net_total": 10}
+    assert document_fields(element) == {"invoice_number": "1", "net_total": 10}
+
+
+def test_documents_missing_from_the_batch_fall_back():
+    model = FakeModel(json.dumps([
+        {"document_index": 1, "source_file": "a.pdf", "invoice_number": "1"},
+        {"document_index": 3, "source_file": "c.pdf", "invoice_number": "3"},
+    ]))
+    fallbacks = []
+
+    def fallback(source_file, markdown_text):
+        fallbacks.append(source_file)
+        return {"invoice_number": "fallback"}
+
+    results = extract_in_batches(model, "prompt", DOCUMENTS, fallback)
+    assert [result["invoice_number"] for result in results] == ["1", "fallback", "3"]
+    assert fallbacks == ["b.pdf"] and model.calls == 1
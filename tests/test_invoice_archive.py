@@ -0,0 +1,62 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from invoice_archive import archive_frame, archive_totals, load_archive
+from invoice_records import InvoiceBatch, InvoiceRecord
+from normalization import PURCHASE_TYPES, normalize_frame
+
+
+def purchase_frame(*rows):
+    defaults = {"status": "success", "currency": "AED"}
+    batch = InvoiceBatch.from_records(InvoiceRecord(**{**defaults, **row}) for row in rows)
+    return normalize_frame(batch.to_frame("purchase"), PURCHASE_TYPES)
+
+
+A = {"source_file": "a.pdf", "invoice_date": "2025-08-21", "invoice_number": "1", "net_total": 100}
+B = {"source_file": "b.pdf", "invoice_date": "2025-09-09", "invoice_number": "2", "net_total": 200}
+C = {"source_file": "c.pdf", "invoice_date": "2025-09-10", "invoice_number": "3", "net_total": 300}
+KEYS = {"a.pdf": "a.pdf:aaa", "b.pdf": "b.pdf:bbb", "c.pdf": "c.pdf:ccc"}
+
+
+def archived_numbers(archive_dir):
+    return sorted(load_archive(kind="purchase", archive_dir=archive_dir).column("invoice_number").to_pylist())
+
+
+def test_adding_files_does_not_archive_earlier_rows_again(tmp_path):
+    assert archive_frame(purchase_frame(A, B), "purchase", "purchase", "run-1", KEYS, tmp_path) == 2
+    assert archive_frame(purchase_frame(A, B, C), "purchase", "purchase", "run-2", KEYS, tmp_path) == 3
+    assert archived_numbers(tmp_path) == ["1", "2", "3"]
+    totals = archive_totals(kind="purchase", group_by=("kind",), archive_dir=tmp_path).to_pylist()
+    assert totals[0]["count_all"] == 3 and totals[0]["net_total_sum"] == 600
+
+
+def test_rearchived_file_moves_to_its_new_partition(tmp_path):
+    archive_frame(purchase_frame(A), "purchase", "purchase", "run-1", KEYS, tmp_path)
+    archive_frame(purchase_frame({**A, "invoice_date": "2025-10-01"}), "purchase", "purchase", "run-2", KEYS, tmp_path)
+    table = load_archive(kind="purchase", archive_dir=tmp_path)
+    assert table.column("month").to_pylist() == [10]
+    assert not list(tmp_path.glob("kind=purchase/year=2025/month=8/*.parquet"))
+
+
+def test_failed_and_duplicate_rows_are_not_archived(tmp_path):
+    frame = purchase_frame(A, {**B, "duplicate_of": "a.pdf"}, {"source_file": "c.pdf", "status": "failed"})
+    assert archive_frame(frame, "purchase", "purchase", "run-1", KEYS, tmp_path) == 1
+    assert archived_numbers(tmp_path) == ["1"]
+
+
+def test_a_run_writes_one_file_per_partition(tmp_path):
+    rows = [{**B, "source_file": f"{n}.pdf", "invoice_number": str(n)} for n in range(50)]
+    assert archive_frame(purchase_frame(A, *rows), "purchase", "purchase", "run-1", None, tmp_path) == 51
+    files = sorted(path.relative_to(tmp_path).parent.as_posix() for path in tmp_path.rglob("*.parquet"))
+    assert files == ["kind=purchase/year=2025/month=8", "kind=purchase/year=2025/month=9"]
+    table = load_archive(kind="purchase", archive_dir=tmp_path)
+    assert sorted(set(table.column("file_key").to_pylist()))[:2] == ["0.pdf", "1.pdf"]
+
+
+def test_rearchiving_one_file_keeps_the_others_in_its_partition(tmp_path):
+    archive_frame(purchase_frame(B, C), "purchase", "purchase", "run-1", KEYS, tmp_path)
+    archive_frame(purchase_frame({**B, "net_total": 250}), "purchase", "purchase", "run-2", KEYS, tmp_path)
+    table = load_archive(kind="purchase", archive_dir=tmp_path).sort_by("invoice_number")
+    assert table.column("net_total").to_pylist() == [250.0, 300.0]
+    assert table.column("run_id").to_pylist() == ["run-2", "run-1"]
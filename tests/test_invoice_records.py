@@ -0,0 +1,61 @@
+import pytest
+
+from invoice_records import InvoiceBatch, InvoiceRecord, layout_columns
+
+
+def record(source_file, status="success", **fields):
+    return InvoiceRecord(status=status, source_file=source_file, **fields)
+
+
+def test_rows_are_built_in_each_layout():
+    gemini = {"date": "2025-08-21", "party_name": "Acme Trading LLC", "trn": "100333333333333",
+              "net_total": 1050, "notes": "not a purchase column"}
+    parsed = InvoiceRecord.from_row(gemini, "purchase")
+    assert (parsed.invoice_date, parsed.party_name, parsed.net_total) == ("2025-08-21", "Acme Trading LLC", 1050)
+    row = parsed.to_row("sales")
+    assert list(row) == layout_columns("sales")
+    assert (row["invoice_date"], row["customer_name"], row["customer_trn"]) == (
+        "2025-08-21", "Acme Trading LLC", "100333333333333")
+    assert parsed.values("sales") == list(row.values())
+
+
+def test_dict_round_trip_keeps_only_set_fields():
+    original = record("a.pdf", invoice_number="INV-1", subtotal=1000.0, tokens_saved=0)
+    values = original.to_dict()
+    assert values == {"status": "success", "source_file": "a.pdf", "invoice_number": "INV-1",
+                      "subtotal": 1000.0, "tokens_saved": 0}
+    restored = InvoiceRecord.from_dict({**values, "row_format": 1})
+    assert restored.to_dict() == values and restored.success
+
+
+def test_replace_copies_and_rejects_unknown_fields():
+    original = record("a.pdf", invoice_number="INV-1")
+    copy = original.replace(source_file="b.pdf")
+    assert (copy.source_file, copy.invoice_number, original.source_file) == ("b.pdf", "INV-1", "a.pdf")
+    with pytest.raises(TypeError):
+        original.replace(filename="b.pdf")
+    with pytest.raises(TypeError):
+        InvoiceRecord(filename="a.pdf")
+
+
+def test_failed_record():
+    failed = InvoiceRecord.failed("a.pdf", "LlamaParse error: timeout")
+    assert not failed.success
+    assert failed.to_row("purchase")["error_message"] == "LlamaParse error: timeout"
+    assert failed.to_row("sales")["error"] == "LlamaParse error: timeout"
+
+
+def test_batch_filled_out_of_order_keeps_columns_aligned():
+    batch = InvoiceBatch(3)
+    batch.set(2, record("c.pdf", net_total=300))
+    batch.set(0, record("a.pdf", net_total=100))
+    batch.set(1, InvoiceRecord.failed("b.pdf", "bad pdf"))
+    assert len(batch) == 3
+    assert [r.source_file for r in batch] == ["a.pdf", "b.pdf", "c.pdf"]
+    columns = batch.to_columns("purchase")
+    assert list(columns) == layout_columns("purchase")
+    assert columns["net_total"] == [100, None, 300]
+    assert columns["processing_status"] == ["success", "failed", "success"]
+    successful = batch.select("success")
+    assert successful.column("source_file") == ["a.pdf", "c.pdf"]
+    assert InvoiceBatch.from_records(batch).column("error") == [None, "bad pdf", None]
@@ -0,0 +1,66 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from invoice_records import InvoiceBatch, InvoiceRecord
+from invoice_store import InvoiceStore, natural_key
+from normalization import PURCHASE_TYPES, normalize_frame
+
+
+@pytest.fixture
+def store(tmp_path):
+    return InvoiceStore(str(tmp_path / "invoices.sqlite3"))
+
+
+def purchase_frame(*rows):
+    defaults = {"status": "success", "currency": "AED", "invoice_date": "2025-08-21"}
+    batch = InvoiceBatch.from_records(InvoiceRecord(**{**defaults, **row}) for row in rows)
+    return normalize_frame(batch.to_frame("purchase"), PURCHASE_TYPES)
+
+
+A = {"source_file": "a.pdf", "trn": "100200300400003", "party_name": "Acme Trading LLC",
+     "invoice_number": "INV-1", "net_total": 1050}
+B = {"source_file": "b.pdf", "party_name": "Gulf Builders", "invoice_number": "INV-1", "net_total": 210}
+
+
+def test_natural_keys():
+    assert natural_key("100-200-300-400-003", "Acme", "inv 1") == natural_key("100200300400003", "Other", "INV1")
+    assert natural_key(None, "Gulf Builders", "INV-1") == "NAME:GULFBUILDERS|INV1"
+    # Without a party (or a number) the file is the identity
+    assert natural_key(None, None, "INV-1", "c.pdf") == "FILE:c.pdf"
+    assert natural_key(None, "  ", "INV-1", "d.pdf") == "FILE:d.pdf"
+    assert natural_key("100200300400003", "Acme", None, "e.pdf") == "FILE:e.pdf"
+    assert natural_key(None, None, "INV-1") is None
+
+
+def test_reimport_updates_rows_instead_of_adding_them(store):
+    assert store.upsert_frame(purchase_frame(A, B), "purchase", "purchase", "run-1") == (2, 0)
+    first = store.get("purchase", "100200300400003|INV1")
+    assert store.upsert_frame(purchase_frame({**A, "net_total": 1100}, B), "purchase", "purchase", "run-2") == (0, 2)
+    again = store.get("purchase", "100200300400003|INV1")
+    assert (again["net_total"], again["run_id"], again["first_seen"]) == (1100.0, "run-2", first["first_seen"])
+    assert store.stats() == {"purchase": 2}
+
+
+def test_invoices_without_a_party_are_kept_per_file(store):
+    frame = purchase_frame({"source_file": "c.pdf", "invoice_number": "1", "net_total": 10},
+                           {"source_file": "d.pdf", "invoice_number": "1", "net_total": 20})
+    assert store.upsert_frame(frame, "purchase", "purchase") == (2, 0)
+    assert store.get("purchase", "FILE:d.pdf")["net_total"] == 20.0
+    # Re-importing the same file updates its row
+    assert store.upsert_frame(frame.iloc[:1], "purchase", "purchase") == (0, 1)
+
+
+def test_failed_and_duplicate_rows_are_not_stored(store):
+    frame = purchase_frame(A, {**B, "duplicate_of": "a.pdf"}, {"source_file": "c.pdf", "status": "failed"})
+    assert store.upsert_frame(frame, "purchase", "purchase", file_hashes={"a.pdf": "abc"}) == (1, 0)
+    assert store.find_file("purchase", "abc")["source_file"] == "a.pdf"
+
+
+def test_party_and_period_lookups(store):
+    store.upsert_frame(purchase_frame(A, B, {**B, "invoice_number": "INV-2", "invoice_date": "2025-09-02"}),
+                       "purchase", "purchase")
+    assert [row["invoice_number"] for row in store.find_by_party("gulf builders")] == ["INV-2", "INV-1"]
+    report = store.period_report("purchase", "2025-08-01", "2025-08-31")
+    assert report == [{"month": "2025-08", "currency": "AED", "invoices": 2,
+                       "subtotal": None, "tax_amount": None, "net_total": 1260.0}]
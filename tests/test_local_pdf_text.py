@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import pytest
+
+import invoice_extraction
+import local_pdf_text
+from local_pdf_text import BACKEND_LLAMAPARSE, BACKEND_LOCAL, extract_local_pages, is_text_layer_usable
+from parse_cache import ParseCache
+
+DENSE = "TAX INVOICE Acme Trading LLC Invoice No INV-1 Date 21/08/2025 " * 6
+THIN = "Scanned page 1"
+
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def find_tables(self):
+        return []
+
+    def extract_text(self):
+        return self.text
+
+
+class FakePdf:
+    def __init__(self, texts):
+        self.pages = [FakePage(text) for text in texts]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def pdf_pages(monkeypatch):
+    """Stand-in pdfplumber whose PDFs have the page texts set by the test"""
+    texts = []
+
+    def open_pdf(reader):
+        if texts == ["<encrypted>"]:
+            raise ValueError("encrypted")
+        return FakePdf(texts)
+
+    monkeypatch.setattr(local_pdf_text, "pdfplumber", SimpleNamespace(open=open_pdf))
+    monkeypatch.setattr(local_pdf_text, "LOCAL_TEXT_EXTRACTION", True)
+    return texts
+
+
+def test_text_layer_density():
+    assert is_text_layer_usable([DENSE, DENSE])
+    assert not is_text_layer_usable([DENSE, THIN, THIN])
+    assert not is_text_layer_usable([])
+    assert not is_text_layer_usable([DENSE + "(cid:12)" * 11])
+
+
+def test_local_pages_or_none(pdf_pages):
+    pdf_pages[:] = [DENSE, DENSE]
+    assert extract_local_pages(b"%PDF") == [DENSE, DENSE]
+    assert extract_local_pages(b"%PDF", pages=[1, 5]) == [DENSE]
+    pdf_pages[:] = [THIN]
+    assert extract_local_pages(b"%PDF") is None
+    pdf_pages[:] = ["<encrypted>"]
+    assert extract_local_pages(b"%PDF") is None
+
+
+def test_table_to_markdown():
+    table = [["Item", "Amount"], ["Steel  rods", "1,000.00"], ["VAT"]]
+    assert local_pdf_text.table_to_markdown(table) == (
+        "| Item | Amount |\n|---|---|\n| Steel rods | 1,000.00 |\n| VAT |  |"
+    )
+
+
+class FakeParser:
+    api_key = "test"
+
+    def __init__(self):
+        self.calls = 0
+
+    def load_data(self, file, extra_info=None):
+        self.calls += 1
+        return [SimpleNamespace(text="# LlamaParse page\nInvoice No INV-1")]
+
+
+@pytest.fixture
+def parser(tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_extraction, "parse_cache", ParseCache(str(tmp_path)))
+    return FakeParser()
+
+
+def test_thin_text_layer_falls_back_to_llamaparse(pdf_pages, parser):
+    pdf_pages[:] = [THIN]
+    parsed = invoice_extraction.parse_pdf_to_markdown(b"%PDF scanned", lambda: parser)
+    assert parsed.parse_backend == BACKEND_LLAMAPARSE and parser.calls == 1
+    assert "INV-1" in parsed.markdown_text
+
+
+def test_dense_text_layer_skips_llamaparse(pdf_pages, parser):
+    pdf_pages[:] = [DENSE]
+    parsed = invoice_extraction.parse_pdf_to_markdown(b"%PDF digital", lambda: parser)
+    assert parsed.parse_backend == BACKEND_LOCAL and parser.calls == 0
+    assert "INV-1" in parsed.markdown_text
+
+
+def test_disabled_local_extraction_uses_llamaparse(pdf_pages, parser, monkeypatch):
+    monkeypatch.setattr(local_pdf_text, "LOCAL_TEXT_EXTRACTION", False)
+    pdf_pages[:] = [DENSE]
+    assert invoice_extraction.parse_pdf_to_markdown(b"%PDF digital", lambda: parser).parse_backend == BACKEND_LLAMAPARSE
@@ -0,0 +1,85 @@
+from markdown_compaction import compact_pages, remove_boilerplate, remove_repeated_lines
+
+
+def test_address_lines_survive_compaction():
+    text = "\n".join([
+        "ACME TRADING LLC",
+        "Office 12, Al Qusais Branch",
+        "Deira Branch, Dubai",
+        "Branch Manager: Omar",
+        "Invoice No: INV-0012",
+    ])
+    assert remove_boilerplate(text) == text
+
+
+def test_bank_code_lines_are_dropped():
+    text = "\n".join([
+        "Invoice No: INV-0012",
+        "IBAN: AE07 0331 2345 6789 0123 456",
+        "SWIFT Code: EBILAEAD",
+        "| Account No. | 1012345678901 |",
+        "Net Total: 1,050.00",
+    ])
+    assert remove_boilerplate(text).splitlines() == ["Invoice No: INV-0012", "Net Total: 1,050.00"]
+
+
+def test_bank_block_ends_at_blank_line_and_keeps_protected_lines():
+    text = "\n".join([
+        "## Bank Details",
+        "Bank Name: Emirates NBD",
+        "Branch: Deira",
+        "",
+        "Total Amount: AED 1,050.00",
+        "Terms and Conditions",
+        "1. Goods once sold are not returnable",
+        "VAT 5%: 50.00",
+    ])
+    assert remove_boilerplate(text).splitlines() == ["", "Total Amount: AED 1,050.00", "VAT 5%: 50.00"]
+
+
+def test_blocks_without_blank_lines_end_at_the_first_other_line():
+    # pdfplumber text layers have no blank lines between sections
+    text = "\n".join([
+        "ACME TRADING LLC",
+        "Bank Details: Emirates NBD",
+        "Account Name: Acme Trading LLC",
+        "IBAN: AE07 0331 2345 6789 0123 456",
+        "SWIFT: EBILAEAD",
+        "Warehouse 4, Al Quoz Industrial Area 3",
+        "Dubai, United Arab Emirates",
+        "Bill To: Gulf Builders",
+        "Office 12, Al Qusais",
+        "Dubai",
+        "Invoice No: INV-0012",
+        "Net Total: 1,050.00",
+        "Terms and Conditions",
+        "1. Goods once sold are not returnable.",
+        "2. Disputes are governed by the laws of Dubai.",
+        "Payment Terms: 30 days",
+        "Thank you for your business",
+    ])
+    assert remove_boilerplate(text).splitlines() == [
+        "ACME TRADING LLC",
+        "Warehouse 4, Al Quoz Industrial Area 3",
+        "Dubai, United Arab Emirates",
+        "Bill To: Gulf Builders",
+        "Office 12, Al Qusais",
+        "Dubai",
+        "Invoice No: INV-0012",
+        "Net Total: 1,050.00",
+        "Payment Terms: 30 days",
+        "Thank you for your business",
+    ]
+
+
+def test_repeated_headers_are_kept_once():
+    pages = ["ACME TRADING LLC\nPage 1 of 3\nline a", "ACME TRADING LLC\nPage 2 of 3\nline b",
+             "ACME TRADING LLC\nPage 3 of 3\nline c"]
+    assert remove_repeated_lines(pages) == ["ACME TRADING LLC\nPage 1 of 3\nline a", "line b", "line c"]
+
+
+def test_compact_pages_reports_saved_tokens():
+    pages = ["Invoice No: 7\n|  Item   |  Qty  |\n|---|---|\n|  Pen   |  2  |\n\n\n\nIBAN: AE070331234567890123456"]
+    text, saved = compact_pages(pages, token_budget=0)
+    assert text == "Invoice No: 7\n| Item | Qty |\n|---|---|\n| Pen | 2 |"
+    assert saved > 0
@@ -0,0 +1,88 @@
+import math
+from decimal import Decimal
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from normalization import (
+    PURCHASE_TYPES, currency_code, money_total, normalize_count, normalize_currency, normalize_dates,
+    normalize_frame, normalize_invoice, normalize_money, normalize_record,
+)
+from invoice_records import InvoiceRecord
+
+
+def values(series):
+    return [None if (isinstance(v, float) and math.isnan(v)) or v is pd.NA else v for v in series.tolist()]
+
+
+def cents(*amounts):
+    return [None if amount is None else Decimal(amount) for amount in amounts]
+
+
+def test_money_plain_and_formatted_amounts():
+    assert values(normalize_money([1234.5, "1,234.50", "AED 990", "1.234,56", "12,50", "(120.00)", "-12"])) == cents(
+        "1234.50", "1234.50", "990.00", "1234.56", "12.50", "-120.00", "-12.00",
+    )
+
+
+def test_money_with_dotted_currency_prefixes():
+    assert values(normalize_money(["Rs. 1,000", "Dhs. 500", "DHS.750.25", "Total: 1,000."])) == cents(
+        "1000.00", "500.00", "750.25", "1000.00",
+    )
+
+
+def test_money_skips_percentages():
+    assert values(normalize_money(["5% VAT: 900", "VAT 12.5% 80", "5%"])) == cents("900.00", "80.00", None)
+
+
+def test_money_unparseable_is_none_not_zero():
+    assert values(normalize_money(["Not specified", "", None, float("nan"), "NaN", "1e40"])) == [None] * 6
+
+
+def test_money_is_decimal_rounded_to_cents():
+    amounts = normalize_money([10.005, "0.1", 2.675, Decimal("1.005")])
+    assert values(amounts) == cents("10.01", "0.10", "2.68", "1.01")
+    assert all(isinstance(amount, Decimal) for amount in amounts)
+    assert money_total([0.1, 0.2, float("nan"), "AED 1,000.01"]) == Decimal("1000.31")
+    assert sum(normalize_money([0.1] * 10)) == Decimal("1.00")
+
+
+def test_counts_are_nullable_integers():
+    counts = normalize_count(["3", 2.0, None])
+    assert str(counts.dtype) == "Int64"
+    assert values(counts) == [3, 2, None]
+
+
+def test_dates_iso_first_then_day_first():
+    assert values(normalize_dates(["2025-09-08", "08/09/2025", "8 Aug 2025", "not a date", None])) == [
+        "2025-09-08", "2025-09-08", "2025-08-08", None, None,
+    ]
+
+
+def test_currency_codes_symbols_and_names():
+    assert values(normalize_currency(["aed", "$", "Dirhams", "Total in EUR", "points", None])) == [
+        "AED", "USD", "AED", "EUR", None, None,
+    ]
+    assert [currency_code(v) for v in ("Dhs.", "usd", "€", "??", None)] == ["AED", "USD", "EUR", None, None]
+
+
+def test_normalize_frame_and_record():
+    row = {"date": "21/08/2025", "subtotal": "Rs. 18,000", "tax_amount": "900", "net_total": "18,900.00",
+           "currency": "aed", "items_count": "2", "tokens_saved": None, "invoice_number": "SEFZE-1471"}
+    frame = normalize_frame(pd.DataFrame([row]), PURCHASE_TYPES)
+    assert frame.loc[0, "net_total"] == 18900.0
+    assert normalize_record(row, PURCHASE_TYPES) == {
+        "date": "2025-08-21", "subtotal": 18000.0, "tax_amount": 900.0, "net_total": 18900.0,
+        "currency": "AED", "items_count": 2, "tokens_saved": None, "invoice_number": "SEFZE-1471",
+    }
+
+
+def test_normalize_invoice():
+    record = InvoiceRecord(status="success", source_file="a.pdf", invoice_date="21/08/2025", subtotal="Rs. 18,000",
+                           net_total="(120.00)", currency="dhs", items_count="2")
+    typed = normalize_invoice(record)
+    assert (typed.invoice_date, typed.subtotal, typed.net_total, typed.currency, typed.items_count) == (
+        "2025-08-21", 18000.0, -120.0, "AED", 2)
+    assert typed.tax_amount is None and typed.source_file == "a.pdf"
+    assert record.subtotal == "Rs. 18,000"
@@ -0,0 +1,36 @@
+import page_selection
+from page_selection import missing_required_fields, select_pages
+
+
+def fake_pdf(page_count) -> bytes:
+    return b"%PDF-1.4\n" + b"".join(b"<< /Type /Page >>\n" for _ in range(page_count)) + b"<< /Type /Pages >>"
+
+
+def test_short_pdf_is_not_scanned(monkeypatch):
+    monkeypatch.setattr(page_selection, "count_pdf_pages", lambda pdf_bytes: None)
+
+    def scan(pdf_bytes):
+        raise AssertionError("short PDFs must not be scanned")
+
+    monkeypatch.setattr(page_selection, "scan_page_texts", scan)
+    assert select_pages(fake_pdf(page_selection.PAGE_SELECTION_MIN_PAGES - 1)) is None
+
+
+def test_long_pdf_keeps_head_tail_and_keyword_pages(monkeypatch):
+    texts = ["header", "details", "annex", "Grand Total 1,050.00", "annex", "annex", "annex", "annex", "signature",
+             "terms"]
+    monkeypatch.setattr(page_selection, "count_pdf_pages", lambda pdf_bytes: len(texts))
+    monkeypatch.setattr(page_selection, "scan_page_texts", lambda pdf_bytes: texts)
+    assert select_pages(b"%PDF") == [0, 1, 3, 8, 9]
+
+
+def test_page_objects_count_without_pdfplumber(monkeypatch):
+    monkeypatch.setattr(page_selection, "count_pdf_pages", lambda pdf_bytes: None)
+    monkeypatch.setattr(page_selection, "scan_page_texts", lambda pdf_bytes: None)
+    assert page_selection.count_pages(fake_pdf(9)) == 9
+    assert select_pages(fake_pdf(9)) == [0, 1, 7, 8]
+
+
+def test_missing_required_fields():
+    assert missing_required_fields({"date": "2025-08-21", "invoice_number": "", "net_total": "null"},
+                                   ("date", "invoice_number", "net_total")) == ["invoice_number", "net_total"]
@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+import threading
+import time
+
+from parse_cache import ENTRY_SUFFIX, ParseCache, make_parse_key
+
+
+def test_hits_are_keyed_by_content_and_settings(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    calls = []
+
+    def parse(text):
+        return lambda: calls.append(text) or [text]
+
+    assert cache.get_or_parse(b"%PDF a", parse("a")) == ["a"]
+    # Same bytes (under any file name) are a hit
+    assert cache.get_or_parse(b"%PDF a", parse("again")) == ["a"]
+    assert cache.get_or_parse(b"%PDF b", parse("b")) == ["b"]
+    assert cache.get_or_parse(b"%PDF a", parse("first page"), pages=[0]) == ["first page"]
+    assert calls == ["a", "b", "first page"]
+    assert make_parse_key(b"%PDF a") != make_parse_key(b"%PDF a", language="ar")
+
+
+def test_empty_results_are_not_cached(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    cache.get_or_parse(b"%PDF a", lambda: [])
+    assert cache.get(make_parse_key(b"%PDF a")) is None
+
+
+def test_entries_are_gzipped_json(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    pages = ["# فاتورة ضريبية", "| Total | AED 1,050.00 |"]
+    cache.put("key", pages)
+    with gzip.open(tmp_path / ("key" + ENTRY_SUFFIX), "rt", encoding="utf-8") as f:
+        assert json.load(f) == pages
+    assert cache.get("key") == pages
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_least_recently_used_entries_are_evicted_past_the_cap(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    pages = ["x" * 1000]
+    cache.put("a", pages)
+    entry_size = os.path.getsize(tmp_path / ("a" + ENTRY_SUFFIX))
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    cache.put("b", pages)
+    old = time.time() - 60
+    os.utime(tmp_path / ("a" + ENTRY_SUFFIX), (old - 10, old - 10))
+    os.utime(tmp_path / ("b" + ENTRY_SUFFIX), (old, old))
+    # Reading "a" makes it the most recently used
+    assert cache.get("a") == pages
+    cache.put("c", pages)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (pages, None, pages)
+
+
+def test_identical_concurrent_uploads_are_parsed_once(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    calls = []
+    start = threading.Barrier(8)
+    results = []
+
+    def parse():
+        calls.append(1)
+        time.sleep(0.05)
+        return ["page"]
+
+    def upload():
+        start.wait()
+        results.append(cache.get_or_parse(b"%PDF same", parse))
+
+    threads = [threading.Thread(target=upload) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and results == [["page"]] * 8
+    # Locks of written keys are not kept
+    assert cache._key_locks == {}
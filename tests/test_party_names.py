@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from party_names import PartyIndex, clean_name, jaccard, minhash, trigrams
+
+
+def test_clean_name_drops_case_punctuation_and_legal_suffixes():
+    assert clean_name("Acme Trading L.L.C.") == "ACME TRADING"
+    assert clean_name("  acme   trading llc ") == "ACME TRADING"
+    assert clean_name("Gulf & Co FZE") == "GULF AND"
+    assert clean_name("LLC") == "LLC"
+    assert clean_name(None) == ""
+
+
+def test_minhash_signatures_are_deterministic():
+    shingles = trigrams("ACME TRADING")
+    assert (minhash(shingles) == minhash(set(shingles))).all()
+    assert len(minhash(shingles)) == 64
+
+
+def test_spelling_variants_share_one_canonical_name():
+    index = PartyIndex()
+    names = ["UMAR BIN SALAM", "Umar Bin Salam ", "Acme Trading L.L.C.", "ACME TRADING LLC",
+             "Al Ataaya Water Wells Drilling Contracting LLC", "AL ATAAYA WATER WELLS DRILING CONTRACTING"]
+    assert index.canonicalize(names) == ["UMAR BIN SALAM", "UMAR BIN SALAM",
+                                         "Acme Trading L.L.C.", "Acme Trading L.L.C.",
+                                         "Al Ataaya Water Wells Drilling Contracting LLC",
+                                         "Al Ataaya Water Wells Drilling Contracting LLC"]
+    assert index.stats() == {"entities": 3, "names": 4}
+
+
+def test_dissimilar_names_stay_apart():
+    index = PartyIndex()
+    assert jaccard(trigrams("AL NOOR TRADING"), trigrams("AL NOOR TRANSPORT")) < index.threshold
+    assert index.count(["Al Noor Trading", "Al Noor Transport", "Gulf Builders"]) == 3
+
+
+def test_trn_identifies_the_party():
+    index = PartyIndex()
+    assert index.canonical("Gulf Builders", "100-200-300") == "Gulf Builders"
+    # Any name under a known TRN is the same entity
+    assert index.canonical("GB Contracting", "100200300") == "Gulf Builders"
+    # A matching name under another TRN is another company
+    assert index.canonical("Gulf Builders LLC", "999") == "Gulf Builders LLC"
+    assert index.count(["Gulf Builders", "GB Contracting", "Gulf Builders LLC"], ["100200300", None, "999"]) == 2
+
+
+def test_missing_names_are_not_counted():
+    index = PartyIndex()
+    assert index.canonical(None) is None
+    assert index.canonical("", "") is None
+    assert index.canonical(None, "555") == "555"
+    assert index.count(["Acme", None, float("nan")]) == 1
@@ -0,0 +1,76 @@
+import io
+import os
+
+import pytest
+
+from pdf_handoff import MemoryviewReader, accepts_file_objects, pdf_buffer, run_parser_on_pdf, temporary_pdf_path
+
+PDF = b"%PDF-1.4 invoice bytes"
+
+
+def test_reader_reads_and_seeks_without_copying_the_upload():
+    upload = io.BytesIO(PDF)
+    view = pdf_buffer(upload)
+    assert isinstance(view, memoryview)
+    reader = MemoryviewReader(view)
+    assert reader.read(4) == b"%PDF"
+    reader.seek(-5, io.SEEK_END)
+    assert reader.read() == b"bytes"
+    assert reader.read() == b""
+    reader.seek(0)
+    buffer = bytearray(3)
+    assert reader.readinto(buffer) == 3 and bytes(buffer) == b"%PD"
+    view.release()
+
+
+def test_uploads_without_getbuffer_are_read_from_the_start():
+    class Upload:
+        def __init__(self):
+            self.file = io.BytesIO(PDF)
+            self.file.read()
+
+        def seek(self, pos):
+            self.file.seek(pos)
+
+        def read(self):
+            return self.file.read()
+
+    assert pdf_buffer(Upload()) == PDF
+
+
+def test_parsers_taking_file_objects_get_the_reader():
+    received = {}
+
+    def load_data(file, extra_info=None):
+        received.update(data=file.read(), extra_info=extra_info)
+        return ["document"]
+
+    assert accepts_file_objects(load_data)
+    assert run_parser_on_pdf(load_data, memoryview(PDF), "a.pdf") == ["document"]
+    assert received == {"data": PDF, "extra_info": {"file_name": "a.pdf"}}
+
+
+def test_temporary_file_is_removed_after_success_and_error():
+    paths = []
+
+    def load_data(path):
+        paths.append(path)
+        with open(path, "rb") as f:
+            assert f.read() == PDF
+        return ["document"]
+
+    def failing_load_data(path):
+        paths.append(path)
+        raise RuntimeError("LlamaParse job failed")
+
+    assert not accepts_file_objects(load_data)
+    assert run_parser_on_pdf(load_data, memoryview(PDF)) == ["document"]
+    with pytest.raises(RuntimeError):
+        run_parser_on_pdf(failing_load_data, PDF)
+    assert len(paths) == 2 and not any(os.path.exists(path) for path in paths)
+
+
+def test_temporary_path_is_removed_even_if_the_caller_deleted_it():
+    with temporary_pdf_path(PDF) as path:
+        os.remove(path)
+    assert not os.path.exists(path)
@@ -0,0 +1,106 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import CircuitBreaker, Scheduler, TokenBucket, is_retryable
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() advances monotonic() instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+def test_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(60, capacity=2)  # one token per second
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+    clock.now += 10
+    bucket.acquire(5)  # capped at the bucket size, refilled to capacity
+    assert len(clock.sleeps) == 1
+
+
+def test_bucket_without_a_rate_never_waits(clock):
+    bucket = TokenBucket(0)
+    for _ in range(100):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+
+    breaker.wait_until_closed()
+    assert clock.sleeps == [pytest.approx(30)] and not breaker.is_open
+    # Half-open: the next failure re-opens it at once
+    breaker.record_failure()
+    assert breaker.is_open
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_scheduler_retries_retryable_errors(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.5 * attempt)
+    outcomes = [RateLimited("quota"), TimeoutError(), "ok"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    scheduler = Scheduler(0, max_attempts=3, breaker=CircuitBreaker(failure_threshold=5))
+    assert scheduler.call(call) == "ok"
+    assert scheduler.retries == 2 and clock.sleeps == [0.5, 1.0]
+
+
+def test_scheduler_raises_other_errors_at_once(clock):
+    scheduler = Scheduler(0, max_attempts=3)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(call)
+    assert len(calls) == 1 and scheduler.retries == 0
+
+
+def test_retryable_errors():
+    assert is_retryable(RateLimited())
+    assert is_retryable(Exception("429 Resource has been exhausted"))
+    assert not is_retryable(ValueError("invalid argument"))
@@ -0,0 +1,78 @@
+from rule_extractor import pre_extract_invoice, rule_based_fields
+
+HEADER = [
+    "ACME TRADING LLC",
+    "Warehouse 4, Al Quoz Industrial Area 3",
+    "TRN: 100333333333333",
+    "TAX INVOICE",
+    "Invoice No: INV-0012",
+    "Date: 21/08/2025",
+    "Bill To: Gulf Builders",
+    "Office 12, Al Qusais",
+]
+TOTALS = [
+    "| Description | Qty | Amount |",
+    "|---|---|---|",
+    "| Drilling works | 1 | 1,000.00 |",
+    "Sub Total AED 1,000.00",
+    "VAT 5% AED 50.00",
+    "Grand Total AED 1,050.00",
+]
+
+
+def invoice(*lines) -> str:
+    return "\n".join(lines)
+
+
+def test_reconciling_invoice_skips_gemini():
+    data = rule_based_fields(invoice(*HEADER, *TOTALS))
+    assert data == {
+        "date": "2025-08-21", "invoice_number": "INV-0012", "party_name": "ACME TRADING LLC",
+        "party_address": "Warehouse 4, Al Quoz Industrial Area 3", "trn": "100333333333333",
+        "subtotal": 1000.0, "tax_amount": 50.0, "net_total": 1050.0, "currency": "AED", "items_count": None,
+    }
+
+
+def test_totals_that_do_not_reconcile_fall_back_to_gemini():
+    lines = [*HEADER, *TOTALS[:-1], "Grand Total AED 1,150.00"]
+    data, confidence = pre_extract_invoice(invoice(*lines))
+    assert data["net_total"] == 1150.0 and confidence["net_total"] < 0.8
+    assert rule_based_fields(invoice(*lines)) is None
+
+
+def test_ambiguous_date_falls_back_to_gemini():
+    lines = [line if not line.startswith("Date") else "Date: 03/04/2025" for line in HEADER] + TOTALS
+    data, confidence = pre_extract_invoice(invoice(*lines))
+    assert data["date"] == "2025-04-03" and confidence["date"] < 0.8
+    assert rule_based_fields(invoice(*lines)) is None
+
+
+def test_customer_trn_before_vendor_trn_is_not_taken():
+    lines = [
+        "ACME TRADING LLC",
+        "Warehouse 4, Al Quoz Industrial Area 3",
+        "Invoice No: INV-0012",
+        "Date: 21/08/2025",
+        "Bill To: Gulf Builders",
+        "TRN: 100222222222223",
+        *TOTALS,
+        "Our TRN: 100333333333333",
+    ]
+    assert rule_based_fields(invoice(*lines))["trn"] == "100333333333333"
+
+
+def test_two_unattributed_trns_fall_back_to_gemini():
+    lines = [*HEADER, *TOTALS, "Consignee TRN: 100222222222223"]
+    data, confidence = pre_extract_invoice(invoice(*lines))
+    assert confidence["trn"] < 0.8
+    assert rule_based_fields(invoice(*lines)) is None
+
+
+def test_total_quantity_does_not_compete_with_the_net_total():
+    lines = [*HEADER, *TOTALS[:3], "Total Qty 12,000", *TOTALS[3:]]
+    assert rule_based_fields(invoice(*lines))["net_total"] == 1050.0
+
+
+def test_reconciling_total_wins_over_a_larger_amount():
+    lines = [*HEADER, *TOTALS, "Total Outstanding Balance AED 4,200.00"]
+    assert rule_based_fields(invoice(*lines))["net_total"] == 1050.0
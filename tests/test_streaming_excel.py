@@ -0,0 +1,80 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("xlsxwriter")
+openpyxl = pytest.importorskip("openpyxl")
+
+from excel_export import workbook_bytes
+from invoice_records import InvoiceRecord
+from streaming_excel import StreamingWorkbookWriter, SummaryTotals
+
+COLUMNS = ["invoice_number", "party_name", "net_total", "currency", "items_count", "date"]
+ROWS = [
+    ["INV-1", "Acme Trading LLC", 1050.0, "AED", 2, "2025-08-21"],
+    ["INV-2", "Gulf Builders", 210.5, "AED", None, "2025-09-09"],
+    ["INV-3", "Müller GmbH", 99.99, "EUR", 1, None],
+]
+
+
+def sheet_values(data, sheet):
+    return [list(row) for row in openpyxl.load_workbook(io.BytesIO(data))[sheet].values]
+
+
+def test_streamed_sheet_matches_the_dataframe_export():
+    writer = StreamingWorkbookWriter()
+    writer.add_table("Invoices", COLUMNS)
+    for row in ROWS:
+        writer.append("Invoices", row)
+    streamed = writer.close()
+
+    exported = workbook_bytes({"Invoices": pd.DataFrame(ROWS, columns=COLUMNS)})
+    assert sheet_values(streamed, "Invoices") == sheet_values(exported, "Invoices")
+    assert sheet_values(streamed, "Invoices")[0] == COLUMNS
+
+
+def test_full_sheets_spill_into_numbered_parts(tmp_path):
+    path = tmp_path / "out.xlsx"
+    writer = StreamingWorkbookWriter(str(path), max_rows=3)
+    writer.add_table("Invoices", ["n"])
+    for n in range(5):
+        writer.append("Invoices", [n])
+    writer.write_table("Summary", ["Metric", "Value"], [("Rows", writer.row_count("Invoices"))])
+    assert writer.close() is None
+
+    workbook = openpyxl.load_workbook(path)
+    assert workbook.sheetnames == ["Invoices", "Invoices (2)", "Invoices (3)", "Summary"]
+    assert [[row[0] for row in workbook[name].values] for name in workbook.sheetnames[:3]] == [
+        ["n", 0, 1], ["n", 2, 3], ["n", 4]]
+    assert list(workbook["Summary"].values)[1] == ("Rows", 5)
+
+
+def test_nested_values_are_written_as_text():
+    writer = StreamingWorkbookWriter()
+    writer.add_table("Invoices", ["items"])
+    writer.append("Invoices", [[{"description": "rods"}]])
+    assert sheet_values(writer.close(), "Invoices")[1] == ["[{'description': 'rods'}]"]
+
+
+def test_decimal_amounts_are_written_as_numbers():
+    writer = StreamingWorkbookWriter()
+    writer.add_table("Invoices", ["net_total"])
+    writer.append("Invoices", [Decimal("1050.10")])
+    assert sheet_values(writer.close(), "Invoices")[1] == [1050.1]
+
+
+def test_summary_totals_skip_failures_and_duplicates():
+    totals = SummaryTotals(party_label="Unique Vendors")
+    totals.add(InvoiceRecord(status="success", party_name="Acme Trading LLC", trn="100200300400003",
+                             currency="AED", subtotal=1000.0, tax_amount=50.0, net_total=1050.0))
+    totals.add(InvoiceRecord(status="success", party_name="ACME TRADING L.L.C.", trn="100200300400003",
+                             currency="AED", net_total=1050.0, duplicate_of="a.pdf"))
+    totals.add(InvoiceRecord(status="success", party_name="Müller GmbH", currency="EUR", net_total=99.99))
+    totals.add(InvoiceRecord.failed("c.pdf", "bad pdf"))
+    summary = dict(totals.summary_rows())
+    assert (summary["Total Invoices"], summary["Successfully Processed"], summary["Failed"]) == (4, 3, 1)
+    assert summary["Duplicates (not summed)"] == 1
+    assert summary["Total Amount (AED)"] == "1050.00" and summary["Total Amount (EUR)"] == "99.99"
+    assert summary["Unique Vendors"] == 2
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+import structured_output
+from structured_output import JsonOutputStats, batch_schema, generate_json, object_schema, repair_json
+
+SCHEMA = object_schema(("invoice_number", "net_total"))
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Returns the queued response texts in order and records the generation configs"""
+    model_name = "fake-structured-model"
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.configs = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.configs.append(generation_config)
+        return FakeResponse(self.texts.pop(0))
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    fresh = JsonOutputStats()
+    monkeypatch.setattr(structured_output, "json_output_stats", fresh)
+    monkeypatch.setattr(structured_output, "JSON_RETRY_ATTEMPTS", 1)
+    return fresh
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Here you go:\n```json\n{"a": 1, "b": [1, 2]}\n```', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1, "b": 2,}', {"a": 1, "b": 2}),
+    ('{"a": {"b": 1]}}', {"a": {"b": 1}}),
+    ('{"a": "x, }", "b": "say \\"hi\\""} trailing', {"a": "x, }", "b": 'say "hi"'}),
+    ('{"a": 1, "b": "trunc', {"a": 1, "b": "trunc"}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": [1, 2', {"a": [1, 2]}),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_repair_json_finds_arrays_and_reports_missing_values():
+    assert repair_json('result: [{"a": 1}, {"a": 2},', "[") == [{"a": 1}, {"a": 2}]
+    with pytest.raises(json.JSONDecodeError):
+        repair_json("no json here")
+
+
+def test_valid_response_in_json_mode(stats):
+    model = FakeModel('{"invoice_number": "1", "net_total": 10}')
+    assert generate_json(model, "prompt", SCHEMA) == {"invoice_number": "1", "net_total": 10}
+    assert model.configs == [{"response_mime_type": "application/json", "response_schema": SCHEMA}]
+    assert stats.stats() == {"responses": 1, "repaired": 0, "retried": 0, "failed": 0, "retry_rate": 0.0}
+
+
+def test_repaired_then_retried_then_failed(stats):
+    assert generate_json(FakeModel('{"invoice_number": "1",'), "prompt", SCHEMA) == {"invoice_number": "1"}
+    batch = batch_schema(("invoice_number",))
+    assert generate_json(FakeModel("sorry", '[{"invoice_number": "2"}]'), "prompt", batch) == [{"invoice_number": "2"}]
+    with pytest.raises(json.JSONDecodeError):
+        generate_json(FakeModel("[1]", "no json"), "prompt", SCHEMA)
+    assert stats.stats() == {"responses": 5, "repaired": 1, "retried": 2, "failed": 1, "retry_rate": 0.4}
+
+
+def test_plain_requests_without_json_mode(stats, monkeypatch):
+    monkeypatch.setattr(structured_output, "JSON_MODE", False)
+    model = FakeModel('```json\n{"invoice_number": "1"}\n```')
+    assert generate_json(model, "prompt", SCHEMA) == {"invoice_number": "1"}
+    assert model.configs == [None]